@@ -1,19 +1,25 @@
+import threading
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Optional
+from typing import TYPE_CHECKING, Callable, Optional
 from pydantic import BaseModel
 
-from openai import OpenAI
-from openai.types import responses
-client = OpenAI()
+if TYPE_CHECKING:
+    from openai.types import responses
 
+from history import DEFAULT_TOKEN_BUDGET, HistoryManager, get_encoding
+from llm_backend import DEFAULT_MODEL, LLMBackend, OpenAIBackend
+from llm_cache import ResponseCache, make_key
 from robot import get_system_description
-from state_representation import Location
+from state_representation import BasketPosition, Location
+from streaming import PartialJSONParser, SentenceSplitter, StringChunk
+import tracing
 
 class AgentAction(Enum):
     REQUEST_ADDITIONAL_INFO = "REQUEST_ADDITIONAL_INFO"
     REQUEST_USER_ACTION = "REQUEST_USER_ACTION"
     SPECIFY_PLAN = "SPECIFY_PLAN"
+    GO_TO_STATE = "GO_TO_STATE"
     MOVE_BASKET_TO_LOCATION = "MOVE_BASKET_TO_LOCATION"
     RAISE_BASKET = "RAISE_BASKET"
     LOWER_BASKET = "LOWER_BASKET"
@@ -32,6 +38,7 @@ f"""
 - {AgentAction.REQUEST_ADDITIONAL_INFO.value}: Request the user to provide additional information about the situation.
 - {AgentAction.REQUEST_USER_ACTION.value}: Request the user to perform an action as part of accomplishing the goal. If user action is required, this action MUST be used.
 - {AgentAction.SPECIFY_PLAN.value}: Specify the plan that you will follow to accomplish the task.
+- {AgentAction.GO_TO_STATE.value}: Bring the basket to the specified location and leave it in the specified basket position (RAISED or LOWERED). The robot works out and performs the raising, moving and lowering steps itself. Prefer this over the individual basket actions below.
 - {AgentAction.MOVE_BASKET_TO_LOCATION.value}: Move basket to specified location.
 - {AgentAction.RAISE_BASKET.value}: Raise the basket.
 - {AgentAction.LOWER_BASKET.value}: Lower the basket.
@@ -42,9 +49,13 @@ f"""
 class AgentCommand(BaseModel):
     action: AgentAction
     location: Optional[Location]
+    basket_position: Optional[BasketPosition]
     user_message: Optional[str]
     plan: Optional[str]
 
+class AgentPlan(BaseModel):
+    commands: list[AgentCommand] # Executed in order, up to the first one that waits for the user
+
 class InteractionState(Enum):
     AWAITING_REQUEST = 1
     AWAITING_ADDITIONAL_INFO = 2
@@ -56,12 +67,15 @@ class HistoryElement:
     user_input: Optional[str] = None
     agent_response: Optional[str] = None
     system_input: Optional[str] = None
+    robot_state: Optional[str] = None # A system input describing the robot's state, superseded by the next one
 
-    def to_llm_input(self) -> responses.response_input_param.ResponseInputItemParam:
+    def to_llm_input(self) -> "responses.response_input_param.ResponseInputItemParam":
         if self.user_input is not None:
             return {"role": "user", "content": self.user_input}
         elif self.system_input is not None:
             return {"role": "system", "content": self.system_input}
+        elif self.robot_state is not None:
+            return {"role": "system", "content": self.robot_state}
         elif self.agent_response is not None:
             return {"role": "assistant", "content": self.agent_response}
         else:
@@ -80,42 +94,160 @@ class AgentState:
         print(f"#### system_input: {system_input}")
         self.history.append(HistoryElement(system_input=system_input))
 
+    def record_robot_state(self, robot_state):
+        print(f"#### robot_state: {robot_state}")
+        self.history.append(HistoryElement(robot_state=robot_state))
+
     def record_agent_response(self, agent_response):
         print(f"#### agent_response: {agent_response}")
         self.history.append(HistoryElement(agent_response=agent_response))
 
 
 class Agent:
-    def __init__(self) -> None:
+    def __init__(self, token_budget: int = DEFAULT_TOKEN_BUDGET, cache: Optional[ResponseCache] = None, multi_action: bool = True,
+                 stream: bool = False, backend: Optional[LLMBackend] = None, model: str = DEFAULT_MODEL, deadline: Optional[float] = None) -> None:
+        """
+        multi_action: whether the LLM responds with an ordered list of commands (AgentPlan) rather than a single AgentCommand
+        stream: whether to stream the LLM output, so user messages can be spoken before the response is complete
+        backend: defaults to the OpenAI API
+        deadline: seconds each LLM call may take including retries, defaults to the backend's
+        """
+        self.multi_action = multi_action
+        self.stream = stream
+        self.backend = backend if backend is not None else OpenAIBackend()
+        self.model = model
+        self.deadline = deadline
         self.state = AgentState()
-        self.state.record_system_input(get_scenario_prompt())
+        self.state.record_system_input(get_scenario_prompt(multi_action))
+        self.history_manager = HistoryManager(token_budget=token_budget)
+        self._history_lock = threading.Lock() # The history manager's summary is shared with calls made ahead of time
+        self.cache = cache
     
-    def add_input(self, user_input: Optional[str] = None, system_input: Optional[str] = None):
+    def add_input(self, user_input: Optional[str] = None, system_input: Optional[str] = None, robot_state: Optional[str] = None):
         if user_input is not None:
             self.state.record_user_input(user_input)
         if system_input is not None:
             self.state.record_system_input(system_input)
+        if robot_state is not None:
+            self.state.record_robot_state(robot_state)
+
+    def warm_up(self):
+        """Loads the tokenizer and gets the LLM backend ready, so the first call isn't slower than the rest"""
+        get_encoding()
+        self.backend.warm_up()
 
-    def process_input(self) -> AgentCommand:
+    def process_input(self, message_stream: Optional["UserMessageStream"] = None) -> list[AgentCommand]:
+        """message_stream: fed the LLM output as it streams in, if streaming"""
+        with tracing.span("agent.process_input"):
+            commands = self.request_commands(message_stream)
+            self.record_commands(commands)
+            return commands
+
+    def request_commands(self, message_stream: Optional["UserMessageStream"] = None, history: Optional[list[HistoryElement]] = None) -> list[AgentCommand]:
+        """
+        Queries the LLM for its next commands without recording them in the history, e.g. in case they're abandoned.
+        history: the history to query with instead of the agent's, e.g. the one it is expected to have once the robot has moved
+        """
         print("Processing input")
-        response = client.responses.parse(
-            model="gpt-4.1",
-            temperature=0.0,
-            input=[
-                history_item.to_llm_input() for history_item in self.state.history
-            ],
-            text_format=AgentCommand,
-        )
-
-        command = response.output_parsed
-        print(f"got command: {command}")
-        if command is None:
-            raise ValueError("Didn't get a command")
-        self.state.record_agent_response(str(command))
-        return command
+        with tracing.span("agent.request_commands", speculative=history is not None) as span:
+            with self._history_lock:
+                llm_input = self.history_manager.build_input(history if history is not None else self.state.history)
+                tokens = self.history_manager.stats.tokens_sent[-1]
+                print(f"Sending {tokens} history tokens ({self.history_manager.stats})")
+            span.set(history_tokens=tokens)
+            commands = self.query_llm(llm_input, on_delta=message_stream.feed if message_stream is not None else None)
+            if message_stream is not None:
+                message_stream.finish()
+            print(f"got commands: {commands}")
+            if not commands:
+                raise ValueError("Didn't get a command")
+            span.set(commands=len(commands))
+            return commands
+
+    def record_commands(self, commands: list[AgentCommand]):
+        self.state.record_agent_response("\n".join(str(command) for command in commands))
+
+    def query_llm(self, llm_input: list, on_delta: Optional[Callable[[str], None]] = None) -> Optional[list[AgentCommand]]:
+        """on_delta: called with each piece of the output text as it arrives when streaming, or with all of it on a cache hit"""
+        text_format = AgentPlan if self.multi_action else AgentCommand
+        key = None
+        if self.cache is not None:
+            key = make_key(self.model, llm_input, text_format.model_json_schema(), temperature=0.0)
+            entry = self.cache.get(key)
+            if entry is not None:
+                print(f"LLM cache hit ({self.cache.stats})")
+                if on_delta is not None:
+                    on_delta(entry["output_text"])
+                return to_commands(text_format.model_validate_json(entry["output_text"]))
+
+        result = self.backend.parse(llm_input, text_format, model=self.model, temperature=0.0, deadline=self.deadline,
+                                    on_delta=on_delta if self.stream else None)
+        print(f"LLM call took {result.latency:.2f} s ({self.backend.stats})")
+        if self.cache is not None and key is not None:
+            self.cache.put(key, result.output_text, self.model, result.latency)
+        return to_commands(result.parsed)
+
+
+def to_commands(parsed) -> list[AgentCommand]:
+    return parsed.commands if isinstance(parsed, AgentPlan) else [parsed]
+
+
+class UserMessageStream:
+    """
+    Picks the user messages out of a streaming agent response and passes on each sentence as soon as it is complete.
+    Only messages of commands that wait for the user and aren't preceded by a robot command in the same response are streamed,
+    since the others must not be communicated before the robot commands ahead of them have been executed.
+    on_command, if given, is called with the index and contents of each command as soon as it is complete, e.g. to start executing it early.
+    """
+    def __init__(self, on_sentence: Callable[[str], None], on_command: Optional[Callable[[int, AgentCommand], None]] = None) -> None:
+        self.on_sentence = on_sentence
+        self.on_command = on_command
+        self.streamed_commands: set[int] = set() # Indices of the commands whose user message was passed on
+        self._completed_commands = 0
+        self._parser = PartialJSONParser(self._on_string, self._on_object)
+        self._splitter = SentenceSplitter()
+
+    def feed(self, text: str):
+        self._parser.feed(text)
+
+    def finish(self):
+        for sentence in self._splitter.flush():
+            self.on_sentence(sentence)
+
+    def _on_string(self, chunk: StringChunk):
+        if chunk.key != "user_message":
+            return
+        commands = [fields for fields in self._parser.objects[:chunk.object_index + 1] if "action" in fields]
+        if not commands or not self._streamable([AgentAction(fields["action"]) for fields in commands]):
+            return
+        self.streamed_commands.add(len(commands) - 1)
+        for sentence in self._splitter.feed(chunk.text):
+            self.on_sentence(sentence)
+        if chunk.done:
+            self.finish()
+
+    def _on_object(self, object_index: int):
+        fields = self._parser.objects[object_index]
+        if self.on_command is None or "action" not in fields:
+            return
+        command = AgentCommand.model_validate({name: fields.get(name) for name in AgentCommand.model_fields})
+        self.on_command(self._completed_commands, command)
+        self._completed_commands += 1
+
+    @staticmethod
+    def _streamable(actions: list[AgentAction]) -> bool:
+        *earlier, action = actions
+        return action.is_wait_user_input_action() and not any(a == AgentAction.GO_TO_STATE or a.is_robot_action() for a in earlier)
                 
 
-def get_scenario_prompt():
+def get_scenario_prompt(multi_action: bool = False):
+    if multi_action:
+        action_rule = \
+f"""Respond with an ordered list of commands, which will be executed in order. Include every command you can already determine rather than one at a time,
+but end the list at the first {AgentAction.REQUEST_ADDITIONAL_INFO.value}, {AgentAction.REQUEST_USER_ACTION.value} or {AgentAction.GOAL_COMPLETED.value} command, since anything after it is discarded.
+If a robot command fails or leaves the robot in an unexpected state, the remaining commands are not executed and you will be told what happened so you can re-plan."""
+    else:
+        action_rule = "You may only take one action at a time."
     return \
 f"""You are a helpful agent responsible for moving around a robotic basket to assist the user in their activities.
 You must listen to and understand stated commands and goals and then devise a plan to meet acheive the user's desired state via controlling the robot basket.
@@ -128,7 +260,7 @@ Here is a detailed description of the system:
 In assisting the user in their goal, you have the ability to control the robot basket, request more information about the situation, or request the user perform a particular action.
 Here is a specific list of the actions available to you:
 {AgentAction.get_descriptions()}
-You may only take one action at a time.
+{action_rule}
 
 The user will make an initial request and information about the current state of the robot will be provided.
 At that point you should either provide your plan or if more information is needed to devise a plan, ask for it.
@@ -0,0 +1,250 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from agent import AgentAction, AgentCommand, UserMessageStream
+from coordinator import Coordinator, CoordinatorState, PlanExecutionError
+import tracing
+
+
+@dataclass
+class TurnTiming:
+    """time.monotonic() at each milestone of a turn, None if it wasn't reached"""
+    user_input: str
+    started: float # The user input was received
+    first_motion: Optional[float] = None # The robot started executing the turn's first command
+    first_speech: Optional[float] = None # The turn's first message was queued for speech
+    finished: Optional[float] = None # The agent is waiting for the user again, or is done
+    interrupted: bool = False # The user barged in before the turn finished
+
+    def __str__(self) -> str:
+        def since_start(t: Optional[float]) -> str:
+            return f"{t - self.started:.2f} s" if t is not None else "-"
+        return (f"'{self.user_input}': first motion {since_start(self.first_motion)}, first speech {since_start(self.first_speech)}, "
+                f"{'interrupted' if self.interrupted else 'finished'} {since_start(self.finished)}")
+
+
+@dataclass
+class RobotStep:
+    command: AgentCommand # A robot action, or a goal state to plan for
+    batch: "RobotBatch"
+    future: asyncio.Future # Resolved once the command has been executed, with the PlanExecutionError if it failed
+    started: bool = False
+
+
+@dataclass
+class RobotBatch:
+    """The robot commands of one agent response. They are executed in order until one fails or the batch is cancelled."""
+    steps: dict[int, RobotStep] = field(default_factory=dict) # By index of the command in the response
+    dispatchable: bool = True # Whether every command streamed in so far can be executed before the response is complete
+    cancelled: bool = False
+    failed: bool = False
+
+    def cancel(self) -> int:
+        """Cancels the steps that haven't started. Returns how many were cancelled."""
+        self.cancelled = True
+        return sum(step.future.cancel() for step in self.steps.values() if not step.started)
+
+
+class AsyncCoordinator(Coordinator):
+    """
+    Event-driven coordinator: voice capture, agent calls, robot commands and speech run concurrently and are connected by queues.
+    - Utterances are queued as soon as they are transcribed, also while a turn is in progress. One that arrives mid-turn barges in:
+      pending speech and robot commands that haven't started are cancelled, and a new turn starts from it once the robot is idle.
+    - A robot task executes robot commands in order. Each one starts as soon as it has streamed in, while the agent is still generating the rest of its response.
+    - Speech is queued on the voice speaker, so it plays while the robot moves and the agent thinks. The microphone stays on while it plays,
+      echo gated rather than muted (see VoiceListener.set_echo_gated), so the user can interrupt it too.
+    The CoordinatorState transitions follow the turn as in Coordinator.
+    ask_item_list: prompt for the basket's item list on stdin in the background rather than before every turn.
+    Has to be off when the user input is typed on stdin too (MockVoiceListener).
+    """
+    def __init__(self, *args, ask_item_list: bool = True, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        if self.speculate:
+            raise ValueError("AsyncCoordinator doesn't support speculative agent calls")
+        self.voice_speaker.on_playback = self.voice_listener.set_echo_gated
+        self.ask_item_list = ask_item_list
+        self.turns: list[TurnTiming] = []
+        self._utterances: asyncio.Queue[Optional[str]] # None once the voice input has ended
+        self._robot_steps: asyncio.Queue[RobotStep]
+        self._robot_idle: asyncio.Event # Set while no robot command is executing
+        self._batch: Optional[RobotBatch] = None
+
+    def run(self):
+        asyncio.run(self.run_async())
+
+    async def run_async(self):
+        await asyncio.to_thread(self.start)
+        loop = asyncio.get_running_loop()
+        self._utterances = asyncio.Queue()
+        self._robot_steps = asyncio.Queue()
+        self._robot_idle = asyncio.Event()
+        self._robot_idle.set()
+        # Plain daemon threads rather than the default executor, since they block on input indefinitely and must not hold up shutdown
+        threading.Thread(target=self._listen, args=(loop,), name="voice input", daemon=True).start()
+        if self.ask_item_list:
+            threading.Thread(target=self._ask_item_list, name="item list input", daemon=True).start()
+        robot_worker = asyncio.create_task(self._execute_robot_steps())
+        try:
+            print("getting user input")
+            user_input = await self._utterances.get()
+            while True:
+                if user_input is None:
+                    raise EOFError("Voice input ended")
+                turn = asyncio.create_task(self._handle_turn(user_input))
+                next_input = asyncio.create_task(self._utterances.get())
+                done, _ = await asyncio.wait({turn, next_input}, return_when=asyncio.FIRST_COMPLETED)
+                if turn in done:
+                    turn.result()
+                    if self.state == CoordinatorState.DONE:
+                        next_input.cancel()
+                        break
+                    print("getting user input")
+                    user_input = await next_input
+                elif next_input.result() is None:
+                    await turn
+                    break
+                else:
+                    user_input = next_input.result()
+                    await self._barge_in(turn)
+        finally:
+            robot_worker.cancel()
+        await asyncio.to_thread(self.voice_speaker.wait_until_done)
+
+    def _listen(self, loop: asyncio.AbstractEventLoop):
+        while True:
+            try:
+                user_input = self.voice_listener.get_voice()
+            except EOFError:
+                user_input = None
+            loop.call_soon_threadsafe(self._utterances.put_nowait, user_input)
+            if user_input is None:
+                return
+
+    def _ask_item_list(self):
+        while True:
+            try:
+                self.robot.ask_update_item_list() # Takes effect from the next agent call on
+            except EOFError:
+                return
+
+    async def _handle_turn(self, user_input: str):
+        with tracing.span("coordinator.turn", user_input=user_input):
+            self.turns.append(TurnTiming(user_input, started=time.monotonic()))
+            self.state = CoordinatorState.LLM_PROCESSING
+            self.agent.add_input(user_input=user_input, robot_state=str(self.robot.state))
+            done = False
+            while not done:
+                print(f"Handling state: {self.state}")
+                done = await self._agent_step()
+            self.turns[-1].finished = time.monotonic()
+            print(f"final state: {self.state}")
+
+    async def _agent_step(self) -> bool:
+        """Queries the agent and executes its commands. Returns True once the agent is waiting for the user or the goal is completed."""
+        loop = asyncio.get_running_loop()
+        batch = RobotBatch()
+        self._batch = batch
+
+        def speak_early(sentence: str): # Called from the thread the LLM call runs on
+            if not batch.cancelled:
+                self.speak_early(sentence)
+
+        def on_command(index: int, command: AgentCommand):
+            loop.call_soon_threadsafe(self._dispatch_early, batch, index, command)
+
+        message_stream = UserMessageStream(speak_early, on_command)
+        agent_commands = await asyncio.to_thread(self.agent.request_commands, message_stream)
+        self.agent.record_commands(agent_commands) # Only once the response is used, an abandoned one stays out of the history
+        return await self._execute_agent_commands(agent_commands, batch, message_stream.streamed_commands)
+
+    def _dispatch_early(self, batch: RobotBatch, index: int, command: AgentCommand):
+        """Queues a robot command that has just streamed in, if every command before it could be queued too"""
+        if batch.cancelled or not batch.dispatchable:
+            return
+        if command.action == AgentAction.GO_TO_STATE or command.action.is_robot_action():
+            self._queue_robot_step(batch, index, command)
+        elif command.action != AgentAction.SPECIFY_PLAN:
+            batch.dispatchable = False # The commands after one that waits for the user are discarded
+
+    def _queue_robot_step(self, batch: RobotBatch, index: int, command: AgentCommand) -> RobotStep:
+        step = RobotStep(command, batch, asyncio.get_running_loop().create_future())
+        batch.steps[index] = step
+        self._robot_steps.put_nowait(step)
+        return step
+
+    async def _execute_agent_commands(self, agent_commands: list[AgentCommand], batch: RobotBatch, spoken: set[int]) -> bool:
+        """Same as Coordinator.execute_agent_commands, with the robot commands executed by the robot task"""
+        robot_moved = False
+        for i, agent_command in enumerate(agent_commands):
+            if agent_command.action == AgentAction.GO_TO_STATE or agent_command.action.is_robot_action():
+                self.state = CoordinatorState.ROBOT_MOVING
+                step = batch.steps.get(i) or self._queue_robot_step(batch, i, agent_command)
+                try:
+                    await step.future
+                except PlanExecutionError as e:
+                    batch.cancel()
+                    self.abort_agent_commands(agent_commands, i, e)
+                    return False
+                robot_moved = True
+                self.state = CoordinatorState.LLM_PROCESSING
+            elif agent_command.action == AgentAction.SPECIFY_PLAN:
+                self.state = CoordinatorState.LLM_PROCESSING
+            elif agent_command.action.is_wait_user_input_action() or agent_command.action == AgentAction.GOAL_COMPLETED:
+                self.hand_back_to_user(agent_commands, i, robot_moved, spoken)
+                return True
+        if robot_moved:
+            self.agent.add_input(robot_state=str(self.robot.state))
+        return False
+
+    async def _execute_robot_steps(self):
+        while True:
+            step = await self._robot_steps.get()
+            if step.future.done() or step.batch.cancelled or step.batch.failed:
+                step.future.cancel()
+                continue
+            step.started = True
+            self._robot_idle.clear()
+            turn = self.turns[-1]
+            if turn.first_motion is None:
+                turn.first_motion = time.monotonic()
+            try:
+                await asyncio.to_thread(self.execute_robot_commands, step.command, lambda: step.batch.cancelled)
+            except PlanExecutionError as e:
+                step.batch.failed = True
+                if not step.future.done():
+                    step.future.set_exception(e)
+            else:
+                if not step.future.done():
+                    step.future.set_result(None)
+            finally:
+                self._robot_idle.set()
+
+    async def _barge_in(self, turn: asyncio.Task):
+        cancelled_steps = self._batch.cancel() if self._batch is not None else 0
+        cancelled_speech = self.voice_speaker.interrupt()
+        turn.cancel()
+        try:
+            await turn
+        except asyncio.CancelledError:
+            pass
+        await self._robot_idle.wait() # A robot command can't be stopped midway, a goal state's plan stops after its current command
+        self.turns[-1].interrupted = True
+        self.turns[-1].finished = time.monotonic()
+        print(f"Barge-in: cancelled {cancelled_steps} robot commands and {cancelled_speech} messages")
+        self.agent.add_input(system_input=f"The user interrupted. {cancelled_steps} robot commands that hadn't started yet were cancelled.",
+                             robot_state=str(self.robot.state))
+
+    def user_communication(self, info, already_spoken: bool = False):
+        self._note_speech()
+        super().user_communication(info, already_spoken)
+
+    def speak_early(self, sentence):
+        self._note_speech()
+        super().speak_early(sentence)
+
+    def _note_speech(self):
+        if self.turns and self.turns[-1].first_speech is None:
+            self.turns[-1].first_speech = time.monotonic()
@@ -0,0 +1,132 @@
+"""
+Runs a corpus of recorded commands through speech recognition backends and reports each backend's word error rate,
+real-time factor (processing time / audio duration), latency and failures by type.
+A corpus is a directory of 16-bit mono WAV files, one command each, with the reference transcript of name.wav in name.txt.
+The fixture backend returns the reference transcripts, so it only checks the harness (and costs nothing).
+Without a corpus, one is synthesized from tones, which only the fixture backend can do anything with.
+Run from the repository root:
+    python -m audio.bench_recognizers                                   # synthetic corpus, fixture backend
+    python -m audio.bench_recognizers commands/ fixture whisper google  # a recorded corpus
+    python -m audio.bench_recognizers commands/ whisper -v              # also print every transcript
+"""
+import os
+import re
+import sys
+import tempfile
+import time
+import wave
+from dataclasses import dataclass
+
+from audio.bench_vad import synthesize
+from audio.recognizers import FixtureRecognizer, GoogleRecognizer, RecognitionResult, SpeechRecognizer, WhisperRecognizer
+from audio.vad import Utterance
+
+DEMO_COMMANDS = [
+    "Please move the basket to the closet",
+    "My friend is by the desk",
+    "Bring the vitamins to my friend",
+    "Put the basket down",
+    "Go back to the kitchen",
+]
+
+
+@dataclass
+class Sample:
+    name: str
+    utterance: Utterance
+    reference: str
+
+
+def words(text: str) -> list[str]:
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def word_errors(reference: str, hypothesis: str) -> int:
+    """Word-level edit distance: substitutions, deletions and insertions"""
+    ref, hyp = words(reference), words(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1]
+
+
+def load_corpus(directory: str) -> list[Sample]:
+    samples = []
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".wav"):
+            continue
+        name = filename[:-len(".wav")]
+        with open(os.path.join(directory, f"{name}.txt")) as f:
+            reference = f.read().strip()
+        with wave.open(os.path.join(directory, filename), "rb") as wav:
+            if wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+                raise ValueError(f"{filename} must be 16-bit mono")
+            audio, sample_rate = wav.readframes(wav.getnframes()), wav.getframerate()
+        duration = len(audio) / 2 / sample_rate
+        samples.append(Sample(name, Utterance(audio, sample_rate, 0.0, duration, duration, time.monotonic()), reference))
+    return samples
+
+
+def make_corpus(directory: str):
+    for i, command in enumerate(DEMO_COMMANDS):
+        synthesize(os.path.join(directory, f"command_{i}.wav"), 0.6 + 0.3 * len(command.split()), [(0.3, 0.3 + 0.3 * len(command.split()))], [(0, 80)], seed=i)
+        with open(os.path.join(directory, f"command_{i}.txt"), "w") as f:
+            f.write(command + "\n")
+
+
+def make_recognizer(name: str, samples: list[Sample]) -> SpeechRecognizer:
+    if name == "fixture":
+        return FixtureRecognizer([sample.reference for sample in samples])
+    if name == "google":
+        return GoogleRecognizer()
+    if name == "whisper":
+        return WhisperRecognizer()
+    raise ValueError(f"Unknown backend {name}, expected fixture, google or whisper")
+
+
+def run(samples: list[Sample], backends: list[str], verbose: bool):
+    reference_words = sum(len(words(sample.reference)) for sample in samples)
+    rows = []
+    for backend in backends:
+        recognizer = make_recognizer(backend, samples)
+        start = time.monotonic()
+        try:
+            recognizer.warm_up()
+        except Exception as e:
+            rows.append(f"{backend:<10} couldn't start: {type(e).__name__}: {e}")
+            continue
+        warm_up = time.monotonic() - start
+        errors = 0
+        results: list[RecognitionResult] = []
+        for sample in samples:
+            result = recognizer.recognize(sample.utterance)
+            results.append(result)
+            errors += word_errors(sample.reference, result.text or "")
+            if verbose:
+                print(f"{backend:<10} {sample.name:<20} {result}   (reference: '{sample.reference}')")
+        latencies = sorted(result.latency for result in results)
+        stats = recognizer.stats
+        failures = ", ".join(f"{count} {failure.value}" for failure, count in stats.failures.items()) or "-"
+        rows.append(f"{backend:<10} {errors / max(1, reference_words) * 100:5.1f}%  {stats.real_time_factor:6.3f}"
+                    f"  {latencies[len(latencies) // 2] * 1000:7.0f}  {latencies[-1] * 1000:7.0f}  {warm_up:7.2f}  {failures}")
+    if verbose:
+        print()
+    audio_seconds = sum(sample.utterance.duration for sample in samples)
+    print(f"{len(samples)} utterances, {audio_seconds:.1f} s of audio, {reference_words} words\n")
+    print(f"{'backend':<10} {'WER':>6}  {'RTF':>6}  {'p50 ms':>7}  {'max ms':>7}  {'load s':>7}  failures")
+    for row in rows:
+        print(row)
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "-v"]
+    verbose = "-v" in sys.argv
+    if args and os.path.isdir(args[0]):
+        run(load_corpus(args[0]), args[1:] or ["fixture"], verbose)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            make_corpus(directory)
+            run(load_corpus(directory), args or ["fixture"], verbose)
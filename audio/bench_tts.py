@@ -0,0 +1,119 @@
+"""
+Benchmarks the speech queue headless, with a NullSynthesizer standing in for the speech engine and a NullAudioSink for the speakers:
+how long the caller is blocked, what the phrase cache saves over a session, how long an interrupt takes and how priorities cut the queue.
+Speech is simulated SPEEDUP times faster than real time so the benchmark finishes quickly; the times reported are scaled back.
+Run from the repository root: python -m audio.bench_tts
+"""
+import tempfile
+import time
+
+from audio.tts import NullAudioSink, NullSynthesizer, PhraseCache, SpeechPriority, SPEECH_RATE
+from voice import VoiceSpeaker
+
+SPEEDUP = 10.0
+RENDER_TIME = 0.3 # Seconds the simulated engine takes to render a phrase, in real time
+SESSION = [ # A session's worth of messages, with the fixed phrases coming back
+    "I will move the basket from the desk to the closet.",
+    "Then your friend can put the vitamins inside.",
+    "What would you like me to do next?",
+    "The basket is now at the closet.",
+    "What would you like me to do next?",
+    "I will lower the basket so your friend can reach it.",
+    "Agent considers goal completed",
+    "What would you like me to do next?",
+    "I will raise the basket and bring it back to the desk.",
+    "What would you like me to do next?",
+    "Agent considers goal completed",
+    "What would you like me to do next?",
+]
+
+
+def make_speaker(directory: str) -> VoiceSpeaker:
+    return VoiceSpeaker(NullSynthesizer(rate=int(SPEECH_RATE * SPEEDUP), render_time=RENDER_TIME / SPEEDUP), NullAudioSink(), PhraseCache(directory))
+
+
+def bench_blocking(directory: str) -> tuple[float, float]:
+    """Seconds the caller is blocked speaking the session: waiting for each phrase as before, and queueing them"""
+    speaker = make_speaker(directory)
+    speaker.start()
+    start = time.monotonic()
+    for message in SESSION:
+        speaker.speak(message, cache=False).result()
+    blocking = time.monotonic() - start
+    start = time.monotonic()
+    for message in SESSION:
+        speaker.speak(message, cache=False)
+    queueing = time.monotonic() - start
+    speaker.wait_until_done()
+    return blocking * SPEEDUP, queueing * SPEEDUP
+
+
+def bench_cache(directory: str, cache: bool) -> tuple[float, VoiceSpeaker]:
+    """Seconds to speak the session twice (e.g. two sessions, or a long one), with or without the phrase cache"""
+    speaker = make_speaker(directory)
+    start = time.monotonic()
+    for message in SESSION + SESSION:
+        speaker.speak(message, cache=cache)
+    speaker.wait_until_done()
+    return (time.monotonic() - start) * SPEEDUP, speaker
+
+
+def bench_first_audio(directory: str) -> tuple[float, float]:
+    """Seconds from speak() until playback starts on an idle speaker, for a phrase that has to be rendered and for the same phrase again"""
+    speaker = make_speaker(directory)
+    speaker.start()
+    latencies = []
+    for _ in range(2):
+        requested = time.monotonic()
+        speaker.on_playback = lambda playing: playing and latencies.append(time.monotonic() - requested)
+        speaker.speak(SESSION[2]).result()
+    return latencies[0] * SPEEDUP, latencies[1] * SPEEDUP
+
+
+def bench_interrupt(directory: str) -> float:
+    """Seconds from interrupt() until the playing phrase has stopped and everything queued is cancelled"""
+    speaker = make_speaker(directory)
+    playing = speaker.speak(" ".join(SESSION))
+    for message in SESSION:
+        speaker.speak(message)
+    while speaker.stats.queue_latency.n == 0: # Wait for playback to start
+        time.sleep(0.001)
+    start = time.monotonic()
+    speaker.interrupt()
+    playing.result()
+    speaker.wait_until_done()
+    return (time.monotonic() - start) * SPEEDUP
+
+
+def bench_priority(directory: str) -> tuple[float, float]:
+    """Seconds from speak() until it has been spoken, for an urgent phrase queued behind the session and for the session's last phrase"""
+    speaker = make_speaker(directory)
+    speaker.prerender(SESSION + ["Stopping."])
+    speaker.wait_until_done()
+    requested = time.monotonic()
+    started = {}
+    futures = [speaker.speak(message) for message in SESSION]
+    urgent = speaker.speak("Stopping.", priority=SpeechPriority.URGENT)
+    urgent.add_done_callback(lambda _: started.setdefault("urgent", time.monotonic()))
+    futures[-1].add_done_callback(lambda _: started.setdefault("last", time.monotonic()))
+    speaker.wait_until_done()
+    return (started["urgent"] - requested) * SPEEDUP, (started["last"] - requested) * SPEEDUP
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        blocking, queueing = bench_blocking(directory)
+        uncached_time, uncached = bench_cache(tempfile.mkdtemp(dir=directory), cache=False)
+        cached_time, cached = bench_cache(tempfile.mkdtemp(dir=directory), cache=True)
+        rendered, cached_first_audio = bench_first_audio(tempfile.mkdtemp(dir=directory))
+        interrupt = bench_interrupt(tempfile.mkdtemp(dir=directory))
+        urgent, last = bench_priority(tempfile.mkdtemp(dir=directory))
+
+    print(f"Speaking {len(SESSION)} messages ({RENDER_TIME:.1f} s to render each), simulated at {SPEEDUP:g}x and scaled back to real time\n")
+    print(f"Caller blocked:  {blocking:6.2f} s waiting for each phrase, {queueing * 1000:6.1f} ms queueing them")
+    print(f"Two sessions:    {uncached_time:6.2f} s rendering every phrase ({uncached.stats.render_time.n} renders), "
+          f"{cached_time:6.2f} s with the phrase cache ({cached.stats.render_time.n} renders, {cached.cache.stats.hits} hits)")
+    print(f"First audio:     {rendered * 1000:6.1f} ms for a phrase that has to be rendered, {cached_first_audio * 1000:6.1f} ms once it's cached")
+    print(f"Interrupt:       {interrupt * 1000:6.1f} ms until playback stopped and the queue was cancelled")
+    print(f"Priority:        an urgent phrase queued behind the session was spoken after {urgent:6.2f} s, "
+          f"the session's last phrase after {last:6.2f} s")
@@ -0,0 +1,207 @@
+"""
+Benchmarks utterance segmentation offline on WAV fixtures: how many utterances are found, and how long after the end of speech
+each one is ready for recognition. The persistent capture (AudioCapture) is compared against the previous approach of
+calibrating for 1 s and then calling speech_recognition's listen() for every turn, replayed on the same audio.
+Without arguments, synthetic fixtures with known utterance boundaries are generated, e.g. with the background noise changing mid-stream.
+Run from the repository root:
+    python -m audio.bench_vad                             # synthetic fixtures
+    python -m audio.bench_vad fixture.wav 1.2-3.0 5.1-6.4 # a recording and its utterances (start-end seconds)
+"""
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import wave
+from dataclasses import dataclass, field
+
+from audio.capture import AudioCapture
+from audio.sources import SAMPLE_RATE, SAMPLE_WIDTH, WavFileSource
+from audio.vad import frame_energy
+
+SPEECH_LEVEL = 3000.0 # Peak amplitude of synthetic speech
+SYLLABLE_DURATION = (0.12, 0.25) # Seconds
+SYLLABLE_GAP = (0.03, 0.12) # Seconds of silence between syllables within an utterance
+CALIBRATION = 1.0 # Seconds the previous approach spent measuring ambient noise before every turn
+
+
+@dataclass
+class Fixture:
+    name: str
+    path: str
+    utterances: list[tuple[float, float]] # (start, end) of each utterance, in seconds
+
+
+@dataclass
+class Result:
+    expected: int = 0
+    detected: int = 0
+    matched: int = 0
+    latencies: list[float] = field(default_factory=list) # Seconds from the end of speech until the utterance was complete
+    seconds: float = 0.0 # Processing time
+
+    def row(self, name: str, audio_seconds: float) -> str:
+        latency = f"{sum(self.latencies) / len(self.latencies) * 1000:6.0f}  {max(self.latencies) * 1000:6.0f}" if self.latencies else f"{'-':>6}  {'-':>6}"
+        return (f"{name:<40} {self.matched:>3}/{self.expected:<3} {self.detected - self.matched:>5}  {latency}"
+                f"  {self.seconds / audio_seconds * 100:5.1f}%")
+
+
+def synthesize(path: str, duration: float, utterances: list[tuple[float, float]], noise: list[tuple[float, float]], seed: int = 0):
+    """
+    Writes a 16-bit mono WAV of speech-like bursts (syllables of a harmonic tone) over Gaussian background noise.
+    utterances: (start, end) seconds of each burst, noise: (from second, RMS level) steps of the background noise
+    """
+    rng = random.Random(seed)
+    samples = [0.0] * int(duration * SAMPLE_RATE)
+    for start, end in utterances:
+        f0 = rng.uniform(110, 220)
+        t = start
+        while t < end:
+            syllable = min(rng.uniform(*SYLLABLE_DURATION), end - t)
+            first, last = int(t * SAMPLE_RATE), int((t + syllable) * SAMPLE_RATE)
+            amplitude = SPEECH_LEVEL * rng.uniform(0.5, 1.0)
+            for i in range(first, last):
+                envelope = math.sin(math.pi * (i - first) / (last - first))
+                phase = 2 * math.pi * f0 * i / SAMPLE_RATE
+                samples[i] += amplitude * envelope * (math.sin(phase) + 0.5 * math.sin(2 * phase) + 0.25 * math.sin(3 * phase)) / 1.75
+            t += syllable + rng.uniform(*SYLLABLE_GAP)
+    level = 0.0
+    steps = sorted(noise)
+    for i in range(len(samples)):
+        while steps and i >= steps[0][0] * SAMPLE_RATE:
+            level = steps.pop(0)[1]
+        samples[i] += rng.gauss(0, level)
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(b"".join(max(-32768, min(32767, int(sample))).to_bytes(2, "little", signed=True) for sample in samples))
+
+
+def make_fixtures(directory: str) -> list[Fixture]:
+    rng = random.Random(1)
+
+    def utterances(first: float, count: int) -> list[tuple[float, float]]:
+        result, t = [], first
+        for _ in range(count):
+            length = rng.uniform(0.8, 2.5)
+            result.append((t, t + length))
+            t += length + rng.uniform(1.0, 2.5)
+        return result
+
+    specs = [
+        ("quiet room", utterances(1.5, 6), [(0, 60)]),
+        ("noise rises mid-stream", utterances(1.5, 6), [(0, 60), (10, 250)]),
+        ("noise falls mid-stream", utterances(1.5, 6), [(0, 250), (10, 60)]),
+        ("speech right away", utterances(0.2, 6), [(0, 100)]),
+        ("quick back-and-forth", [(t, t + 0.8) for t in (1.0, 2.6, 4.2, 5.8, 7.4, 9.0)], [(0, 100)]),
+    ]
+    fixtures = []
+    for i, (name, spoken, noise) in enumerate(specs):
+        path = os.path.join(directory, f"fixture_{i}.wav")
+        synthesize(path, spoken[-1][1] + 2.0, spoken, noise, seed=i)
+        fixtures.append(Fixture(name, path, spoken))
+    return fixtures
+
+
+def score(result: Result, truth: list[tuple[float, float]], found: list[tuple[float, float, float]]):
+    """found: (start, end, detected) seconds of each segmented utterance. Each true utterance matches at most one that overlaps it."""
+    result.expected += len(truth)
+    result.detected += len(found)
+    unmatched = list(truth)
+    for start, end, detected in found:
+        overlapping = [utterance for utterance in unmatched if utterance[0] < end and start < utterance[1]]
+        if overlapping:
+            unmatched.remove(overlapping[-1])
+            result.matched += 1
+            result.latencies.append(detected - overlapping[-1][1])
+
+
+def bench_capture(fixture: Fixture) -> Result:
+    result = Result()
+    capture = AudioCapture(WavFileSource(fixture.path, realtime=False))
+    start = time.process_time()
+    capture.start()
+    found = []
+    while (utterance := capture.get()) is not None:
+        found.append((utterance.start_offset, utterance.end_offset, utterance.detected_offset))
+    result.seconds = time.process_time() - start
+    score(result, fixture.utterances, found)
+    return result
+
+
+def bench_listen(fixture: Fixture) -> Result:
+    """The previous loop: calibrate for a second, listen for one phrase, repeat (ignoring the time recognition took in between)"""
+    import speech_recognition as sr
+    result = Result()
+    recognizer = sr.Recognizer()
+    found = []
+    start = time.process_time()
+    with sr.AudioFile(fixture.path) as source:
+        read = source.stream.read #type: ignore
+        offset = [0] # Samples consumed so far
+
+        def counting_read(size):
+            data = read(size)
+            offset[0] += len(data) // SAMPLE_WIDTH
+            return data
+
+        source.stream.read = counting_read #type: ignore
+        total = source.FRAME_COUNT
+        while offset[0] < total:
+            recognizer.adjust_for_ambient_noise(source, duration=CALIBRATION)
+            audio = recognizer.listen(source)
+            detected = offset[0] / SAMPLE_RATE
+            if offset[0] >= total and frame_energy(audio.frame_data) <= recognizer.energy_threshold:
+                break # Only the silence at the end of the file
+            found.append((detected - len(audio.frame_data) / SAMPLE_WIDTH / SAMPLE_RATE, detected, detected))
+    result.seconds = time.process_time() - start
+    score(result, fixture.utterances, found)
+    return result
+
+
+def wav_duration(path: str) -> float:
+    with wave.open(path, "rb") as wav:
+        return wav.getnframes() / wav.getframerate()
+
+
+def run(fixtures: list[Fixture]):
+    rows = []
+    benches = {"persistent capture": bench_capture, "calibrate + listen per turn": bench_listen}
+    totals = {label: Result() for label in benches}
+    for fixture in fixtures:
+        audio_seconds = wav_duration(fixture.path)
+        for label, bench in benches.items():
+            result = bench(fixture)
+            rows.append(result.row(f"{fixture.name}: {label.split()[0]}", audio_seconds))
+            total = totals[label]
+            for name in ("expected", "detected", "matched", "seconds"):
+                setattr(total, name, getattr(total, name) + getattr(result, name))
+            total.latencies += result.latencies
+    audio_seconds = sum(wav_duration(fixture.path) for fixture in fixtures)
+    print(f"{'':<40} {'found':>7} {'false':>5}  {'latency ms':>14}  {'CPU':>6}")
+    print(f"{'':<40} {'':>7} {'':>5}  {'mean':>6}  {'max':>6}")
+    for row in rows:
+        print(row)
+    print()
+    for label, total in totals.items():
+        print(total.row(label, audio_seconds))
+    print("\nlatency: from the end of speech until the utterance is ready for recognition, in stream time.\n"
+          "Per turn, the previous approach also lost whatever was said while it calibrated and while the last utterance was being recognized.")
+
+
+def parse_fixture(path: str, spans: list[str]) -> Fixture:
+    utterances = []
+    for span in spans:
+        start, end = span.split("-")
+        utterances.append((float(start), float(end)))
+    return Fixture(os.path.basename(path), path, utterances)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run([parse_fixture(sys.argv[1], sys.argv[2:])])
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            run(make_fixtures(directory))
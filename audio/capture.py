@@ -0,0 +1,75 @@
+import queue
+import threading
+import time
+from typing import Optional
+
+from audio.sources import FRAME_DURATION, AudioSource
+from audio.vad import UtteranceSegmenter, VADConfig, Utterance
+
+
+class AudioCapture:
+    """
+    Reads audio from a source on a background thread for as long as it runs, segments it into utterances and queues them,
+    so nothing said between turns is missed. get() returns None once the source has ended or failed (see error).
+    While muted is set, the audio is read but ignored, and an utterance in progress is dropped.
+    While echo_gated is set, only speech louder than our own speech's echo starts an utterance (see UtteranceSegmenter).
+    """
+    def __init__(self, source: AudioSource, config: Optional[VADConfig] = None) -> None:
+        self.source = source
+        self.config = config
+        self.segmenter: Optional[UtteranceSegmenter] = None
+        self.utterances: queue.Queue[Optional[Utterance]] = queue.Queue()
+        self.error: Optional[Exception] = None
+        self.frames = 0
+        self.muted = False
+        self.echo_gated = False
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="audio capture", daemon=True)
+
+    def start(self):
+        """Opens the source, raising if that fails, and starts capturing"""
+        if not self.source.open():
+            raise RuntimeError("Couldn't open the audio source")
+        self.segmenter = UtteranceSegmenter(self.source.sample_rate, self.config)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        self._thread.join(timeout=1.0)
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Utterance]:
+        """Blocks until the next utterance is complete. Raises queue.Empty after timeout seconds."""
+        utterance = self.utterances.get(timeout=timeout)
+        if utterance is None:
+            self.utterances.put(None) # Keep reporting the end to later calls
+        return utterance
+
+    def _run(self):
+        frame_samples = int(self.source.sample_rate * FRAME_DURATION)
+        try:
+            while not self._stopping:
+                frame = self.source.read(frame_samples)
+                capture_time = time.monotonic()
+                if not frame:
+                    break
+                self.frames += 1
+                if self.muted:
+                    self.segmenter.skip(frame) #type: ignore
+                    continue
+                self.segmenter.echo_gated = self.echo_gated #type: ignore
+                utterance = self.segmenter.feed(frame, capture_time) #type: ignore
+                if utterance is not None:
+                    self._put(utterance)
+            utterance = self.segmenter.flush() #type: ignore
+            if utterance is not None:
+                self._put(utterance)
+        except Exception as e:
+            self.error = e
+            print(f"Audio capture failed: {e}")
+        finally:
+            self.source.release()
+            self.utterances.put(None)
+
+    def _put(self, utterance: Utterance):
+        utterance.queued_time = time.monotonic()
+        self.utterances.put(utterance)
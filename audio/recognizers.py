@@ -0,0 +1,221 @@
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Optional
+
+from audio.sources import SAMPLE_WIDTH
+from audio.vad import Utterance
+from metrics import Histogram
+
+DEFAULT_TIMEOUT = 10.0 # Seconds a request to an online recognizer may take
+WHISPER_MODEL = "base.en" # faster-whisper model name, or a path to a converted model
+WHISPER_SAMPLE_RATE = 16000
+LATENCY_EDGES_MS = [50, 100, 250, 500, 1000, 2000, 5000, 10000]
+
+
+class RecognitionError(Exception):
+    pass
+
+
+class NoSpeechRecognized(RecognitionError):
+    pass
+
+
+class RecognitionTimeout(RecognitionError):
+    pass
+
+
+class RecognitionRequestFailed(RecognitionError):
+    pass
+
+
+class RecognitionFailure(Enum):
+    NO_SPEECH = "no speech" # The audio was noise, or nothing intelligible
+    TIMEOUT = "timeout"
+    REQUEST = "request failed" # e.g. no network connection
+    ENGINE = "engine error" # Anything else, e.g. a missing model
+
+
+@dataclass
+class RecognitionResult:
+    text: Optional[str] # None if recognition failed
+    latency: float # Seconds the recognizer took
+    audio_duration: float # Seconds of audio recognized
+    failure: Optional[RecognitionFailure] = None
+    error: str = ""
+
+    @property
+    def real_time_factor(self) -> float:
+        return self.latency / self.audio_duration if self.audio_duration > 0 else 0.0
+
+    def __str__(self) -> str:
+        if self.failure is None:
+            return f"'{self.text}' in {self.latency:.2f} s"
+        return f"{self.failure.value}{f' ({self.error})' if self.error else ''} after {self.latency:.2f} s"
+
+
+@dataclass
+class RecognizerStats:
+    calls: int = 0
+    failures: Counter = field(default_factory=Counter) # RecognitionFailure: count
+    audio_seconds: float = 0.0
+    processing_seconds: float = 0.0
+    latency: Histogram = field(default_factory=lambda: Histogram(LATENCY_EDGES_MS))
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, result: RecognitionResult):
+        with self._lock:
+            self.calls += 1
+            if result.failure is not None:
+                self.failures[result.failure] += 1
+            self.audio_seconds += result.audio_duration
+            self.processing_seconds += result.latency
+            self.latency.add(result.latency)
+
+    @property
+    def real_time_factor(self) -> float:
+        return self.processing_seconds / self.audio_seconds if self.audio_seconds > 0 else 0.0
+
+    def __str__(self) -> str:
+        failures = ", ".join(f"{count} {failure.value}" for failure, count in self.failures.items()) or "no failures"
+        return (f"{self.calls} utterances ({failures}), real-time factor {self.real_time_factor:.2f}\n"
+                f"  latency: {self.latency}")
+
+
+class SpeechRecognizer:
+    """
+    Transcribes utterances. recognize() never raises: failures are returned in the result, classified by type,
+    and every call is recorded in stats. Subclasses implement _transcribe(), raising a RecognitionError subclass where they can tell why it failed.
+    """
+    name = "recognizer"
+
+    def __init__(self) -> None:
+        self.stats = RecognizerStats()
+
+    def recognize(self, utterance: Utterance) -> RecognitionResult:
+        start = time.monotonic()
+        text, failure, error = None, None, ""
+        try:
+            text = self._transcribe(utterance)
+        except NoSpeechRecognized:
+            failure = RecognitionFailure.NO_SPEECH
+        except RecognitionTimeout as e:
+            failure, error = RecognitionFailure.TIMEOUT, str(e)
+        except RecognitionRequestFailed as e:
+            failure, error = RecognitionFailure.REQUEST, str(e)
+        except Exception as e:
+            failure, error = RecognitionFailure.ENGINE, f"{type(e).__name__}: {e}"
+        result = RecognitionResult(text, time.monotonic() - start, utterance.duration, failure, error)
+        self.stats.record(result)
+        return result
+
+    def warm_up(self):
+        """Gets ready to transcribe the first utterance quickly (e.g. loads the model)"""
+        pass
+
+    def _transcribe(self, utterance: Utterance) -> str:
+        raise NotImplementedError
+
+
+class GoogleRecognizer(SpeechRecognizer):
+    """Google's free web speech API through speech_recognition. Needs a network connection."""
+    name = "google"
+
+    def __init__(self, language: str = "en-US", timeout: float = DEFAULT_TIMEOUT) -> None:
+        super().__init__()
+        self.language = language
+        self.timeout = timeout
+        self._recognizer = None
+
+    def warm_up(self):
+        if self._recognizer is None:
+            import speech_recognition as sr
+            self._recognizer = sr.Recognizer()
+            self._recognizer.operation_timeout = self.timeout
+
+    def _transcribe(self, utterance: Utterance) -> str:
+        import speech_recognition as sr
+        self.warm_up()
+        try:
+            return self._recognizer.recognize_google(utterance.to_audio_data(), language=self.language) #type: ignore
+        except sr.UnknownValueError as e:
+            raise NoSpeechRecognized() from e
+        except sr.RequestError as e:
+            if "timed out" in str(e):
+                raise RecognitionTimeout(f"no response within {self.timeout:.1f} s") from e
+            raise RecognitionRequestFailed(str(e)) from e
+        except TimeoutError as e: # A read timing out isn't wrapped in a RequestError
+            raise RecognitionTimeout(f"no response within {self.timeout:.1f} s") from e
+
+
+class WhisperRecognizer(SpeechRecognizer):
+    """
+    Offline transcription with faster-whisper on the local CPU (or GPU with device="cuda").
+    The model is loaded once, by warm_up() or the first call, and downloaded the first time it's used.
+    """
+    name = "whisper"
+
+    def __init__(self, model: str = WHISPER_MODEL, device: str = "cpu", compute_type: str = "int8", language: str = "en", beam_size: int = 1) -> None:
+        super().__init__()
+        self.model_name = model
+        self.device = device
+        self.compute_type = compute_type
+        self.language = language
+        self.beam_size = beam_size
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    def warm_up(self):
+        with self._model_lock:
+            if self._model is None:
+                from faster_whisper import WhisperModel
+                self._model = WhisperModel(self.model_name, device=self.device, compute_type=self.compute_type)
+
+    def _transcribe(self, utterance: Utterance) -> str:
+        import numpy as np
+        self.warm_up()
+        audio = utterance.audio
+        if utterance.sample_rate != WHISPER_SAMPLE_RATE:
+            audio = utterance.to_audio_data().get_raw_data(convert_rate=WHISPER_SAMPLE_RATE, convert_width=SAMPLE_WIDTH)
+        samples = np.frombuffer(audio, dtype=np.int16).astype(np.float32) / 32768.0
+        segments, _ = self._model.transcribe(samples, language=self.language, beam_size=self.beam_size) #type: ignore
+        text = " ".join(segment.text.strip() for segment in segments).strip()
+        if not text:
+            raise NoSpeechRecognized()
+        return text
+
+
+class FixtureRecognizer(SpeechRecognizer):
+    """
+    Returns prerecorded transcripts in order, one per utterance, e.g. for the utterances of a WAV fixture.
+    An empty transcript stands for an utterance that couldn't be recognized.
+    delay: seconds each call takes, to stand in for a real engine's latency
+    """
+    name = "fixture"
+
+    def __init__(self, transcripts: list[str], delay: float = 0.0) -> None:
+        super().__init__()
+        self.transcripts = list(transcripts)
+        self.delay = delay
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: str, delay: float = 0.0) -> "FixtureRecognizer":
+        """One transcript per line"""
+        with open(path) as f:
+            return cls([line.strip() for line in f.read().splitlines()], delay)
+
+    def _transcribe(self, utterance: Utterance) -> str:
+        with self._lock:
+            if self._next >= len(self.transcripts):
+                raise RecognitionError(f"All {len(self.transcripts)} transcripts have been used")
+            text = self.transcripts[self._next]
+            self._next += 1
+        if self.delay > 0:
+            time.sleep(self.delay)
+        if not text:
+            raise NoSpeechRecognized()
+        return text
@@ -0,0 +1,80 @@
+import time
+import wave
+from typing import Optional
+
+SAMPLE_RATE = 16000 # Samples per second requested from the microphone
+SAMPLE_WIDTH = 2 # Bytes per sample, audio is 16-bit mono PCM throughout
+FRAME_DURATION = 0.03 # Seconds of audio per frame read from a source
+
+
+class AudioSource:
+    """Base class for anything the capture thread can pull 16-bit mono PCM audio from"""
+    sample_rate: int = SAMPLE_RATE
+
+    def open(self) -> bool:
+        raise NotImplementedError
+
+    def read(self, num_samples: int) -> bytes:
+        """Blocks until num_samples samples are available and returns them. Returns fewer (eventually none) once the source is exhausted."""
+        raise NotImplementedError
+
+    def release(self):
+        pass
+
+
+class MicrophoneSource(AudioSource):
+    """The default microphone (or device_index), kept open for as long as the source is"""
+    def __init__(self, device_index: Optional[int] = None, sample_rate: int = SAMPLE_RATE) -> None:
+        self.device_index = device_index
+        self.sample_rate = sample_rate
+        self._microphone = None
+
+    def open(self) -> bool:
+        import speech_recognition as sr
+        self._microphone = sr.Microphone(device_index=self.device_index, sample_rate=self.sample_rate, chunk_size=int(self.sample_rate * FRAME_DURATION))
+        self._microphone.__enter__()
+        return self._microphone.stream is not None
+
+    def read(self, num_samples: int) -> bytes:
+        return self._microphone.stream.read(num_samples) #type: ignore
+
+    def release(self):
+        if self._microphone is not None:
+            self._microphone.__exit__(None, None, None)
+            self._microphone = None
+
+
+class WavFileSource(AudioSource):
+    """
+    Plays back a 16-bit mono WAV file, e.g. a recorded fixture.
+    realtime: deliver the audio no faster than it would come out of a microphone, so wall-clock latencies are realistic
+    """
+    def __init__(self, path: str, realtime: bool = True) -> None:
+        self.path = path
+        self.realtime = realtime
+        self._wav: Optional[wave.Wave_read] = None
+        self._start_time = 0.0
+        self._samples_read = 0
+
+    def open(self) -> bool:
+        self._wav = wave.open(self.path, "rb")
+        if self._wav.getnchannels() != 1 or self._wav.getsampwidth() != SAMPLE_WIDTH:
+            raise ValueError(f"{self.path} must be 16-bit mono, got {self._wav.getnchannels()} channels of {8 * self._wav.getsampwidth()}-bit samples")
+        self.sample_rate = self._wav.getframerate()
+        self._start_time = time.monotonic()
+        self._samples_read = 0
+        return True
+
+    def read(self, num_samples: int) -> bytes:
+        data = self._wav.readframes(num_samples) #type: ignore
+        self._samples_read += len(data) // SAMPLE_WIDTH
+        if self.realtime:
+            remaining = self._start_time + self._samples_read / self.sample_rate - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+        return data
+
+    def release(self):
+        if self._wav is not None:
+            self._wav.close()
+            self._wav = None
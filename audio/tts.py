@@ -0,0 +1,200 @@
+import hashlib
+import os
+import threading
+import time
+import wave
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Optional
+
+from audio.sources import SAMPLE_RATE, SAMPLE_WIDTH
+
+DEFAULT_CACHE_DIR = ".tts_cache"
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024 # Total size of cached phrase audio before the least recently used files are evicted
+SPEECH_RATE = 150 # Words per minute
+SPEECH_VOLUME = 0.9
+PLAYBACK_CHUNK = 1024 # Samples written to the audio device at a time, which bounds how long an interrupt takes to stop playback
+
+
+class SpeechPriority(IntEnum):
+    """Lower values are spoken first. Requests of the same priority are spoken in the order they were made."""
+    URGENT = 0
+    NORMAL = 1
+    BACKGROUND = 2 # e.g. rendering common phrases ahead of time
+
+
+@dataclass
+class PhraseCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    time_saved: float = 0.0 # Seconds of rendering saved by hits
+
+    def __str__(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses, {self.evictions} evictions, {self.time_saved:.1f} s of rendering saved"
+
+
+class PhraseCache:
+    """
+    On-disk cache of rendered phrases, one WAV file per phrase and voice setting.
+    Each hit refreshes the file's modification time, and once the directory exceeds max_bytes the least recently used files are deleted.
+    """
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = PhraseCacheStats()
+        self._render_times: dict[str, float] = {} # Seconds it took to render each phrase this session
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(text: str, voice: str) -> str:
+        return hashlib.sha256(f"{voice}\n{text}".encode()).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.wav")
+
+    def get(self, key: str) -> Optional[str]:
+        """Path of the rendered phrase, or None if it has to be rendered"""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        self.stats.time_saved += self._render_times.get(key, 0.0)
+        return path
+
+    def put(self, key: str, rendered_path: str, render_time: float) -> str:
+        """Moves a rendered file into the cache and returns its path there"""
+        path = self.path(key)
+        os.replace(rendered_path, path) # Atomic, so a concurrent reader never sees a partial file
+        self._render_times[key] = render_time
+        self._evict(keep=path)
+        return path
+
+    def _evict(self, keep: str):
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".wav"):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+        entries.sort()
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            if os.path.join(self.directory, name) == keep:
+                continue
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+            self.stats.evictions += 1
+
+
+class Synthesizer:
+    """Renders text to a WAV file. start() is called on the thread that renders, since some engines only work on the thread that initialized them."""
+    voice = "" # Identifies everything that changes the rendered audio besides the text, for the cache key
+
+    def start(self):
+        pass
+
+    def render(self, text: str, path: str):
+        raise NotImplementedError
+
+
+class Pyttsx3Synthesizer(Synthesizer):
+    """The system's speech engine through pyttsx3. The espeak and SAPI5 drivers write WAV files."""
+    def __init__(self, rate: int = SPEECH_RATE, volume: float = SPEECH_VOLUME) -> None:
+        self.rate = rate
+        self.volume = volume
+        self.voice = f"pyttsx3 rate={rate} volume={volume}"
+        self.engine = None
+
+    def start(self):
+        if self.engine is not None:
+            return
+        import pyttsx3
+        self.engine = pyttsx3.init()
+        self.engine.setProperty('rate', self.rate)
+        self.engine.setProperty('volume', self.volume)
+        self.voice += f" voice={self.engine.getProperty('voice')}"
+
+    def render(self, text: str, path: str):
+        self.engine.save_to_file(text, path) #type: ignore
+        self.engine.runAndWait() #type: ignore
+
+
+class NullSynthesizer(Synthesizer):
+    """Renders silence as long as the text would take to speak, after render_time seconds. For headless tests and benchmarks."""
+    def __init__(self, rate: int = SPEECH_RATE, render_time: float = 0.0) -> None:
+        self.rate = rate
+        self.render_time = render_time
+        self.voice = f"null rate={rate}"
+
+    def render(self, text: str, path: str):
+        if self.render_time > 0:
+            time.sleep(self.render_time)
+        duration = len(text.split()) / self.rate * 60
+        with wave.open(path, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(SAMPLE_WIDTH)
+            wav.setframerate(SAMPLE_RATE)
+            wav.writeframes(bytes(int(duration * SAMPLE_RATE) * SAMPLE_WIDTH))
+
+
+class AudioSink:
+    """Plays WAV files. play() blocks until the file has played, or returns early (False) once stop is set."""
+    def start(self):
+        pass
+
+    def play(self, path: str, stop: threading.Event) -> bool:
+        raise NotImplementedError
+
+
+class PyAudioSink(AudioSink):
+    """The default output device"""
+    def __init__(self) -> None:
+        self._pyaudio = None
+
+    def start(self):
+        if self._pyaudio is None:
+            import pyaudio
+            self._pyaudio = pyaudio.PyAudio()
+
+    def play(self, path: str, stop: threading.Event) -> bool:
+        self.start()
+        with wave.open(path, "rb") as wav:
+            stream = self._pyaudio.open(format=self._pyaudio.get_format_from_width(wav.getsampwidth()), #type: ignore
+                                        channels=wav.getnchannels(), rate=wav.getframerate(), output=True)
+            try:
+                while not stop.is_set():
+                    data = wav.readframes(PLAYBACK_CHUNK)
+                    if not data:
+                        return True
+                    stream.write(data)
+                return False
+            finally:
+                stream.stop_stream()
+                stream.close()
+
+
+class NullAudioSink(AudioSink):
+    """
+    Discards the audio, for running headless.
+    realtime: take as long as the audio would take to play, so queueing behaves as it would with speakers
+    """
+    def __init__(self, realtime: bool = True) -> None:
+        self.realtime = realtime
+        self.played = 0
+        self.seconds_played = 0.0
+
+    def play(self, path: str, stop: threading.Event) -> bool:
+        with wave.open(path, "rb") as wav:
+            duration = wav.getnframes() / wav.getframerate()
+        interrupted = stop.wait(duration) if self.realtime else stop.is_set()
+        if not interrupted:
+            self.played += 1
+            self.seconds_played += duration
+        return not interrupted
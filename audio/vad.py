@@ -0,0 +1,148 @@
+import math
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from audio.sources import FRAME_DURATION, SAMPLE_WIDTH
+
+START_RATIO = 3.0 # Frame energy relative to the noise floor above which a frame counts as voiced when waiting for speech
+END_RATIO = 2.0 # Frame energy relative to the noise floor below which a frame counts as unvoiced during speech
+MIN_SPEECH_ENERGY = 200.0 # RMS below which a frame is never voiced, so near-digital silence doesn't turn every click into speech
+START_FRAMES = 3 # Consecutive voiced frames needed to start an utterance
+HANGOVER = 0.5 # Seconds of unvoiced audio that end an utterance
+PRE_ROLL = 0.3 # Seconds of audio before the detected start that are included in the utterance, so soft onsets aren't cut off
+MAX_UTTERANCE = 15.0 # Seconds after which an utterance is ended regardless
+NOISE_WINDOW = 3.0 # Seconds over which the quietest frame is taken as the noise floor. Speech has enough pauses within that to not raise it.
+ECHO_GATE_RATIO = 3.0 # How many times the usual onset threshold a frame's energy has to exceed to count as voiced while our own speech plays
+ECHO_GATE_FRAMES = 8 # Consecutive voiced frames needed to start an utterance while our own speech plays, so its louder syllables don't start one
+
+
+def frame_energy(frame: bytes) -> float:
+    """RMS of a frame of 16-bit PCM samples"""
+    samples = array("h", frame)
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(sample * sample for sample in samples) / len(samples))
+
+
+@dataclass
+class Utterance:
+    audio: bytes # 16-bit mono PCM
+    sample_rate: int
+    start_offset: float # Seconds into the stream at which the utterance (including pre-roll) starts
+    end_offset: float # Seconds into the stream at which the last voiced frame ends
+    detected_offset: float # Seconds into the stream at which the end of the utterance was detected
+    end_time: float # time.monotonic() at which the last voiced frame was captured
+    queued_time: float = 0.0 # time.monotonic() at which the utterance was handed out
+
+    @property
+    def duration(self) -> float:
+        return len(self.audio) / SAMPLE_WIDTH / self.sample_rate
+
+    def to_audio_data(self):
+        import speech_recognition as sr
+        return sr.AudioData(self.audio, self.sample_rate, SAMPLE_WIDTH)
+
+
+@dataclass
+class VADConfig:
+    start_ratio: float = START_RATIO
+    end_ratio: float = END_RATIO
+    min_speech_energy: float = MIN_SPEECH_ENERGY
+    start_frames: int = START_FRAMES
+    hangover: float = HANGOVER
+    pre_roll: float = PRE_ROLL
+    max_utterance: float = MAX_UTTERANCE
+    noise_window: float = NOISE_WINDOW
+    echo_gate_ratio: float = ECHO_GATE_RATIO
+    echo_gate_frames: int = ECHO_GATE_FRAMES
+
+
+class UtteranceSegmenter:
+    """
+    Energy-based voice activity detection against a rolling noise floor estimate, the minimum frame energy over the last few seconds.
+    Feed it consecutive frames of a stream and it returns each utterance once its end has been detected.
+    The noise floor is tracked on every frame from the first one on, so no up-front calibration period is needed, and it follows
+    changes in the background noise even in the middle of an utterance.
+    While echo_gated is set (our own speech is playing), an utterance only starts on speech clearly louder than the loudspeaker's echo
+    (see VADConfig.echo_gate_ratio and echo_gate_frames), so the user can interrupt without the echo being taken for them.
+    """
+    def __init__(self, sample_rate: int, config: Optional[VADConfig] = None, frame_duration: float = FRAME_DURATION) -> None:
+        self.sample_rate = sample_rate
+        self.config = config if config is not None else VADConfig()
+        self.frame_duration = frame_duration
+        self.noise_floor = 0.0
+        self.echo_gated = False
+        self._energies: deque[float] = deque(maxlen=max(1, round(self.config.noise_window / frame_duration)))
+        self.in_speech = False
+        self._pre_roll: deque[bytes] = deque(maxlen=max(1, round(self.config.pre_roll / frame_duration)))
+        self._frames: list[bytes] = []
+        self._samples = 0 # Samples fed so far
+        self._onset_frames = 0
+        self._start_offset = 0.0
+        self._last_voiced_offset = 0.0
+        self._last_voiced_time = 0.0
+
+    def feed(self, frame: bytes, capture_time: float) -> Optional[Utterance]:
+        """capture_time: time.monotonic() at which the frame was captured. Returns the utterance this frame completes, if any."""
+        config = self.config
+        energy = frame_energy(frame)
+        self._samples += len(frame) // SAMPLE_WIDTH
+        frame_end = self._samples / self.sample_rate
+        self._energies.append(energy)
+        self.noise_floor = min(self._energies)
+
+        if not self.in_speech:
+            self._pre_roll.append(frame)
+            threshold = max(config.min_speech_energy, self.noise_floor * config.start_ratio)
+            if self.echo_gated:
+                threshold *= config.echo_gate_ratio
+            if energy > threshold:
+                self._onset_frames += 1
+            else:
+                self._onset_frames = 0
+            if self._onset_frames >= (config.echo_gate_frames if self.echo_gated else config.start_frames):
+                self.in_speech = True
+                self._frames = list(self._pre_roll)
+                self._pre_roll.clear()
+                self._start_offset = max(0.0, frame_end - sum(len(f) for f in self._frames) / SAMPLE_WIDTH / self.sample_rate)
+                self._last_voiced_offset = frame_end
+                self._last_voiced_time = capture_time
+            return None
+
+        self._frames.append(frame)
+        if energy > max(config.min_speech_energy, self.noise_floor * config.end_ratio):
+            self._last_voiced_offset = frame_end
+            self._last_voiced_time = capture_time
+        if frame_end - self._last_voiced_offset >= config.hangover or frame_end - self._start_offset >= config.max_utterance:
+            return self._finish(frame_end)
+        return None
+
+    def skip(self, frame: bytes):
+        """Accounts for a frame that is to be ignored: drops the utterance in progress, if any, and leaves the noise floor as it is"""
+        self._samples += len(frame) // SAMPLE_WIDTH
+        self.in_speech = False
+        self._frames = []
+        self._onset_frames = 0
+        self._pre_roll.clear()
+
+    def flush(self) -> Optional[Utterance]:
+        """Ends the utterance in progress, if any, e.g. when the stream ends"""
+        if not self.in_speech:
+            return None
+        return self._finish(self._samples / self.sample_rate)
+
+    def _finish(self, detected_offset: float) -> Utterance:
+        utterance = Utterance(
+            audio=b"".join(self._frames),
+            sample_rate=self.sample_rate,
+            start_offset=self._start_offset,
+            end_offset=self._last_voiced_offset,
+            detected_offset=detected_offset,
+            end_time=self._last_voiced_time,
+        )
+        self.in_speech = False
+        self._frames = []
+        self._onset_frames = 0
+        return utterance
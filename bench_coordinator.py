@@ -0,0 +1,248 @@
+"""
+Measures end-to-end turn latency of the sequential Coordinator, the sequential Coordinator querying the agent speculatively while the robot moves,
+and the AsyncCoordinator with mock components: scripted user utterances, the fake Responses API endpoint (fake_llm.FakeLLMServer)
+streaming canned agent responses, a MockRobot whose commands take ROBOT_COMMAND_TIME and headless speech that takes as long as it would to play.
+The barge-in scenario has the user correct the agent while the robot is on its way, the blocked path scenario has a robot command fail.
+Run from the repository root:
+    python bench_coordinator.py
+"""
+import json
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from agent import Agent
+from async_coordinator import AsyncCoordinator
+from audio.tts import NullAudioSink, NullSynthesizer, PhraseCache
+from coordinator import Coordinator
+from fake_llm import FakeLLMServer
+from llm_backend import OpenAIBackend
+from robot import BasketAction, MockRobot
+from state_representation import Location
+from voice import VoiceSpeaker
+
+FIRST_TOKEN_DELAY = 0.4 # Seconds, roughly what the API takes before the first token
+CHUNK_DELAY = 0.015 # Seconds between 8 character deltas, roughly 130 tokens/s
+ROBOT_COMMAND_TIME = 0.5 # Seconds each robot command takes
+RENDER_TIME = 0.1 # Seconds the speech engine takes to render a phrase
+SPEECH_RATE = 300 # Words per minute, faster than the robot really speaks to keep the benchmark short
+
+
+def command(action: str, location=None, basket_position=None, user_message=None, plan=None) -> dict:
+    return {"action": action, "location": location, "basket_position": basket_position, "user_message": user_message, "plan": plan}
+
+
+def response(*commands: dict) -> str:
+    return json.dumps({"commands": list(commands)})
+
+
+@dataclass
+class Utterance:
+    text: str
+    responses: list[str] # The agent's response to it, followed by its responses to the robot states after the robot commands it ends with
+    barge_in_after: Optional[float] = None # Spoken this many seconds after the previous utterance, rather than once the previous turn is over
+
+
+SCENARIOS = {
+    "vitamins to friend": [
+        Utterance("My friend at the closet needs the vitamins on my desk.",
+                  [response(command("REQUEST_USER_ACTION", user_message="I can bring them over. Please put the vitamins in the basket and tell me when they're in."))]),
+        Utterance("They're in the basket.",
+                  [response(command("SPECIFY_PLAN", plan="Raise the basket, move it to the closet and lower it there for the friend."),
+                            command("GO_TO_STATE", location="CLOSET", basket_position="LOWERED"),
+                            command("REQUEST_USER_ACTION", user_message="The basket is lowered at the closet. Your friend can take the vitamins out now, let me know once they have."))]),
+        Utterance("They have them, thanks.",
+                  [response(command("GO_TO_STATE", location="DESK", basket_position="LOWERED"),
+                            command("GOAL_COMPLETED"))]),
+    ],
+    "step by step": [ # The agent checks the robot state before telling the user, as it tends to
+        Utterance("Take the basket to the closet, my friend wants to put a drink in it.",
+                  [response(command("SPECIFY_PLAN", plan="Bring the basket to the closet and lower it, then bring it back once the drink is in."),
+                            command("GO_TO_STATE", location="CLOSET", basket_position="LOWERED")),
+                   response(command("REQUEST_USER_ACTION", user_message="The basket is lowered at the closet. Let me know once your friend has put the drink in."))]),
+        Utterance("The drink is in.",
+                  [response(command("GO_TO_STATE", location="DESK", basket_position="LOWERED")),
+                   response(command("GOAL_COMPLETED"))]),
+    ],
+    "blocked path": [ # The robot can't get to the bed, so the response made ahead of time for the basket at the bed is discarded
+        Utterance("Take the basket to the bed please.",
+                  [response(command("GO_TO_STATE", location="BED", basket_position="LOWERED")),
+                   response(command("REQUEST_USER_ACTION", user_message="I couldn't get to the bed, the way is blocked. Should I bring the basket to the closet instead?"))]),
+        Utterance("Yes, the closet.",
+                  [response(command("GO_TO_STATE", location="CLOSET", basket_position="LOWERED")),
+                   response(command("REQUEST_USER_ACTION", user_message="The basket is lowered at the closet. What would you like me to do next?"))]),
+        Utterance("That's all, thanks.", [response(command("GOAL_COMPLETED"))]),
+    ],
+    "barge-in": [
+        Utterance("Take the basket to the closet please.",
+                  [response(command("GO_TO_STATE", location="CLOSET", basket_position="LOWERED"),
+                            command("REQUEST_USER_ACTION", user_message="The basket is lowered at the closet. What would you like me to do next?"))]),
+        Utterance("Wait, take it to the bed instead.",
+                  [response(command("GO_TO_STATE", location="BED", basket_position="LOWERED"),
+                            command("REQUEST_USER_ACTION", user_message="The basket is lowered at the bed. What would you like me to do next?"))],
+                  barge_in_after=1.2),
+        Utterance("That's all, thanks.", [response(command("GOAL_COMPLETED"))]),
+    ],
+}
+BLOCKED = {"blocked path": Location.BED} # Location the robot can't move to in a scenario
+COORDINATORS = ["sequential", "speculative", "async"]
+
+
+@dataclass
+class TurnRecord:
+    text: str
+    spoken: float = 0.0 # When the user said it
+    first_motion: Optional[float] = None
+    first_speech: Optional[float] = None
+    heard: Optional[float] = None # When the user had heard the turn's answer
+
+
+@dataclass
+class Recorder:
+    turns: list[TurnRecord] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def mark(self, name: str):
+        with self.lock:
+            turn = self.turns[-1] if self.turns else None
+            if turn is not None and getattr(turn, name) is None:
+                setattr(turn, name, time.monotonic())
+
+
+class BenchRobot(MockRobot):
+    def __init__(self, recorder: Recorder, blocked: Optional[Location] = None) -> None:
+        super().__init__(command_duration=ROBOT_COMMAND_TIME)
+        self.recorder = recorder
+        self.blocked = blocked
+
+    def handle_command(self, command):
+        self.recorder.mark("first_motion")
+        if command.action == BasketAction.MOVE_BASKET_TO_LOCATION and command.location == self.blocked:
+            time.sleep(ROBOT_COMMAND_TIME)
+            raise RuntimeError(f"The way to the {command.location.value} is blocked")
+        super().handle_command(command)
+
+    def ask_update_item_list(self):
+        pass
+
+
+class BenchSpeaker(VoiceSpeaker):
+    def __init__(self, recorder: Recorder, cache_dir: str) -> None:
+        super().__init__(NullSynthesizer(rate=SPEECH_RATE, render_time=RENDER_TIME), NullAudioSink(), PhraseCache(cache_dir))
+        self.recorder = recorder
+
+    def speak(self, text, *args, **kwargs):
+        self.recorder.mark("first_speech")
+        return super().speak(text, *args, **kwargs)
+
+
+class ScriptedVoiceListener:
+    """
+    Says each utterance once the previous turn is over and its answer has been heard, or barge_in_after seconds after the previous utterance.
+    The coordinators wire the speaker's playback to the listener as they do the microphone: the sequential ones mute it, so an utterance
+    due while speech plays isn't heard and is said again once it ends, AsyncCoordinator only echo gates it, which a user's voice gets through.
+    turn_over(n): whether the coordinator has finished n turns
+    """
+    def __init__(self, script: list[Utterance], recorder: Recorder, speaker: VoiceSpeaker, turn_over: Callable[[int], bool]) -> None:
+        self.script = script
+        self.recorder = recorder
+        self.speaker = speaker
+        self.turn_over = turn_over
+        self._next = 0
+        self._unmuted = threading.Event()
+        self._unmuted.set()
+
+    def start(self):
+        pass
+
+    def set_muted(self, muted: bool):
+        if muted:
+            self._unmuted.clear()
+        else:
+            self._unmuted.set()
+
+    def set_echo_gated(self, gated: bool):
+        pass
+
+    def get_voice(self):
+        if self._next >= len(self.script):
+            raise EOFError("End of the script")
+        utterance = self.script[self._next]
+        if self._next > 0:
+            previous = self.recorder.turns[-1]
+            if utterance.barge_in_after is not None:
+                spoken = previous.spoken + utterance.barge_in_after
+                time.sleep(max(0.0, spoken - time.monotonic()))
+                if not self._unmuted.is_set():
+                    self._unmuted.wait()
+                    spoken = time.monotonic()
+            else:
+                while not self.turn_over(self._next):
+                    time.sleep(0.001)
+                self.speaker.wait_until_done()
+                spoken = time.monotonic()
+                previous.heard = spoken
+        else:
+            spoken = time.monotonic()
+        with self.recorder.lock:
+            self.recorder.turns.append(TurnRecord(utterance.text, spoken=spoken))
+        self._next += 1
+        return utterance.text
+
+
+@dataclass
+class RunResult:
+    recorder: Recorder
+    total: float # Seconds the session took
+    llm_calls: int
+    coordinator: Coordinator
+
+
+def run(name: str, kind: str) -> RunResult:
+    scenario = SCENARIOS[name]
+    # By turn, so a speculative request gets the response to the conversation it was made with
+    server = FakeLLMServer([text for utterance in scenario for text in utterance.responses], first_token_delay=FIRST_TOKEN_DELAY, chunk_delay=CHUNK_DELAY, by_turn=True)
+    server.start()
+    recorder = Recorder()
+    robot = BenchRobot(recorder, BLOCKED.get(name))
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            agent = Agent(stream=True, backend=OpenAIBackend(base_url=server.base_url, api_key="fake"))
+            speaker = BenchSpeaker(recorder, cache_dir)
+            if kind == "async":
+                coordinator = AsyncCoordinator(robot=robot, agent=agent, voice_speaker=speaker, ask_item_list=False)
+                turn_over = lambda n: sum(turn.finished is not None for turn in coordinator.turns) >= n
+            else:
+                coordinator = Coordinator(robot=robot, agent=agent, voice_speaker=speaker, speculate=kind == "speculative")
+                turn_over = lambda n: True # It only asks for input once the turn is over
+            coordinator.voice_listener = ScriptedVoiceListener(scenario, recorder, speaker, turn_over) #type: ignore
+            coordinator.voice_speaker.on_playback = coordinator.voice_listener.set_echo_gated if kind == "async" else coordinator.voice_listener.set_muted
+            start = time.monotonic()
+            coordinator.run()
+            end = time.monotonic()
+            recorder.turns[-1].heard = end
+    finally:
+        server.stop()
+    return RunResult(recorder, end - start, len(server.requests), coordinator)
+
+
+def since(turn: TurnRecord, t: Optional[float]) -> str:
+    return f"{t - turn.spoken:8.2f}" if t is not None else f"{'-':>8}"
+
+
+if __name__ == "__main__":
+    run("barge-in", "sequential") # Discarded, so the first run measured doesn't pay for one-off imports and connection setup
+    results = [(name, kind, run(name, kind)) for name in SCENARIOS for kind in COORDINATORS]
+    print(f"LLM: {FIRST_TOKEN_DELAY:.1f} s to the first token, robot: {ROBOT_COMMAND_TIME:.1f} s per command, speech at {SPEECH_RATE} words/min\n")
+    print(f"{'scenario':<20}{'coordinator':<13}{'turn':<36}{'motion s':>9}{'speech s':>9}{'heard s':>9}")
+    for name, kind, result in results:
+        for turn in result.recorder.turns:
+            print(f"{name:<20}{kind:<13}{turn.text[:34]:<36}"
+                  f"{since(turn, turn.first_motion):>9}{since(turn, turn.first_speech):>9}{since(turn, turn.heard):>9}")
+        print(f"{name:<20}{kind:<13}{f'session, {result.llm_calls} LLM calls':<36}{'':>9}{'':>9}{result.total:9.2f}\n")
+    print("Times are from when the user spoke. heard: the answer had been spoken (for an interrupted turn, when the correction was spoken).\n")
+    for name, kind, result in results:
+        if kind == "speculative":
+            print(f"{name:<20}speculative agent calls: {result.coordinator.speculation_stats}")
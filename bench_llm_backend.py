@@ -0,0 +1,54 @@
+"""
+Load-tests the LLM backend offline against the local fake Responses API endpoint (fake_llm.FakeLLMServer):
+latency, retries and failures for concurrent agent-sized calls, with and without injected server errors and with a tight deadline.
+Run from the repository root:
+    python bench_llm_backend.py
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from agent import AgentPlan
+from fake_llm import FakeLLMServer
+from llm_backend import LLMError, OpenAIBackend
+
+CALLS = 40
+CONCURRENCY = 4
+OUTPUT = json.dumps({"commands": [
+    {"action": "GO_TO_STATE", "location": "CLOSET", "basket_position": "LOWERED", "user_message": None, "plan": None},
+    {"action": "REQUEST_USER_ACTION", "location": None, "basket_position": None, "user_message": "Please put the drink in the basket", "plan": None},
+]})
+INPUT = [{"role": "system", "content": "You control a robotic basket. " * 50}, {"role": "user", "content": "Bring me my drink from the closet"}]
+SCENARIOS = [
+    # name, server settings, backend settings
+    ("no errors", dict(), dict()),
+    ("20% errors", dict(error_rate=0.2), dict()),
+    ("50% errors", dict(error_rate=0.5), dict()),
+    ("20% errors, 0.3 s deadline", dict(error_rate=0.2), dict(deadline=0.3)),
+]
+
+
+def run(server_settings: dict, backend_settings: dict):
+    server = FakeLLMServer([OUTPUT], first_token_delay=0.1, chunk_delay=0.002, delay_jitter=0.5, repeat=True, seed=0, **server_settings)
+    server.start()
+    backend = OpenAIBackend(base_url=server.base_url, api_key="fake", backoff=0.05, seed=0, **backend_settings)
+
+    def call(_):
+        try:
+            backend.parse(INPUT, AgentPlan)
+        except LLMError:
+            pass
+
+    start = time.monotonic()
+    try:
+        with ThreadPoolExecutor(CONCURRENCY) as pool:
+            list(pool.map(call, range(CALLS)))
+    finally:
+        server.stop()
+    return backend.stats, time.monotonic() - start
+
+
+if __name__ == "__main__":
+    results = [(name, *run(server_settings, backend_settings)) for name, server_settings, backend_settings in SCENARIOS]
+    for name, stats, elapsed in results:
+        print(f"{name}: {CALLS} calls x {CONCURRENCY} concurrent in {elapsed:.2f} s\n  {stats}")
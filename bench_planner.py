@@ -0,0 +1,90 @@
+"""
+Counts the LLM calls the readme scenario ("I am at the desk. My drink is by the closet. I want my drink brought to me. My friend is at the closet")
+takes when the agent commands every basket action individually, when it states goal states for the local planner to expand,
+and when it also sends every command it can already determine in a single multi-action response.
+The LLM is replaced by scripted responses, and the robot by MockRobot. Run from the repository root:
+    python bench_planner.py
+"""
+from typing import Optional
+
+from agent import Agent, AgentAction, AgentCommand
+from coordinator import Coordinator, CoordinatorState
+from robot import MockRobot
+from state_representation import BasketPosition, Location
+from voice import MockVoiceListener, MockVoiceSpeaker
+
+USER_INPUTS = [
+    "I am at the desk. My drink is by the closet. I want my drink brought to me. My friend is at the closet",
+    "My friend put the drink in the basket",
+]
+PLAN = "Move the basket to the closet and lower it, ask the friend to put the drink in, then raise it, bring it to the desk and lower it"
+
+
+def command(action: AgentAction, location: Optional[Location] = None, basket_position: Optional[BasketPosition] = None,
+            user_message: Optional[str] = None, plan: Optional[str] = None) -> AgentCommand:
+    return AgentCommand.model_validate({
+        "action": action, "location": location, "basket_position": basket_position, "user_message": user_message, "plan": plan,
+    })
+
+
+# Each inner list is one LLM response
+STEP_BY_STEP = [
+    [command(AgentAction.SPECIFY_PLAN, plan=PLAN)],
+    [command(AgentAction.RAISE_BASKET)],
+    [command(AgentAction.MOVE_BASKET_TO_LOCATION, location=Location.CLOSET)],
+    [command(AgentAction.LOWER_BASKET)],
+    [command(AgentAction.REQUEST_USER_ACTION, user_message="Please ask your friend to put the drink in the basket")],
+    [command(AgentAction.RAISE_BASKET)],
+    [command(AgentAction.MOVE_BASKET_TO_LOCATION, location=Location.DESK)],
+    [command(AgentAction.LOWER_BASKET)],
+    [command(AgentAction.GOAL_COMPLETED)],
+]
+
+GOAL_STATES = [
+    [command(AgentAction.SPECIFY_PLAN, plan=PLAN)],
+    [command(AgentAction.GO_TO_STATE, location=Location.CLOSET, basket_position=BasketPosition.LOWERED)],
+    [command(AgentAction.REQUEST_USER_ACTION, user_message="Please ask your friend to put the drink in the basket")],
+    [command(AgentAction.GO_TO_STATE, location=Location.DESK, basket_position=BasketPosition.LOWERED)],
+    [command(AgentAction.GOAL_COMPLETED)],
+]
+
+MULTI_ACTION = [
+    [
+        command(AgentAction.SPECIFY_PLAN, plan=PLAN),
+        command(AgentAction.GO_TO_STATE, location=Location.CLOSET, basket_position=BasketPosition.LOWERED),
+        command(AgentAction.REQUEST_USER_ACTION, user_message="Please ask your friend to put the drink in the basket"),
+    ],
+    [
+        command(AgentAction.GO_TO_STATE, location=Location.DESK, basket_position=BasketPosition.LOWERED),
+        command(AgentAction.GOAL_COMPLETED),
+    ],
+]
+
+
+class ScriptedAgent(Agent):
+    """Agent whose LLM responses are replayed from a list instead of queried"""
+    def __init__(self, responses: list[list[AgentCommand]]) -> None:
+        super().__init__()
+        self.responses = list(responses)
+
+    def query_llm(self, llm_input: list, on_delta=None) -> Optional[list[AgentCommand]]:
+        return self.responses.pop(0)
+
+
+def run_scenario(responses: list[list[AgentCommand]]):
+    robot = MockRobot()
+    agent = ScriptedAgent(responses)
+    coordinator = Coordinator(robot=robot, agent=agent, voice_listener=MockVoiceListener(), voice_speaker=MockVoiceSpeaker()) #type: ignore
+    for user_input in USER_INPUTS:
+        coordinator.handle_user_input(user_input)
+    assert coordinator.state == CoordinatorState.DONE, f"Scenario ended in {coordinator.state}"
+    assert robot.state.location == Location.DESK and robot.state.basket_position == BasketPosition.LOWERED, f"Scenario ended with {robot.state}"
+    return agent.history_manager.stats
+
+
+if __name__ == "__main__":
+    scenarios = [("step by step", STEP_BY_STEP), ("goal states", GOAL_STATES), ("multi-action", MULTI_ACTION)]
+    results = [(name, run_scenario(responses)) for name, responses in scenarios]
+    print(f"{'agent commands':<20}{'LLM calls':>11}{'tokens sent':>13}")
+    for name, stats in results:
+        print(f"{name:<20}{stats.calls:>11}{sum(stats.tokens_sent):>13}")
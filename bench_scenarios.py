@@ -0,0 +1,302 @@
+"""
+End-to-end benchmark of the agent side as a whole: drives Coordinator through scripted scenarios (the readme's desk/closet/friend scenario,
+a multi-item transfer and a long session) with scripted user input, the fake Responses API endpoint (fake_llm.FakeLLMServer) replaying
+the agent's responses, headless speech and a MockRobot, or with --simulated the real Robot control loop and vision pipeline against the simulated basket.
+Reports turns, LLM calls, tokens, wall time per turn and robot command counts per scenario, and compares them against the stored baseline:
+the counts must match exactly (a different count means the behaviour changed), tokens may grow by TOKEN_TOLERANCE and turn times by TIME_TOLERANCE.
+Exits with status 1 on a regression. Timings depend on the machine, refresh the baseline on the one that runs the benchmark with --update-baseline.
+Run from the repository root:
+    python bench_scenarios.py [--simulated] [--update-baseline] [-v] [scenario ...]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+import tracing
+from agent import Agent
+from audio.tts import NullAudioSink, NullSynthesizer, PhraseCache
+from bench_coordinator import command, response
+from coordinator import Coordinator, CoordinatorState
+from fake_llm import FakeLLMServer
+from llm_backend import OpenAIBackend
+from robot import MockRobot
+from state_representation import BasketPosition, Location
+from voice import VoiceSpeaker
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_scenarios_baseline.json")
+FIRST_TOKEN_DELAY = 0.05 # Seconds, short so the benchmark measures the system's own overhead more than the fake LLM
+CHUNK_DELAY = 0.001 # Seconds between streamed deltas
+ROBOT_COMMAND_TIME = 0.02 # Seconds each MockRobot command takes
+SIMULATION_TIME_SCALE = 8.0
+TOKEN_TOLERANCE = 0.05 # Fraction by which the tokens sent may grow before it counts as a regression
+TIME_TOLERANCE = 0.25 # Fraction by which the mean and max turn times may grow
+TIME_SLACK = 0.05 # Seconds turn times may grow by in any case, so that short turns don't flag noise
+LONG_SESSION_ERRANDS = 12
+
+
+@dataclass
+class Turn:
+    text: str
+    responses: list[str] # The agent's response to it, followed by its responses to the robot states after the robot commands it ends with
+    items: Optional[list[str]] = None # The basket's item list as updated before the turn, unchanged if None
+
+
+@dataclass
+class Scenario:
+    turns: list[Turn]
+    location: Location # Where the basket should end up
+    basket_position: BasketPosition
+
+
+def readme_scenario() -> Scenario:
+    return Scenario([
+        Turn("I am at the desk. My drink is by the closet. I want my drink brought to me. My friend is at the closet",
+             [response(command("SPECIFY_PLAN", plan="Move the basket to the closet and lower it, ask the friend to put the drink in, then raise it, bring it to the desk and lower it"),
+                       command("GO_TO_STATE", location="CLOSET", basket_position="LOWERED"),
+                       command("REQUEST_USER_ACTION", user_message="Please ask your friend to put the drink in the basket"))]),
+        Turn("My friend put the drink in the basket",
+             [response(command("GO_TO_STATE", location="DESK", basket_position="LOWERED"),
+                       command("GOAL_COMPLETED"))],
+             items=["drink"]),
+    ], Location.DESK, BasketPosition.LOWERED)
+
+
+def multi_item_scenario() -> Scenario:
+    return Scenario([
+        Turn("I'm at the desk. Please bring me the book my partner has at the bed and the keys my friend has at the closet.",
+             [response(command("SPECIFY_PLAN", plan="Collect the book at the bed, then the keys at the closet, then bring both to the desk"),
+                       command("GO_TO_STATE", location="BED", basket_position="LOWERED"),
+                       command("REQUEST_USER_ACTION", user_message="Please ask your partner at the bed to put the book in the basket."))]),
+        Turn("The book is in.",
+             [response(command("GO_TO_STATE", location="CLOSET", basket_position="LOWERED"),
+                       command("REQUEST_USER_ACTION", user_message="Please ask your friend at the closet to put the keys in the basket too."))],
+             items=["book"]),
+        Turn("The keys are in too.",
+             [response(command("GO_TO_STATE", location="DESK", basket_position="LOWERED")),
+              response(command("REQUEST_USER_ACTION", user_message="The book and the keys are at the desk. Please take them out and tell me when you have."))],
+             items=["book", "keys"]),
+        Turn("Got them, thanks.", [response(command("GOAL_COMPLETED"))], items=[]),
+    ], Location.DESK, BasketPosition.LOWERED)
+
+
+def long_session_scenario() -> Scenario:
+    """Errands around the room, alternately answered in one response and checked on after the robot has moved, long enough to fill the history budget"""
+    locations = [Location.CLOSET, Location.BED, Location.DESK]
+    turns = []
+    for i in range(LONG_SESSION_ERRANDS):
+        location = locations[i % len(locations)].value
+        done = command("REQUEST_ADDITIONAL_INFO", user_message=f"The basket is lowered at the {location.lower()}. What would you like me to do next?")
+        go = command("GO_TO_STATE", location=location, basket_position="LOWERED")
+        responses = [response(go, done)] if i % 2 == 0 else [response(go), response(done)]
+        turns.append(Turn(f"Now take the basket to the {location.lower()} and lower it.", responses, items=[f"item {i}"] if i % 3 == 0 else None))
+    turns.append(Turn("That's all for today, thanks.", [response(command("GOAL_COMPLETED"))]))
+    return Scenario(turns, locations[(LONG_SESSION_ERRANDS - 1) % len(locations)], BasketPosition.LOWERED)
+
+
+SCENARIOS = {
+    "readme": readme_scenario,
+    "multi-item": multi_item_scenario,
+    "long session": long_session_scenario,
+}
+
+
+class ScriptedVoiceListener:
+    """Hands out the scenario's utterances in order, and sets the basket's item list the robot reports for each turn"""
+    def __init__(self, turns: list[Turn], robot) -> None:
+        self.turns = turns
+        self.robot = robot
+        self._next = 0
+
+    def start(self):
+        pass
+
+    def set_muted(self, muted: bool):
+        pass
+
+    def get_voice(self):
+        if self._next >= len(self.turns):
+            raise EOFError("End of the script")
+        turn = self.turns[self._next]
+        self._next += 1
+        self.robot.next_items = turn.items
+        return turn.text
+
+
+class ScriptedItemList:
+    """Robot mixin: the item list comes from the script instead of being asked for on stdin"""
+    next_items: Optional[list[str]] = None
+
+    def ask_update_item_list(self):
+        if self.next_items is not None:
+            self.state.items_in_basket = self.next_items #type: ignore
+            self.next_items = None
+
+
+class BenchRobot(ScriptedItemList, MockRobot):
+    def stop(self):
+        pass
+
+
+def make_robot(simulated: bool):
+    if not simulated:
+        return BenchRobot(command_duration=ROBOT_COMMAND_TIME)
+    from simulation import SimulatedRobot # Imported here since it starts OpenCV
+
+    class BenchSimulatedRobot(ScriptedItemList, SimulatedRobot):
+        pass
+    robot = BenchSimulatedRobot(time_scale=SIMULATION_TIME_SCALE)
+    robot.state.basket_position = BasketPosition.LOWERED # As MockRobot starts, so both run the same script
+    return robot
+
+
+@dataclass
+class ScenarioResult:
+    turns: int
+    llm_calls: int
+    tokens_sent: int # History tokens sent to the LLM, counted with the model's tokenizer
+    output_tokens: int
+    robot_commands: dict[str, int] # By action, including the ones a goal state was expanded into
+    turn_time_mean: float # Seconds from the user's input until the agent handed back to them
+    turn_time_max: float
+    turn_times: list[float]
+    wall_time: float # Of the whole session
+    completed: bool # The goal was completed with the basket where the scenario expects it
+
+
+def run(name: str, simulated: bool) -> ScenarioResult:
+    scenario = SCENARIOS[name]()
+    server = FakeLLMServer([text for turn in scenario.turns for text in turn.responses], first_token_delay=FIRST_TOKEN_DELAY, chunk_delay=CHUNK_DELAY)
+    server.start()
+    robot = make_robot(simulated)
+    tracing.disable()
+    tracer = tracing.enable()
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            agent = Agent(stream=True, backend=OpenAIBackend(base_url=server.base_url, api_key="fake"))
+            speaker = VoiceSpeaker(NullSynthesizer(), NullAudioSink(realtime=False), PhraseCache(cache_dir))
+            coordinator = Coordinator(robot=robot, agent=agent, voice_listener=ScriptedVoiceListener(scenario.turns, robot), voice_speaker=speaker) #type: ignore
+            start = time.monotonic()
+            try:
+                coordinator.run()
+            except EOFError:
+                pass # The script ran out before the goal was completed
+            wall_time = time.monotonic() - start
+    finally:
+        tracing.disable()
+        robot.stop()
+        server.stop()
+    spans = tracer.snapshot()
+    turn_times = [span.duration for span in spans if span.name == "coordinator.turn"]
+    robot_commands = Counter(span.args["action"] for span in spans if span.name == "robot.handle_command")
+    return ScenarioResult(
+        turns=len(turn_times),
+        llm_calls=agent.backend.stats.calls,
+        tokens_sent=sum(agent.history_manager.stats.tokens_sent),
+        output_tokens=agent.backend.stats.output_tokens,
+        robot_commands=dict(sorted(robot_commands.items())),
+        turn_time_mean=sum(turn_times) / len(turn_times) if turn_times else 0.0,
+        turn_time_max=max(turn_times, default=0.0),
+        turn_times=turn_times,
+        wall_time=wall_time,
+        completed=(coordinator.state == CoordinatorState.DONE and robot.state.location == scenario.location
+                   and robot.state.basket_position == scenario.basket_position),
+    )
+
+
+def compare(result: ScenarioResult, baseline: dict) -> list[str]:
+    """The regressions of result against its baseline"""
+    regressions = []
+    if not result.completed:
+        regressions.append("the scenario didn't complete with the basket where expected")
+    for metric in ("turns", "llm_calls", "robot_commands"):
+        if getattr(result, metric) != baseline[metric]:
+            regressions.append(f"{metric} {baseline[metric]} -> {getattr(result, metric)}")
+    for metric in ("tokens_sent", "output_tokens"):
+        if getattr(result, metric) > baseline[metric] * (1 + TOKEN_TOLERANCE):
+            regressions.append(f"{metric} {baseline[metric]} -> {getattr(result, metric)}")
+    for metric in ("turn_time_mean", "turn_time_max"):
+        if getattr(result, metric) > baseline[metric] * (1 + TIME_TOLERANCE) + TIME_SLACK:
+            regressions.append(f"{metric} {baseline[metric]:.3f} s -> {getattr(result, metric):.3f} s")
+    return regressions
+
+
+def with_change(text: str, value: float, baseline: Optional[dict], metric: str) -> str:
+    """text followed by the relative change of value from the baseline's metric, if there is one"""
+    if baseline is None or not baseline[metric]:
+        return text
+    return f"{text} ({(value - baseline[metric]) / baseline[metric]:+.0%})"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the end-to-end scenarios and compare them against the stored baseline")
+    parser.add_argument("scenarios", nargs="*", help=f"Scenarios to run ({', '.join(SCENARIOS)}), all of them by default")
+    parser.add_argument("--simulated", action="store_true", help="Use the simulated robot instead of MockRobot")
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show the coordinator's output and each turn's time")
+    args = parser.parse_args()
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios {unknown}, choose from {list(SCENARIOS)}")
+
+    robot_kind = "simulated" if args.simulated else "mock"
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        run("readme", simulated=False) # Discarded, so the first scenario measured doesn't pay for one-off imports and connection setup
+    for name in args.scenarios or SCENARIOS:
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            results[f"{name}/{robot_kind}"] = run(name, args.simulated)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+
+    robot_description = f"simulated at {SIMULATION_TIME_SCALE:g}x real time" if args.simulated else f"MockRobot, {ROBOT_COMMAND_TIME * 1000:.0f} ms per command"
+    print(f"LLM: {FIRST_TOKEN_DELAY * 1000:.0f} ms to the first token, robot: {robot_description}\n")
+    print(f"{'scenario':<24}{'turns':>6}{'LLM calls':>10}{'tokens sent':>18}{'tokens out':>11}{'robot cmds':>11}{'turn mean s':>18}{'turn max s':>18}{'wall s':>8}")
+    regressions = {}
+    for key, result in results.items():
+        baseline = baselines.get(key)
+        tokens_sent = with_change(str(result.tokens_sent), result.tokens_sent, baseline, "tokens_sent")
+        turn_mean = with_change(f"{result.turn_time_mean:.3f}", result.turn_time_mean, baseline, "turn_time_mean")
+        turn_max = with_change(f"{result.turn_time_max:.3f}", result.turn_time_max, baseline, "turn_time_max")
+        print(f"{key:<24}{result.turns:>6}{result.llm_calls:>10}{tokens_sent:>18}{result.output_tokens:>11}{sum(result.robot_commands.values()):>11}"
+              f"{turn_mean:>18}{turn_max:>18}{result.wall_time:>8.2f}")
+        print(f"{'':<24}robot commands: {', '.join(f'{action} {count}' for action, count in result.robot_commands.items())}"
+              f"{'' if result.completed else '  -- DID NOT COMPLETE'}")
+        if args.verbose:
+            print(f"{'':<24}turn times: {' '.join(f'{t:.3f}' for t in result.turn_times)}")
+        if baseline is not None:
+            regressions[key] = compare(result, baseline)
+
+    if args.update_baseline:
+        baselines.update({key: {metric: round(value, 4) if isinstance(value, float) else value
+                                for metric, value in asdict(result).items() if metric not in ("turn_times", "completed")}
+                          for key, result in results.items() if result.completed})
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline updated: {args.baseline}")
+        sys.exit(0)
+
+    missing = [key for key in results if key not in baselines]
+    if missing:
+        print(f"\nNo baseline for {', '.join(missing)}, store one with --update-baseline")
+    failed = {key: found for key, found in regressions.items() if found}
+    if failed:
+        print("\nRegressions against the baseline:")
+        for key, found in failed.items():
+            print(f"  {key}: {'; '.join(found)}")
+        sys.exit(1)
+    if regressions:
+        print(f"\nNo regressions against the baseline ({len(regressions)} scenarios compared)")
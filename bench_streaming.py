@@ -0,0 +1,57 @@
+"""
+Measures the time from the user's input to the first words being handed to the speech engine, with and without streaming the LLM output,
+against the local fake Responses API endpoint (fake_llm.FakeLLMServer) so the timings are reproducible offline. Run from the repository root:
+    python bench_streaming.py
+"""
+import json
+import time
+
+from agent import Agent
+from coordinator import Coordinator
+from fake_llm import FakeLLMServer
+from llm_backend import OpenAIBackend
+from robot import MockRobot
+from voice import MockVoiceListener
+
+FIRST_TOKEN_DELAY = 0.4 # Seconds, roughly what the API takes before the first token
+CHUNK_DELAY = 0.015 # Seconds between 8 character deltas, roughly 130 tokens/s
+USER_INPUT = "I am at the desk. My drink is by the closet. I want my drink brought to me."
+RESPONSE = json.dumps({"commands": [{
+    "action": "REQUEST_ADDITIONAL_INFO",
+    "location": None,
+    "basket_position": None,
+    "user_message": "I can bring your drink over from the closet. Is anyone near the closet who could put the drink in the basket for you? "
+                    "If not, I can lower the basket there, but someone will need to place the drink inside before I bring it back to the desk.",
+    "plan": None,
+}]})
+
+
+class TimingSpeaker:
+    """Records when each piece of text reaches the speech engine instead of speaking it"""
+    def __init__(self) -> None:
+        self.spoken: list[tuple[float, str]] = []
+
+    def speak(self, text):
+        self.spoken.append((time.monotonic(), text))
+
+
+def run(stream: bool):
+    server = FakeLLMServer([RESPONSE], first_token_delay=FIRST_TOKEN_DELAY, chunk_delay=CHUNK_DELAY)
+    server.start()
+    try:
+        agent = Agent(stream=stream, backend=OpenAIBackend(base_url=server.base_url, api_key="fake"))
+        speaker = TimingSpeaker()
+        coordinator = Coordinator(robot=MockRobot(), agent=agent, voice_listener=MockVoiceListener(), voice_speaker=speaker) #type: ignore
+        start = time.monotonic()
+        coordinator.handle_user_input(USER_INPUT)
+        end = time.monotonic()
+    finally:
+        server.stop()
+    return speaker.spoken[0][0] - start, end - start, len(speaker.spoken)
+
+
+if __name__ == "__main__":
+    results = [(stream, *run(stream)) for stream in [False, True]]
+    print(f"{'mode':<14}{'first audio s':>15}{'turn s':>9}{'utterances':>12}")
+    for stream, first_audio, turn, utterances in results:
+        print(f"{'streaming' if stream else 'blocking':<14}{first_audio:>15.3f}{turn:>9.3f}{utterances:>12}")
@@ -0,0 +1,88 @@
+"""
+Measures what the tracing costs, per span with tracing off and on, and traces two sessions to show where the time goes:
+the real Robot control loop and vision pipeline against the simulated basket (simulation.SimulatedRobot),
+and a turn-by-turn session of the speculative coordinator with mock components (see bench_coordinator).
+The traces are written as JSONL and Chrome trace files to PREFIX (a temporary directory by default). Run from the repository root:
+    python bench_tracing.py [PREFIX]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import tracing
+from robot import BasketAction, RobotCommand
+from state_representation import Location
+
+SPANS = 200000 # Spans timed per overhead measurement
+TIME_SCALE = 4.0 # Of the simulated robot
+ROBOT_COMMANDS = [
+    RobotCommand(BasketAction.MOVE_BASKET_TO_LOCATION, location=Location.CLOSET),
+    RobotCommand(BasketAction.LOWER_BASKET),
+    RobotCommand(BasketAction.RAISE_BASKET),
+    RobotCommand(BasketAction.MOVE_BASKET_TO_LOCATION, location=Location.DESK),
+]
+
+
+def bench_overhead() -> tuple[float, float, float]:
+    """Nanoseconds per iteration of an empty loop, and per span with tracing off and on"""
+    start = time.perf_counter()
+    for _ in range(SPANS):
+        pass
+    empty = (time.perf_counter() - start) / SPANS * 1e9
+    per_span = []
+    for enabled in (False, True):
+        if enabled:
+            tracing.enable(max_spans=1000) # The ring buffer is full for most of the run, as in a long session
+        start = time.perf_counter()
+        for _ in range(SPANS):
+            with tracing.span("overhead"):
+                pass
+        per_span.append((time.perf_counter() - start) / SPANS * 1e9 - empty)
+        tracing.disable()
+    return empty, per_span[0], per_span[1]
+
+
+def trace_robot() -> tracing.Tracer:
+    from simulation import SimulatedRobot # Imported here since it starts OpenCV
+    robot = SimulatedRobot(time_scale=TIME_SCALE)
+    robot.start()
+    tracer = tracing.enable()
+    try:
+        for command in ROBOT_COMMANDS:
+            robot.handle_command(command)
+    finally:
+        tracing.disable()
+        robot.stop()
+    return tracer
+
+
+def trace_session() -> tracing.Tracer:
+    import bench_coordinator
+    tracer = tracing.enable()
+    try:
+        bench_coordinator.run("step by step", "speculative")
+    finally:
+        tracing.disable()
+    return tracer
+
+
+def export(tracer: tracing.Tracer, prefix: str) -> str:
+    tracer.export_jsonl(f"{prefix}.jsonl")
+    tracer.export_chrome(f"{prefix}.trace.json")
+    return f"{prefix}.jsonl, {prefix}.trace.json"
+
+
+if __name__ == "__main__":
+    prefix = sys.argv[1] if len(sys.argv) > 1 else os.path.join(tempfile.mkdtemp(), "trace")
+    empty, off, on = bench_overhead()
+    robot_tracer = trace_robot()
+    session_tracer = trace_session()
+
+    print(f"\nOverhead per span: {off:.0f} ns with tracing off, {on:.0f} ns with it on (empty loop iteration: {empty:.0f} ns)")
+    cycles = robot_tracer.histograms["robot.control_cycle"]
+    print(f"A control cycle takes {1000 * cycles.total / cycles.n:.1f} ms on average, so tracing it costs {on / (1e9 * cycles.total / cycles.n):.5%} of it\n")
+    print(f"Simulated robot ({TIME_SCALE:g}x real time), {len(robot_tracer.spans)} spans written to {export(robot_tracer, prefix + '_robot')}")
+    print(robot_tracer.report())
+    print(f"\nSpeculative coordinator session, {len(session_tracer.spans)} spans written to {export(session_tracer, prefix + '_session')}")
+    print(session_tracer.report())
@@ -0,0 +1,138 @@
+"""
+Benchmarks motion controllers against the simulated basket plant: average MOVE_BASKET_TO_LOCATION duration,
+control cycles, overshoot and direction reversals per move, and the settling time, until the basket is within SETTLE_TOLERANCE of the target
+and stays there. Arrival is declared on the measurements, so the settling time, taken from the simulated true position, is what shows
+a controller that declares arrival early and coasts on. Besides the checkpoints, the moves go to and from MID_TRACK_FRACS, since moves to the ends
+of the wire stop against them whatever the controller does.
+Run from the repository root:
+    python -m control.bench_motion          # compare the control modes with their default settings
+    python -m control.bench_motion --tune   # grid search the predictive controller's parameters
+"""
+import itertools
+import sys
+from dataclasses import dataclass, replace
+from typing import Optional
+
+from control.motion import ControlMode, ControllerConfig, MotionController
+from control.plant import PlantConfig, PlantObserver, SimulatedBasketPlant
+from vision.constants import CHECKPOINT_FRACS, POS_THRESHOLD
+
+MAX_MOVE_TIME = 30.0 # Simulated seconds before a move is considered failed
+SETTLE_TIME = 1.0 # Simulated seconds to let the basket come to rest after arriving before measuring the final error
+SETTLE_TOLERANCE = POS_THRESHOLD # Distance from the target, in fractions of the motion line, within which the basket counts as settled (the arrival deadband)
+SAMPLE_PERIOD = 0.01 # Simulated seconds between samples of the true position
+MID_TRACK_FRACS = [0.25, 0.75]
+POSITIONS = sorted(CHECKPOINT_FRACS + MID_TRACK_FRACS)
+MOVES = list(itertools.permutations(POSITIONS, 2))
+SEEDS = range(5)
+
+
+@dataclass
+class MoveResult:
+    success: bool
+    duration: float # Simulated seconds from the first command until arrival
+    cycles: int # Number of control periods
+    reversals: int
+    overshoot: float # Furthest the basket went past the target, in fractions of the motion line
+    final_error: float # Distance from the target once the basket has come to rest
+    settle_time: Optional[float] # Simulated seconds from the first command until the basket stayed within SETTLE_TOLERANCE, None if it didn't
+
+
+def simulate_move(controller_config: ControllerConfig, plant_config: PlantConfig, start_frac: float, target_frac: float) -> MoveResult:
+    """Runs one move the same way Robot.handle_command does: each period, get an estimate, drive for duty * period, coast for the rest"""
+    plant = SimulatedBasketPlant(plant_config, x_frac=start_frac)
+    observer = PlantObserver(plant)
+    controller = MotionController(controller_config)
+    controller.reset(target_frac)
+    period = controller_config.control_period
+    direction_sign = 1 if target_frac > start_frac else -1
+    overshoot = 0.0
+    last_unsettled = 0.0 # Simulated time at which the basket was last outside the tolerance band
+
+    def run(duration: float):
+        nonlocal overshoot, last_unsettled
+        remaining = duration
+        while remaining > 1e-9:
+            step = min(SAMPLE_PERIOD, remaining)
+            plant.run(step)
+            remaining -= step
+            overshoot = max(overshoot, (plant.x_frac - target_frac) * direction_sign)
+            if abs(plant.x_frac - target_frac) > SETTLE_TOLERANCE:
+                last_unsettled = plant.time
+
+    plant.run(plant_config.camera_latency + plant_config.frame_period) # Wait for a first frame
+    start_time = plant.time
+    success = False
+    while plant.time - start_time < MAX_MOVE_TIME:
+        estimate = observer.update()
+        command = controller.update(estimate, plant.time) #type: ignore
+        if command.arrived:
+            success = True
+            break
+        plant.translation_input = command.direction
+        run(period * command.duty)
+        plant.translation_input = 0
+        run(period * (1 - command.duty))
+    duration = plant.time - start_time
+
+    plant.translation_input = 0
+    run(SETTLE_TIME)
+    final_error = abs(plant.x_frac - target_frac)
+    settle_time = max(last_unsettled, start_time) - start_time if final_error <= SETTLE_TOLERANCE else None
+    return MoveResult(success, duration, controller.cycles, controller.reversals, overshoot, final_error, settle_time)
+
+
+def evaluate(controller_config: ControllerConfig, plant_config: PlantConfig = PlantConfig()):
+    results = []
+    for seed in SEEDS:
+        for start, target in MOVES:
+            results.append(simulate_move(controller_config, replace(plant_config, seed=seed), start, target))
+    n = len(results)
+    settled = [r.settle_time for r in results if r.settle_time is not None]
+    return {
+        "success_rate": sum(r.success for r in results) / n,
+        "mean_duration": sum(r.duration for r in results) / n,
+        "mean_cycles": sum(r.cycles for r in results) / n,
+        "mean_reversals": sum(r.reversals for r in results) / n,
+        "mean_overshoot": sum(r.overshoot for r in results) / n,
+        "max_final_error": max(r.final_error for r in results),
+        "settled_rate": len(settled) / n,
+        "mean_settle_time": sum(settled) / len(settled) if settled else float("nan"),
+    }
+
+
+def print_header():
+    print(f"{'controller':<40}{'success':>9}{'time s':>9}{'cycles':>9}{'reversals':>11}{'overshoot':>11}{'max err':>9}{'settled':>9}{'settle s':>10}")
+
+
+def print_row(name, metrics):
+    print(f"{name:<40}{metrics['success_rate']:>9.0%}{metrics['mean_duration']:>9.2f}{metrics['mean_cycles']:>9.1f}{metrics['mean_reversals']:>11.2f}{metrics['mean_overshoot']:>11.3f}{metrics['max_final_error']:>9.3f}"
+          f"{metrics['settled_rate']:>9.0%}{metrics['mean_settle_time']:>10.2f}")
+
+
+def tune():
+    """Grid search for the predictive controller parameters with the fastest successful moves, ties broken by the final error"""
+    best = None
+    for kp, min_duty, coast_decel, latency in itertools.product([4.0, 8.0, 16.0], [0.15, 0.25, 0.4], [0.3, 0.5, 0.8], [0.05, 0.1, 0.2]):
+        config = ControllerConfig(mode=ControlMode.PREDICTIVE, kp=kp, min_duty=min_duty, coast_decel=coast_decel, actuation_latency=latency)
+        metrics = evaluate(config)
+        if metrics["success_rate"] < 1.0:
+            continue
+        score = (round(metrics["mean_duration"], 2), metrics["max_final_error"])
+        if best is None or score < (round(best[1]["mean_duration"], 2), best[1]["max_final_error"]):
+            best = (config, metrics)
+    if best is None:
+        print("No configuration completed every move")
+        return
+    config, metrics = best
+    print_header()
+    print_row(f"kp={config.kp} min_duty={config.min_duty} decel={config.coast_decel} lat={config.actuation_latency}", metrics)
+
+
+if __name__ == "__main__":
+    if "--tune" in sys.argv:
+        tune()
+    else:
+        print_header()
+        for mode in ControlMode:
+            print_row(mode.value, evaluate(ControllerConfig(mode=mode)))
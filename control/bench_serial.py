@@ -0,0 +1,63 @@
+"""
+Measures Firmata serial traffic for a typical MOVE_BASKET_TO_LOCATION, comparing pyfirmata-style per-pin writes against Control's coalesced port writes.
+Runs against a FakeSerial transport, no board needed. Run from the repository root: python -m control.bench_serial
+"""
+from control.control import RAISE_LOWER_MOTOR_PIN_A, RAISE_LOWER_MOTOR_PIN_B, Control, Motor, MotorDirection
+from control.firmata import DIGITAL_MESSAGE, PINS_PER_PORT, FakeSerial
+
+MOVE_CYCLES = 50 # Control periods in the simulated move
+BAUD_RATE = 57600 # pyfirmata's default
+
+
+class PerPinControl(Control):
+    """Reproduces the previous behaviour: every pin write sends its own digital-port message, whether or not the pin changed"""
+    def __init__(self, transport) -> None:
+        super().__init__(transport)
+        self.transport = transport
+        self.port_states: dict[int, int] = {}
+
+    def set_motors(self, translation=None, raise_lower=None):
+        pin_values = {}
+        if translation is not None:
+            pin_values.update(self.translation.pin_values(translation))
+        if raise_lower is not None and self.raise_lower is not None:
+            pin_values.update(self.raise_lower.pin_values(raise_lower))
+        for pin, value in pin_values.items():
+            port, bit = divmod(pin, PINS_PER_PORT)
+            state = self.port_states.get(port, 0)
+            state = state | (1 << bit) if value else state & ~(1 << bit)
+            self.port_states[port] = state
+            self.transport.write(bytes([DIGITAL_MESSAGE | port, state & 0x7F, (state >> 7) & 0x7F]))
+
+
+def run_move(control: Control, batched: bool):
+    """The command pattern of the MOVE loop in Robot.handle_command, with the raise/lower motor running alongside translation"""
+    for cycle in range(MOVE_CYCLES):
+        direction = MotorDirection.CLOCKWISE
+        if batched:
+            control.set_motors(translation=direction, raise_lower=direction)
+        else:
+            control.set_translation(direction)
+            control.set_raise_lower(direction)
+        control.set_raise_lower(MotorDirection.STILL) # The stop_first_fn call that applies TRANSLATION_CALIBRATION_RATIO
+    control.set_motors(translation=MotorDirection.STILL, raise_lower=MotorDirection.STILL)
+
+
+def measure(control_type, batched):
+    transport = FakeSerial()
+    control = control_type(transport)
+    control.raise_lower = Motor(pin_a=RAISE_LOWER_MOTOR_PIN_A, pin_b=RAISE_LOWER_MOTOR_PIN_B)
+    run_move(control, batched)
+    return len(transport.writes), transport.bytes_written
+
+
+if __name__ == "__main__":
+    results = [
+        ("per-pin writes", measure(PerPinControl, batched=False)),
+        ("coalesced", measure(Control, batched=False)),
+        ("coalesced + set_motors", measure(Control, batched=True)),
+    ]
+    print(f"{MOVE_CYCLES} control cycles")
+    print(f"{'':<24}{'messages':>10}{'bytes':>8}{'serial ms':>11}")
+    for name, (messages, num_bytes) in results:
+        print(f"{name:<24}{messages:>10}{num_bytes:>8}{1000 * num_bytes * 10 / BAUD_RATE:>11.2f}")
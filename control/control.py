@@ -1,9 +1,9 @@
 from dataclasses import dataclass
 from enum import Enum
 from time import sleep
-from pyfirmata import Arduino, util
+from typing import Optional
 
-import control
+from control.firmata import PinWriter
 
 TRANSLATION_MOTOR_PIN_A = 12
 TRANSLATION_MOTOR_PIN_B = 13
@@ -24,25 +24,50 @@ class Motor:
     pin_a: int
     pin_b: int
 
-    def set_dir(self, board: Arduino, motor_direction: MotorDirection):
+    def pin_values(self, motor_direction: MotorDirection) -> dict[int, int]:
         set_a = 1 if motor_direction == MotorDirection.COUNTERCLOCKWISE else 0
         set_b = 1 if motor_direction == MotorDirection.CLOCKWISE else 0
-        board.digital[self.pin_a].write(set_a)
-        board.digital[self.pin_b].write(set_b)
+        return {self.pin_a: set_a, self.pin_b: set_b}
 
 class Control:
-    def __init__(self):
-        self.board = Arduino(PORT)
-        self.iter = util.Iterator(self.board)
-        self.iter.start()
+    def __init__(self, transport=None):
+        """
+        transport: where to send Firmata messages. Defaults to the serial port of the Arduino on PORT.
+        Pass a control.firmata.FakeSerial to run without a board.
+        """
+        if transport is None:
+            from pyfirmata import Arduino, util
+            self.board = Arduino(PORT)
+            self.iter = util.Iterator(self.board)
+            self.iter.start()
+            transport = self.board.sp
+        self.pins = PinWriter(transport)
         self.translation = Motor(pin_a=TRANSLATION_MOTOR_PIN_A, pin_b=TRANSLATION_MOTOR_PIN_B)
-        #self.raise_lower = Motor(pin_a=RAISE_LOWER_MOTOR_PIN_A, pin_b=RAISE_LOWER_MOTOR_PIN_B)
+        self.raise_lower: Optional[Motor] = None #Motor(pin_a=RAISE_LOWER_MOTOR_PIN_A, pin_b=RAISE_LOWER_MOTOR_PIN_B)
+
+    @property
+    def messages_sent(self) -> int:
+        return self.pins.messages_sent
+
+    @property
+    def bytes_sent(self) -> int:
+        return self.pins.bytes_sent
+
+    def set_motors(self, translation: Optional[MotorDirection] = None, raise_lower: Optional[MotorDirection] = None):
+        """Sets both motors at once, sending at most one message per port. Motors given as None are left as they are."""
+        pin_values = {}
+        if translation is not None:
+            pin_values.update(self.translation.pin_values(translation))
+        if raise_lower is not None and self.raise_lower is not None:
+            pin_values.update(self.raise_lower.pin_values(raise_lower))
+        if pin_values:
+            self.pins.write_pins(pin_values)
 
     def set_translation(self, motor_direction: MotorDirection):
-        self.translation.set_dir(self.board, motor_direction)
+        self.set_motors(translation=motor_direction)
 
     def set_raise_lower(self, motor_direction: MotorDirection):
-        ...#self.raise_lower.set_dir(self.board, motor_direction)
+        self.set_motors(raise_lower=motor_direction)
 
 def simple_test():
     control = Control()
@@ -0,0 +1,52 @@
+from typing import Optional
+
+DIGITAL_MESSAGE = 0x90 # Firmata "digital I/O message": sets all 8 pins of a port at once
+PINS_PER_PORT = 8
+
+
+class FakeSerial:
+    """Stands in for the board's serial port, recording everything written to it"""
+    def __init__(self) -> None:
+        self.writes: list[bytes] = []
+
+    def write(self, data):
+        self.writes.append(bytes(data))
+
+    @property
+    def bytes_written(self) -> int:
+        return sum(len(w) for w in self.writes)
+
+
+class PinWriter:
+    """
+    Writes digital output pins through Firmata digital-port messages.
+    Keeps a shadow copy of each port's output state so that writes that don't change anything are skipped,
+    and all changes to the same port in one call are sent as a single message.
+    """
+    def __init__(self, transport) -> None:
+        self.transport = transport # Anything with write(bytes), e.g. the pyserial port of a pyfirmata board
+        self.port_states: dict[int, int] = {} # Last mask sent for each port, absent if never written
+        self.messages_sent = 0
+        self.bytes_sent = 0
+        self.writes_requested = 0 # Number of individual pin writes asked for
+        self.writes_skipped = 0 # Number of those that didn't change the pin's state
+
+    def write_pins(self, pin_values: dict[int, int]):
+        new_states: dict[int, int] = {}
+        for pin, value in pin_values.items():
+            port, bit = divmod(pin, PINS_PER_PORT)
+            sent_state: Optional[int] = self.port_states.get(port)
+            state = new_states.get(port, sent_state if sent_state is not None else 0)
+            new_state = state | (1 << bit) if value else state & ~(1 << bit)
+            self.writes_requested += 1
+            if sent_state is not None and new_state == state:
+                self.writes_skipped += 1
+            new_states[port] = new_state
+        for port, state in new_states.items():
+            if self.port_states.get(port) == state:
+                continue
+            message = bytes([DIGITAL_MESSAGE | port, state & 0x7F, (state >> 7) & 0x7F])
+            self.transport.write(message)
+            self.port_states[port] = state
+            self.messages_sent += 1
+            self.bytes_sent += len(message)
@@ -0,0 +1,102 @@
+from dataclasses import dataclass, replace
+from enum import Enum
+from typing import Optional
+
+from vision.constants import POS_THRESHOLD
+from vision.estimator import PositionEstimate
+
+
+class ControlMode(Enum):
+    BANG_BANG = "BANG_BANG" # Full power every period until inside the deadband (the original behaviour)
+    PROPORTIONAL = "PROPORTIONAL" # Duty cycle proportional to the remaining distance
+    PREDICTIVE = "PREDICTIVE" # Proportional, plus cutting power once the basket is predicted to coast into the deadband
+
+
+@dataclass
+class ControllerConfig:
+    mode: ControlMode = ControlMode.PREDICTIVE
+    control_period: float = 0.2 # Seconds per control cycle
+    deadband: float = POS_THRESHOLD # Distance from the target (as a fraction of the motion line) that counts as arrived
+    kp: float = 8.0 # Duty cycle per unit of remaining distance (PROPORTIONAL/PREDICTIVE)
+    min_duty: float = 0.25 # Smallest duty cycle worth applying, below this the motor doesn't overcome friction
+    coast_decel: float = 0.5 # Expected deceleration when coasting, in fractions of the motion line per second^2 (PREDICTIVE)
+    actuation_latency: float = 0.1 # Seconds between a measurement being captured and the resulting command taking effect (PREDICTIVE)
+    max_reversals: int = 2 # Number of direction reversals after which the move is considered to be oscillating
+    oscillation_gain_decay: float = 0.5 # Factor applied to the duty cycle for each reversal beyond max_reversals
+
+    def time_scaled(self, time_scale: float) -> "ControllerConfig":
+        """The equivalent config for a plant running time_scale times faster than real time"""
+        if time_scale == 1.0:
+            return self
+        return replace(self,
+                       control_period=self.control_period / time_scale,
+                       coast_decel=self.coast_decel * time_scale ** 2,
+                       actuation_latency=self.actuation_latency / time_scale)
+
+
+@dataclass
+class MotionCommand:
+    direction: int # +1 to move towards increasing x_frac (translation motor CLOCKWISE), -1 for the opposite, 0 to stay still
+    duty: float # Fraction of the control period to drive the motor for
+    arrived: bool = False
+
+
+class MotionController:
+    """
+    Closed-loop controller for moving the basket to a position along the motion line.
+    Call reset() with the target at the start of a move, then update() once per control period with the latest position estimate.
+    """
+    def __init__(self, config: Optional[ControllerConfig] = None) -> None:
+        self.config = config if config is not None else ControllerConfig()
+        self.target_frac = 0.0
+        self.reversals = 0
+        self.cycles = 0
+        self._last_direction = 0
+
+    @property
+    def oscillating(self) -> bool:
+        return self.reversals >= self.config.max_reversals
+
+    def reset(self, target_frac: float):
+        self.target_frac = target_frac
+        self.reversals = 0
+        self.cycles = 0
+        self._last_direction = 0
+
+    def update(self, estimate: PositionEstimate, now: float) -> MotionCommand:
+        """now: the current time.monotonic(), used to extrapolate the estimate to the moment the command takes effect"""
+        config = self.config
+        self.cycles += 1
+        if abs(self.target_frac - estimate.x_frac) <= config.deadband:
+            self._last_direction = 0
+            return MotionCommand(direction=0, duty=0.0, arrived=True)
+
+        if config.mode == ControlMode.BANG_BANG:
+            return self._command(1 if estimate.x_frac < self.target_frac else -1, 1.0)
+
+        if config.mode == ControlMode.PREDICTIVE:
+            position = estimate.predict_x_frac(now + config.actuation_latency)
+            velocity = estimate.x_velocity
+        else:
+            position = estimate.x_frac
+            velocity = 0.0
+        error = self.target_frac - position
+        direction = 1 if error > 0 else -1
+
+        if config.mode == ControlMode.PREDICTIVE and velocity * direction > 0:
+            stopping_distance = velocity * velocity / (2 * config.coast_decel)
+            if stopping_distance >= abs(error) - config.deadband / 2:
+                return self._command(0, 0.0) # Coast into the deadband
+
+        duty = min(1.0, max(config.min_duty, config.kp * abs(error)))
+        return self._command(direction, duty)
+
+    def _command(self, direction: int, duty: float) -> MotionCommand:
+        if direction != 0:
+            if self._last_direction != 0 and direction != self._last_direction:
+                self.reversals += 1
+            self._last_direction = direction
+            if self.oscillating:
+                decay = self.config.oscillation_gain_decay ** (self.reversals - self.config.max_reversals + 1)
+                duty = max(self.config.min_duty, duty * decay)
+        return MotionCommand(direction=direction, duty=duty)
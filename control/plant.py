@@ -0,0 +1,96 @@
+import random
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from vision.estimator import PositionEstimator, PositionEstimate
+
+
+@dataclass
+class PlantConfig:
+    max_speed: float = 0.25 # Steady-state translation speed with the motor on, in fractions of the motion line per second
+    motor_lag: float = 0.15 # Time constant (seconds) for the translation speed to respond to the motor being switched on
+    friction_decel: float = 0.5 # Deceleration while coasting with the motor off, in fractions of the motion line per second^2
+    raise_lower_speed: float = 0.5 # Speed of the raise/lower motor in fractions of the raise/lower distance per second
+    camera_latency: float = 0.1 # Seconds between the basket being at a position and that frame reaching the controller
+    frame_period: float = 1 / 30 # Seconds between camera frames
+    measurement_noise: float = 0.003 # Standard deviation of the measured position, in fractions of the motion line
+    simulate_camera: bool = True # Generate delayed, noisy measurements (disable when something else renders real frames)
+    seed: Optional[int] = 0
+
+
+class SimulatedBasketPlant:
+    """
+    Simulated dynamics of the basket along the motion line, in the same units the vision system reports (x_frac, y_frac).
+    Motor inputs follow the MotorDirection convention of Robot: translation +1 (CLOCKWISE) increases x_frac,
+    raise/lower +1 (CLOCKWISE) raises the basket (decreases y_frac). The raise/lower motor only changes y_frac while the basket isn't translating,
+    since during translation it is run in step with the translation motor to keep the basket level.
+    """
+    def __init__(self, config: Optional[PlantConfig] = None, x_frac: float = 0.0, y_frac: float = 0.0) -> None:
+        self.config = config if config is not None else PlantConfig()
+        self.rng = random.Random(self.config.seed)
+        self.time = 0.0
+        self.x_frac = x_frac
+        self.y_frac = y_frac
+        self.velocity = 0.0
+        self.translation_input = 0
+        self.raise_lower_input = 0
+        self._frames = deque() # (publish_time, capture_time, measured x_frac, measured y_frac)
+        self._next_frame_time = 0.0
+        self._frame_seq = 0
+
+    def step(self, dt: float):
+        config = self.config
+        if self.translation_input != 0:
+            target_speed = self.translation_input * config.max_speed
+            self.velocity += (target_speed - self.velocity) * min(1.0, dt / config.motor_lag)
+        else:
+            decel = min(abs(self.velocity), config.friction_decel * dt)
+            self.velocity -= decel if self.velocity > 0 else -decel
+        self.x_frac = min(1.0, max(0.0, self.x_frac + self.velocity * dt))
+        if self.x_frac in (0.0, 1.0): # Hit the end of the wire
+            self.velocity = 0.0
+        if self.translation_input == 0 and self.raise_lower_input != 0:
+            self.y_frac = min(1.0, max(0.0, self.y_frac - self.raise_lower_input * config.raise_lower_speed * dt))
+        self.time += dt
+        while config.simulate_camera and self.time >= self._next_frame_time:
+            self._frames.append((
+                self._next_frame_time + config.camera_latency,
+                self._next_frame_time,
+                self.x_frac + self.rng.gauss(0, config.measurement_noise),
+                self.y_frac + self.rng.gauss(0, config.measurement_noise),
+            ))
+            self._next_frame_time += config.frame_period
+
+    def run(self, duration: float, dt: float = 0.001):
+        steps = max(1, int(round(duration / dt)))
+        for _ in range(steps):
+            self.step(dt)
+
+    def latest_measurement(self):
+        """
+        Returns (seq, capture_time, x_frac, y_frac) for the newest frame that has made it through the camera latency, or None if there is none yet.
+        Older frames that were never read are skipped, like the capture thread does.
+        """
+        latest = None
+        while self._frames and self._frames[0][0] <= self.time:
+            latest = self._frames.popleft()
+            self._frame_seq += 1
+        if latest is None:
+            return None
+        return self._frame_seq, latest[1], latest[2], latest[3]
+
+
+class PlantObserver:
+    """Feeds the plant's delayed, noisy measurements through the same Kalman estimator the vision system uses"""
+    def __init__(self, plant: SimulatedBasketPlant) -> None:
+        self.plant = plant
+        self.estimator = PositionEstimator()
+        self.estimate: Optional[PositionEstimate] = None
+
+    def update(self) -> Optional[PositionEstimate]:
+        measurement = self.plant.latest_measurement()
+        if measurement is not None:
+            seq, capture_time, x_frac, y_frac = measurement
+            self.estimate = self.estimator.update(seq, capture_time, x_frac, y_frac)
+        return self.estimate
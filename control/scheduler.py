@@ -0,0 +1,93 @@
+import time
+from typing import Callable
+
+from metrics import Histogram
+
+
+class PeriodicScheduler:
+    """
+    Paces a control loop on absolute monotonic deadlines (start + n * period) so that time spent working in each cycle doesn't make the rate drift.
+    If a cycle overruns its deadline, the missed deadlines are skipped rather than run back-to-back.
+    Records per-cycle wake-up jitter, loop (work) time and overruns since the last start(), so report() covers one run of the loop.
+    """
+    def __init__(self, period: float, time_fn: Callable[[], float] = time.monotonic, sleep_fn: Callable[[float], None] = time.sleep) -> None:
+        self.period = period
+        self.time_fn = time_fn
+        self.sleep_fn = sleep_fn
+        self.cycles = 0
+        self.overruns = 0
+        self.jitter = Histogram() # How late each wake-up was relative to its deadline
+        self.loop_time = Histogram() # Time spent working in each cycle before waiting for the next one
+        self.cycle_start = 0.0 # Deadline at which the current cycle started
+        self._next_deadline = 0.0
+        self._work_recorded = False
+
+    def start(self):
+        """Starts the first cycle now, and resets the statistics"""
+        self.cycles = 0
+        self.overruns = 0
+        self.jitter = Histogram(self.jitter.edges_ms)
+        self.loop_time = Histogram(self.loop_time.edges_ms)
+        self.cycle_start = self.time_fn()
+        self._next_deadline = self.cycle_start + self.period
+        self._work_recorded = False
+
+    def sleep_until(self, deadline: float):
+        remaining = deadline - self.time_fn()
+        if remaining > 0:
+            self.sleep_fn(remaining)
+
+    def end_work(self):
+        """Marks the end of the work in this cycle, for when the rest of the cycle is spent in timed waits (see SoftwarePWM)"""
+        if not self._work_recorded:
+            self.loop_time.add(self.time_fn() - self.cycle_start)
+            self._work_recorded = True
+
+    def wait_next(self):
+        """Blocks until the start of the next cycle"""
+        self.end_work()
+        now = self.time_fn()
+        deadline = self._next_deadline
+        if now > deadline:
+            self.overruns += 1
+            missed = int((now - deadline) / self.period) + 1
+            deadline += missed * self.period
+        self.sleep_until(deadline)
+        self.jitter.add(max(0.0, self.time_fn() - deadline))
+        self.cycles += 1
+        self.cycle_start = deadline
+        self._next_deadline = deadline + self.period
+        self._work_recorded = False
+
+    def report(self) -> str:
+        return f"{self.cycles} cycles of {1000 * self.period:.0f} ms, {self.overruns} overruns\n  jitter: {self.jitter}\n  loop time: {self.loop_time}"
+
+
+class SoftwarePWM:
+    """
+    Duty-cycles a set of on/off channels within each scheduler cycle: channels are switched on together, and each one is switched off
+    duty * period later. Channels that switch at the same moment are applied in a single call so the writes can be batched.
+    """
+    def __init__(self, scheduler: PeriodicScheduler) -> None:
+        self.scheduler = scheduler
+
+    def run_cycle(self, duties: dict[str, float], apply: Callable[[dict[str, bool]], None]):
+        """
+        duties: fraction of the period each channel should be on for
+        apply: called with the new on/off state of every channel whose state changes
+        Returns at the start of the next cycle.
+        """
+        scheduler = self.scheduler
+        scheduler.end_work()
+        on_time = scheduler.time_fn()
+        cycle_end = scheduler.cycle_start + scheduler.period
+        apply({name: duty > 0 for name, duty in duties.items()})
+        off_times: dict[float, dict[str, bool]] = {}
+        for name, duty in duties.items():
+            if 0 < duty < 1:
+                off_time = min(on_time + duty * scheduler.period, cycle_end)
+                off_times.setdefault(off_time, {})[name] = False
+        for off_time in sorted(off_times):
+            scheduler.sleep_until(off_time)
+            apply(off_times[off_time])
+        scheduler.wait_next()
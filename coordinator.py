@@ -1,10 +1,20 @@
+import dataclasses
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from time import sleep
+from typing import Callable, Optional
 
-from agent import Agent, AgentAction, AgentCommand
-from robot import BasketAction, MockRobot, Robot, RobotCommand
+from agent import Agent, AgentAction, AgentCommand, HistoryElement, UserMessageStream
+from llm_cache import ResponseCache
+from planner import PlannerState, PlanningError, next_state, plan_to_goal
+from robot import BasketAction, MockRobot, Robot, RobotBase, RobotCommand, RobotState
+from speculation import SpeculationStats, SpeculativeRequest
+from startup import ParallelInit
+import tracing
 from voice import MockVoiceListener, VoiceListener, VoiceSpeaker
 
+GOAL_COMPLETED_MESSAGE = "Agent considers goal completed"
+COMMON_PHRASES = [GOAL_COMPLETED_MESSAGE] # Rendered ahead of time so they're spoken without delay
+
 
 class CoordinatorState(Enum):
     """
@@ -22,6 +32,9 @@ class CoordinatorState(Enum):
     ROBOT_MOVING = "ROBOT_MOVING"
     DONE = "DONE"
 
+class PlanExecutionError(Exception):
+    pass
+
 def translate_agent_command_to_robot_command(agent_command: AgentCommand):
     assert agent_command.action.is_robot_action(), "Can only translate a robot action"
     if agent_command.action == AgentAction.MOVE_BASKET_TO_LOCATION:
@@ -35,51 +48,194 @@ def translate_agent_command_to_robot_command(agent_command: AgentCommand):
         raise ValueError(f"Unrecognized action {agent_command.action}")
     return RobotCommand(action=basket_action, location=agent_command.location)
 
+def predict_robot_state(robot_state: RobotState, agent_commands: list[AgentCommand]) -> Optional[RobotState]:
+    """The state the robot commands among agent_commands should leave the robot in, None if one of them isn't possible"""
+    state = PlannerState.from_robot_state(robot_state)
+    try:
+        for agent_command in agent_commands:
+            if agent_command.action == AgentAction.GO_TO_STATE:
+                for robot_command in plan_to_goal(state, agent_command.location, agent_command.basket_position):
+                    state = next_state(state, robot_command)
+            elif agent_command.action.is_robot_action():
+                state = next_state(state, translate_agent_command_to_robot_command(agent_command))
+    except (PlanningError, AssertionError):
+        return None
+    return dataclasses.replace(robot_state, location=state.location, basket_position=state.basket_position)
+
 class Coordinator:
-    def __init__(self) -> None:
+    def __init__(self, llm_cache: Optional[ResponseCache] = None, robot: Optional[RobotBase] = None, agent: Optional[Agent] = None,
+                 voice_listener: Optional[VoiceListener] = None, voice_speaker: Optional[VoiceSpeaker] = None, speculate: bool = False) -> None:
+        """
+        robot/agent/voice_listener/voice_speaker: default to a MockRobot, an OpenAI agent, the microphone and the speakers
+        speculate: while the robot executes the commands that end an agent response, query the agent for its next response
+          with the robot state they are predicted to leave the robot in, and use it if the robot does end up in that state (not in AsyncCoordinator)
+        """
         self.state = CoordinatorState.USER_INPUT
-        self.robot = MockRobot()
-        self.agent = Agent()
-        self.voice_listener = VoiceListener()
-        self.voice_speaker = VoiceSpeaker()
+        self.robot = robot if robot is not None else MockRobot()
+        self.agent = agent if agent is not None else Agent(cache=llm_cache)
+        self.voice_listener = voice_listener if voice_listener is not None else VoiceListener()
+        self.voice_speaker = voice_speaker if voice_speaker is not None else VoiceSpeaker()
+        self.voice_speaker.on_playback = self.voice_listener.set_muted # So our own speech isn't taken for the user's
+        self.speculate = speculate
+        self.speculation_stats = SpeculationStats()
+        self._speculation: Optional[SpeculativeRequest] = None
+        self._speculation_executor: Optional[ThreadPoolExecutor] = None
     
-    def run(self):
-        self.robot.start()
+    def start(self):
+        """Initializes the subsystems concurrently, returning once the ones needed to handle user input are ready"""
         print("waiting for init...")
-        sleep(10)
+        init = ParallelInit()
+        init.start("robot", self.robot.start)
+        init.start("speech recognition", self.voice_listener.start)
+        init.start("llm", self.agent.warm_up, required=False) # Only saves time on the first call
+        init.start("text to speech", self.voice_speaker.start)
+        init.wait()
+        print(f"Init timings: {init.report()}")
+        self.voice_speaker.prerender(COMMON_PHRASES)
+
+    def run(self):
+        self.start()
         while self.state != CoordinatorState.DONE:
             print("getting user input")
             user_input = self.voice_listener.get_voice()
             self.robot.ask_update_item_list()
             print("running llm step")
             self.handle_user_input(user_input)
+        self.voice_speaker.wait_until_done()
+        if self.speculate:
+            print(f"Speculative agent calls: {self.speculation_stats}")
 
-    def user_communication(self, info):
+    def user_communication(self, info, already_spoken: bool = False):
         print(f"################ USER COMMUNICATION:\n{info}")
-        self.voice_speaker.speak(info)
+        if not already_spoken:
+            self.voice_speaker.speak(info)
+
+    def speak_early(self, sentence):
+        print(f"################ USER COMMUNICATION (streamed): {sentence}")
+        self.voice_speaker.speak(sentence)
     
     def handle_user_input(self, user_input):
-        self.state = CoordinatorState.LLM_PROCESSING
-        self.agent.add_input(user_input=user_input, system_input=str(self.robot.state))
-        done = False
-        while not done: # Continue processing results until the LLM is either done or requires user input
-            print(f"Handling state: {self.state}")
-            agent_command = self.agent.process_input()
-            if agent_command.action.is_robot_action():
-                robot_command = translate_agent_command_to_robot_command(agent_command)
+        with tracing.span("coordinator.turn", user_input=user_input):
+            self.state = CoordinatorState.LLM_PROCESSING
+            self.agent.add_input(user_input=user_input, robot_state=str(self.robot.state))
+            done = False
+            while not done: # Continue processing results until the LLM is either done or requires user input
+                print(f"Handling state: {self.state}")
+                agent_commands, spoken = self.take_speculation() or self.query_agent()
+                done = self.execute_agent_commands(agent_commands, spoken=spoken)
+            print(f"final state: {self.state}")
+        return
+
+    def query_agent(self) -> tuple[list[AgentCommand], set[int]]:
+        """The agent's next commands, and the indices of those whose user message was spoken while they streamed in"""
+        message_stream = UserMessageStream(self.speak_early)
+        agent_commands = self.agent.process_input(message_stream)
+        return agent_commands, message_stream.streamed_commands
+
+    def start_speculation(self, agent_commands: list[AgentCommand]):
+        """
+        Queries the agent ahead of time if agent_commands (the rest of a response, starting with a robot command) end without handing back to the user,
+        so the agent will be queried again with the robot state once they have been executed
+        """
+        if self._speculation is not None or any(c.action.is_wait_user_input_action() or c.action == AgentAction.GOAL_COMPLETED for c in agent_commands):
+            return
+        predicted_state = predict_robot_state(self.robot.state, agent_commands)
+        if predicted_state is None:
+            self.speculation_stats.record("unpredictable")
+            return
+        if self._speculation_executor is None:
+            self._speculation_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="speculative agent call")
+        expected_history = self.agent.state.history + [HistoryElement(robot_state=str(predicted_state))]
+        self._speculation = SpeculativeRequest(self.agent, expected_history, self._speculation_executor, self.speculation_stats)
+
+    def take_speculation(self) -> Optional[tuple[list[AgentCommand], set[int]]]:
+        """The commands of the agent call made ahead of time, if it was made with the agent's current history. Speaks its user messages that were streamed in."""
+        speculation, self._speculation = self._speculation, None
+        if speculation is None:
+            return None
+        agent_commands = speculation.take()
+        if agent_commands is None:
+            print(f"Discarding the speculative agent call ({self.speculation_stats.hit_rate:.0%} hit rate)")
+            return None
+        print(f"Using the speculative agent call ({self.speculation_stats.hit_rate:.0%} hit rate)")
+        self.agent.record_commands(agent_commands)
+        for sentence in speculation.sentences:
+            self.speak_early(sentence)
+        return agent_commands, speculation.message_stream.streamed_commands
+
+    def execute_agent_commands(self, agent_commands: list[AgentCommand], spoken: Optional[set[int]] = None) -> bool:
+        """
+        Executes the agent's commands in order. Returns True once the agent is waiting for the user or the goal is completed,
+        False if the agent should be queried again (its commands ran out, or a robot command failed and it has to re-plan).
+        spoken: indices of the commands whose user message was already spoken while the response streamed in
+        """
+        robot_moved = False
+        for i, agent_command in enumerate(agent_commands):
+            if agent_command.action == AgentAction.GO_TO_STATE or agent_command.action.is_robot_action():
                 self.state = CoordinatorState.ROBOT_MOVING
-                self.robot.handle_command(robot_command)
-                self.agent.add_input(system_input=str(self.robot.state))
+                if self.speculate:
+                    self.start_speculation(agent_commands[i:])
+                try:
+                    self.execute_robot_commands(agent_command)
+                except PlanExecutionError as e:
+                    self.abort_agent_commands(agent_commands, i, e)
+                    return False
+                robot_moved = True
                 self.state = CoordinatorState.LLM_PROCESSING
             elif agent_command.action == AgentAction.SPECIFY_PLAN:
                 self.state = CoordinatorState.LLM_PROCESSING
-            elif agent_command.action.is_wait_user_input_action():
-                self.user_communication(agent_command.user_message)
-                self.state = CoordinatorState.USER_INPUT
-                done = True
-            elif agent_command.action == AgentAction.GOAL_COMPLETED:
-                self.user_communication("Agent considers goal completed")
-                self.state = CoordinatorState.DONE
-                done = True
-        print(f"final state: {self.state}")
-        return
+            elif agent_command.action.is_wait_user_input_action() or agent_command.action == AgentAction.GOAL_COMPLETED:
+                self.hand_back_to_user(agent_commands, i, robot_moved, spoken)
+                return True
+        if robot_moved:
+            self.agent.add_input(robot_state=str(self.robot.state))
+        return False
+
+    def abort_agent_commands(self, agent_commands: list[AgentCommand], i: int, error: PlanExecutionError):
+        """Tells the agent that its command i failed and the ones after it weren't executed, so that it re-plans"""
+        print(f"Aborting the agent's commands: {error}")
+        self.state = CoordinatorState.LLM_PROCESSING
+        skipped = len(agent_commands) - i - 1
+        self.agent.add_input(system_input=f"Command {i + 1} ({agent_commands[i].action.value}) failed: {error}. The {skipped} commands after it were not executed. Please re-plan from the current state.",
+                             robot_state=str(self.robot.state))
+
+    def hand_back_to_user(self, agent_commands: list[AgentCommand], i: int, robot_moved: bool, spoken: Optional[set[int]]):
+        """Ends the agent's commands at command i, which waits for the user or completes the goal"""
+        agent_command = agent_commands[i]
+        if i < len(agent_commands) - 1:
+            print(f"Discarding {len(agent_commands) - i - 1} commands after {agent_command.action.value}")
+        if robot_moved:
+            self.agent.add_input(robot_state=str(self.robot.state))
+        if agent_command.action == AgentAction.GOAL_COMPLETED:
+            self.user_communication(GOAL_COMPLETED_MESSAGE)
+            self.state = CoordinatorState.DONE
+        else:
+            self.user_communication(agent_command.user_message, already_spoken=spoken is not None and i in spoken)
+            self.state = CoordinatorState.USER_INPUT
+
+    def execute_robot_commands(self, agent_command: AgentCommand, cancelled: Optional[Callable[[], bool]] = None):
+        """
+        Executes a robot action, or expands a goal state into the robot commands that reach it and executes them without consulting the LLM in between.
+        Raises PlanExecutionError if a command isn't possible from the robot's state, fails, or leaves the robot in a different state than expected.
+        cancelled: checked before each robot command, stops once it returns True
+        """
+        state = PlannerState.from_robot_state(self.robot.state)
+        try:
+            if agent_command.action == AgentAction.GO_TO_STATE:
+                robot_commands = plan_to_goal(state, agent_command.location, agent_command.basket_position)
+                print(f"Planned {len(robot_commands)} robot commands: {[(command.action.value, command.location) for command in robot_commands]}")
+            else:
+                robot_commands = [translate_agent_command_to_robot_command(agent_command)]
+            for robot_command in robot_commands:
+                if cancelled is not None and cancelled():
+                    print(f"Cancelled before {robot_command.action.value}")
+                    return
+                expected_state = next_state(state, robot_command)
+                self.robot.handle_command(robot_command)
+                state = PlannerState.from_robot_state(self.robot.state)
+                if state != expected_state:
+                    raise PlanExecutionError(f"expected the basket to be {expected_state.basket_position.value} at the {expected_state.location.value} after {robot_command.action.value}")
+        except PlanExecutionError:
+            raise
+        except Exception as e: # Planning errors, and whatever the robot raises when a command fails
+            raise PlanExecutionError(str(e) or type(e).__name__) from e
@@ -0,0 +1,221 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+DEFAULT_CHUNK_CHARS = 8 # Characters of output text per streamed delta
+
+
+class FakeLLMServer:
+    """
+    Local stand-in for the OpenAI Responses API (POST /v1/responses) that replays scripted output texts in order, one per request,
+    optionally streamed as server-sent events. Use it with OpenAIBackend(base_url=server.base_url, api_key="fake").
+    first_token_delay: seconds before the first delta (or the whole response when not streaming)
+    chunk_delay: seconds between streamed deltas, a non-streamed response waits for all of them too
+    delay_jitter: fraction by which each delay is randomly lengthened or shortened
+    error_rate: fraction of requests that fail with error_status instead, without consuming an output
+    repeat: start over from the first output once they have all been used, for load tests
+    by_turn: pick the output by the number of assistant messages in the request's input rather than in order,
+      so that a request repeated or made ahead of time (e.g. speculatively) with the same conversation gets the same output
+    """
+    def __init__(self, outputs: list[str], first_token_delay: float = 0.0, chunk_delay: float = 0.0, chunk_chars: int = DEFAULT_CHUNK_CHARS,
+                 delay_jitter: float = 0.0, error_rate: float = 0.0, error_status: int = 500, repeat: bool = False,
+                 by_turn: bool = False, seed: Optional[int] = None, port: int = 0) -> None:
+        self.outputs = list(outputs)
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.chunk_chars = chunk_chars
+        self.delay_jitter = delay_jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.repeat = repeat
+        self.by_turn = by_turn
+        self.requests: list[dict] = [] # Bodies of the requests received, in order
+        self.errors_sent = 0
+        self._next = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._make_handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def start(self):
+        self._thread.start()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def next_output(self, request: dict) -> Optional[str]:
+        """The output to send for a request, or None if it should fail"""
+        with self._lock:
+            self.requests.append(request)
+            if self._rng.random() < self.error_rate:
+                self.errors_sent += 1
+                return None
+            if self.by_turn:
+                turn = sum(isinstance(item, dict) and item.get("role") == "assistant" for item in request.get("input", []))
+                if turn >= len(self.outputs):
+                    raise IndexError(f"No scripted LLM output for turn {turn}")
+                return self.outputs[turn]
+            if self._next >= len(self.outputs):
+                if not self.repeat or not self.outputs:
+                    raise IndexError("No scripted LLM outputs left")
+                self._next = 0
+            self._next += 1
+            return self.outputs[self._next - 1]
+
+    def delay(self, seconds: float) -> float:
+        with self._lock:
+            return seconds * (1 + self.delay_jitter * self._rng.uniform(-1, 1))
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass # The client gave up on the request, e.g. because of its deadline
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/models"):
+                    self._send_json(200, {"object": "list", "data": [{"id": "fake", "object": "model", "created": 0, "owned_by": "fake"}]})
+                else:
+                    self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                try:
+                    output = server.next_output(request)
+                except IndexError as e:
+                    self._send_json(500, {"error": {"message": str(e), "type": "server_error"}})
+                    return
+                time.sleep(server.delay(server.first_token_delay))
+                if output is None:
+                    self._send_json(server.error_status, {"error": {"message": "Injected failure", "type": "server_error"}})
+                    return
+                chunks = [output[i:i + server.chunk_chars] for i in range(0, len(output), server.chunk_chars)]
+                response = make_response(request, output)
+                if request.get("stream"):
+                    self._stream(response, chunks)
+                else:
+                    time.sleep(sum(server.delay(server.chunk_delay) for _ in chunks[1:]))
+                    self._send_json(200, response)
+
+            def _send_json(self, status: int, body: dict):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, response: dict, chunks: list[str]):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                first_delta = True
+                for i, event in enumerate(stream_events(response, chunks)):
+                    if event["type"] == "response.output_text.delta":
+                        if not first_delta:
+                            time.sleep(server.delay(server.chunk_delay))
+                        first_delta = False
+                    event["sequence_number"] = i
+                    self.wfile.write(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode())
+                    self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+
+def make_response(request: dict, output_text: str, status: str = "completed") -> dict:
+    input_chars = len(json.dumps(request.get("input", "")))
+    output_tokens = (len(output_text) + 3) // 4
+    return {
+        "id": f"resp_fake_{time.monotonic_ns()}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": request.get("model", "fake"),
+        "status": status,
+        "output": [{
+            "id": "msg_fake",
+            "type": "message",
+            "role": "assistant",
+            "status": status,
+            "content": [{"type": "output_text", "text": output_text, "annotations": []}],
+        }],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "temperature": request.get("temperature"),
+        "text": request.get("text"),
+        "usage": {
+            "input_tokens": (input_chars + 3) // 4,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": (input_chars + 3) // 4 + output_tokens,
+        },
+    }
+
+
+def stream_events(response: dict, chunks: list[str]) -> list[dict]:
+    """The server-sent events of a streamed Responses API call producing a single text message"""
+    in_progress = dict(response, status="in_progress", output=[])
+    item = response["output"][0]
+    empty_item = dict(item, status="in_progress", content=[])
+    part = dict(item["content"][0], text="")
+    text = item["content"][0]["text"]
+    item_ids = {"item_id": item["id"], "output_index": 0}
+    events = [
+        {"type": "response.created", "response": in_progress},
+        {"type": "response.in_progress", "response": in_progress},
+        {"type": "response.output_item.added", "output_index": 0, "item": empty_item},
+        {"type": "response.content_part.added", **item_ids, "content_index": 0, "part": part},
+    ]
+    events += [{"type": "response.output_text.delta", **item_ids, "content_index": 0, "delta": chunk, "logprobs": []} for chunk in chunks]
+    events += [
+        {"type": "response.output_text.done", **item_ids, "content_index": 0, "text": text, "logprobs": []},
+        {"type": "response.content_part.done", **item_ids, "content_index": 0, "part": item["content"][0]},
+        {"type": "response.output_item.done", "output_index": 0, "item": item},
+        {"type": "response.completed", "response": response},
+    ]
+    return events
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve scripted LLM outputs on a local OpenAI-compatible Responses API endpoint")
+    parser.add_argument("outputs", help="JSONL file with one output text (a JSON string) per line, replayed in order")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--first-token-delay", type=float, default=0.0)
+    parser.add_argument("--chunk-delay", type=float, default=0.0)
+    parser.add_argument("--delay-jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--repeat", action="store_true")
+    parser.add_argument("--by-turn", action="store_true")
+    args = parser.parse_args()
+    with open(args.outputs) as f:
+        outputs = [json.loads(line) for line in f if line.strip()]
+    server = FakeLLMServer(outputs, first_token_delay=args.first_token_delay, chunk_delay=args.chunk_delay, delay_jitter=args.delay_jitter,
+                           error_rate=args.error_rate, error_status=args.error_status, repeat=args.repeat, by_turn=args.by_turn, port=args.port)
+    print(f"Serving {len(outputs)} outputs on {server.base_url}")
+    server.serve_forever()
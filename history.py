@@ -0,0 +1,135 @@
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Optional
+
+if TYPE_CHECKING:
+    from agent import HistoryElement
+
+DEFAULT_TOKEN_BUDGET = 4000 # Maximum number of tokens of history to send per call
+DEFAULT_KEEP_RECENT = 8 # Number of most recent history elements that are never summarized
+MESSAGE_OVERHEAD_TOKENS = 4 # Approximate per-message formatting overhead
+SUMMARY_LINE_CHARS = 200 # Maximum length of each line of an extractive summary
+
+
+_encoding = None
+_encoding_loaded = False
+
+
+def get_encoding():
+    """The tokenizer used by gpt-4.1, loaded on first use since it takes a while. None if tiktoken or the encoding isn't available."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception: # Not installed, or the encoding isn't cached locally and can't be downloaded
+            _encoding = None
+        _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Exact count if tiktoken is installed, otherwise the usual ~4 characters per token estimate"""
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def count_message_tokens(messages) -> int:
+    return sum(count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+def summarize_elements(elements: list["HistoryElement"]) -> str:
+    """Extractive summary of history elements: one truncated line per user input and agent response, robot states are dropped"""
+    lines = []
+    for element in elements:
+        if element.user_input is not None:
+            text = f"User: {element.user_input}"
+        elif element.agent_response is not None:
+            text = f"Agent: {element.agent_response}"
+        elif element.system_input is not None:
+            text = f"System: {element.system_input}"
+        else:
+            continue
+        text = " ".join(text.split())
+        if len(text) > SUMMARY_LINE_CHARS:
+            text = text[:SUMMARY_LINE_CHARS - 3] + "..."
+        lines.append(f"- {text}")
+    return "\n".join(lines)
+
+
+@dataclass
+class HistoryStats:
+    calls: int = 0
+    tokens_sent: list[int] = field(default_factory=list) # Tokens actually sent on each call
+    tokens_full: list[int] = field(default_factory=list) # Tokens the full, uncompacted history would have been on each call
+
+    def __str__(self) -> str:
+        if self.calls == 0:
+            return "No calls"
+        sent = sum(self.tokens_sent)
+        full = sum(self.tokens_full)
+        return f"{self.calls} calls, {sent} history tokens sent vs {full} uncompacted ({1 - sent / full:.0%} saved), last call {self.tokens_sent[-1]} tokens"
+
+
+class HistoryManager:
+    """
+    Builds the LLM input from the agent history within a token budget:
+    - The first element (the scenario prompt) is always sent first and unchanged, so it stays a cacheable prefix
+    - Robot state messages superseded by a newer one are dropped
+    - Once the budget is exceeded, the oldest turns (other than the most recent keep_recent elements) are folded into a running summary.
+      The summary only grows by whole chunks, so it stays stable across calls in between.
+    """
+    def __init__(self, token_budget: int = DEFAULT_TOKEN_BUDGET, keep_recent: int = DEFAULT_KEEP_RECENT,
+                 summarize_fn: Callable[[list["HistoryElement"]], str] = summarize_elements) -> None:
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.summarize_fn = summarize_fn
+        self.stats = HistoryStats()
+        self._summarized_upto = 1 # History elements before this index (other than the prefix) are covered by the summary
+        self._summary_parts: list[str] = []
+        self._dropped_summaries = 0 # Number of summary chunks dropped entirely to stay within the budget
+
+    def build_input(self, history: list["HistoryElement"]) -> list:
+        prefix, rest = history[:1], history[1:]
+        messages = self._assemble(prefix, rest)
+        while count_message_tokens(messages) > self.token_budget and (self._fold_oldest(history) or self._drop_oldest_summary()):
+            messages = self._assemble(prefix, rest)
+        tokens = count_message_tokens(messages)
+        self.stats.calls += 1
+        self.stats.tokens_sent.append(tokens)
+        self.stats.tokens_full.append(count_message_tokens([element.to_llm_input() for element in history]))
+        return messages
+
+    def _assemble(self, prefix, rest) -> list:
+        messages = [element.to_llm_input() for element in prefix]
+        if self._summary_parts:
+            summary = "\n".join(self._summary_parts)
+            if self._dropped_summaries:
+                summary = f"(The beginning of the conversation has been omitted)\n{summary}"
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+        remaining = rest[self._summarized_upto - 1:]
+        latest_robot_state = max((i for i, element in enumerate(remaining) if element.robot_state is not None), default=None)
+        for i, element in enumerate(remaining):
+            if element.robot_state is not None and i != latest_robot_state:
+                continue # Superseded by a newer robot state
+            messages.append(element.to_llm_input())
+        return messages
+
+    def _fold_oldest(self, history) -> bool:
+        """Moves the older half of the summarizable elements into the summary. Returns False if there is nothing left to fold."""
+        foldable_end = len(history) - self.keep_recent
+        if foldable_end <= self._summarized_upto:
+            return False
+        chunk_end = max(self._summarized_upto + 1, (self._summarized_upto + foldable_end + 1) // 2)
+        self._summary_parts.append(self.summarize_fn(history[self._summarized_upto:chunk_end]))
+        self._summarized_upto = chunk_end
+        return True
+
+    def _drop_oldest_summary(self) -> bool:
+        """Last resort once everything foldable is summarized: forget the oldest part of the summary"""
+        if not self._summary_parts:
+            return False
+        self._summary_parts.pop(0)
+        self._dropped_summaries += 1
+        return True
@@ -0,0 +1,192 @@
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from metrics import Histogram
+
+DEFAULT_MODEL = "gpt-4.1"
+DEFAULT_DEADLINE = 30.0 # Seconds an LLM call may take in total, across all of its attempts
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BACKOFF = 0.5 # Seconds, the cap on the first retry delay, doubled for each further retry
+DEFAULT_MAX_BACKOFF = 8.0 # Seconds, the cap on any retry delay
+DEFAULT_MAX_CONNECTIONS = 4 # Size of the HTTP connection pool
+LATENCY_EDGES_MS = [100, 250, 500, 1000, 2000, 5000, 10000, 30000]
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMDeadlineExceeded(LLMError):
+    pass
+
+
+@dataclass
+class LLMResult:
+    parsed: Any # Instance of the requested text_format
+    output_text: str # The raw structured output, e.g. to cache it
+    latency: float # Seconds from the first attempt until the response was complete
+    attempts: int
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+
+@dataclass
+class LLMStats:
+    calls: int = 0
+    failures: int = 0
+    attempts: int = 0
+    retries: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    latency: Histogram = field(default_factory=lambda: Histogram(LATENCY_EDGES_MS))
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, result: Optional[LLMResult], attempts: int):
+        with self._lock:
+            self.calls += 1
+            self.attempts += attempts
+            self.retries += attempts - 1
+            if result is None:
+                self.failures += 1
+                return
+            self.input_tokens += result.input_tokens
+            self.output_tokens += result.output_tokens
+            self.latency.add(result.latency)
+
+    def __str__(self) -> str:
+        return (f"{self.calls} calls, {self.failures} failed, {self.retries} retries, {self.input_tokens} input / {self.output_tokens} output tokens\n"
+                f"  latency: {self.latency}")
+
+
+class LLMBackend:
+    """
+    A source of structured LLM responses. parse() returns the response parsed into text_format (a pydantic model),
+    or raises LLMError once the call has failed for good.
+    """
+    stats: LLMStats
+
+    def parse(self, input: list, text_format: type, model: str = DEFAULT_MODEL, temperature: float = 0.0,
+              deadline: Optional[float] = None, on_delta: Optional[Callable[[str], None]] = None) -> LLMResult:
+        """
+        deadline: seconds the call may take in total, defaults to the backend's
+        on_delta: if given, the response is streamed and this is called with each piece of the output text as it arrives
+        """
+        raise NotImplementedError
+
+    def warm_up(self):
+        """Gets the backend ready to answer the first call quickly (e.g. opens a connection), without generating anything"""
+        pass
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    The OpenAI Responses API, or anything compatible with it (e.g. fake_llm.FakeLLMServer via base_url).
+    A single client, and so a single pool of keep-alive connections, is shared by every call. It's only created on the first call.
+    Connection errors, timeouts, rate limiting and server errors are retried with full-jitter exponential backoff,
+    as long as the attempts and the call's deadline allow, and nothing was streamed to on_delta yet.
+    """
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None, deadline: float = DEFAULT_DEADLINE,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, backoff: float = DEFAULT_BACKOFF, max_backoff: float = DEFAULT_MAX_BACKOFF,
+                 max_connections: int = DEFAULT_MAX_CONNECTIONS, seed: Optional[int] = None) -> None:
+        self.base_url = base_url
+        self.api_key = api_key
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_connections = max_connections
+        self.stats = LLMStats()
+        self._rng = random.Random(seed)
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._client_lock:
+            if self._client is None:
+                import openai
+                try:
+                    import httpx
+                except ImportError:
+                    import httpx2 as httpx # What newer openai releases are built on
+                self._client = openai.OpenAI(
+                    base_url=self.base_url,
+                    api_key=self.api_key,
+                    max_retries=0, # Retries are done here, within the call's deadline
+                    http_client=openai.DefaultHttpxClient(limits=httpx.Limits(max_connections=self.max_connections,
+                                                                              max_keepalive_connections=self.max_connections)),
+                )
+            return self._client
+
+    def parse(self, input: list, text_format: type, model: str = DEFAULT_MODEL, temperature: float = 0.0,
+              deadline: Optional[float] = None, on_delta: Optional[Callable[[str], None]] = None) -> LLMResult:
+        import openai
+        retryable = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+        start = time.monotonic()
+        end = start + (deadline if deadline is not None else self.deadline)
+        streamed = [False] # Whether on_delta has been called, after which the call can't be retried
+        attempts = 0
+        error: Optional[Exception] = None
+        deadline_exceeded = False
+        while attempts < self.max_attempts:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                deadline_exceeded = True
+                break
+            attempts += 1
+            try:
+                response = self._request(input, text_format, model, temperature, remaining, end, on_delta, streamed)
+            except retryable as e:
+                error = e
+                if streamed[0]:
+                    break
+                delay = self._rng.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempts - 1)))
+                if time.monotonic() + delay >= end:
+                    deadline_exceeded = True
+                    break
+                time.sleep(delay)
+                continue
+            except LLMDeadlineExceeded:
+                self.stats.record(None, attempts)
+                raise
+            except openai.APIError as e: # Not worth retrying, e.g. a bad request
+                self.stats.record(None, attempts)
+                raise LLMError(f"LLM call failed: {e}") from e
+            if response.output_parsed is None:
+                self.stats.record(None, attempts)
+                raise LLMError("The LLM response couldn't be parsed")
+            usage = response.usage
+            result = LLMResult(
+                parsed=response.output_parsed,
+                output_text=response.output_text,
+                latency=time.monotonic() - start,
+                attempts=attempts,
+                input_tokens=usage.input_tokens if usage is not None else 0,
+                output_tokens=usage.output_tokens if usage is not None else 0,
+            )
+            self.stats.record(result, attempts)
+            return result
+
+        self.stats.record(None, attempts)
+        if deadline_exceeded:
+            raise LLMDeadlineExceeded(f"LLM call didn't complete within its deadline ({attempts} attempts, last error: {error})") from error
+        raise LLMError(f"LLM call failed after {attempts} attempts: {error}") from error
+
+    def warm_up(self):
+        """Lists the available models, which opens a pooled connection (TCP and TLS handshakes) for the first real call to reuse"""
+        self.client.models.list(timeout=self.deadline)
+
+    def _request(self, input, text_format, model, temperature, timeout, end, on_delta, streamed):
+        if on_delta is None:
+            return self.client.responses.parse(model=model, temperature=temperature, input=input, text_format=text_format, timeout=timeout)
+        with self.client.responses.stream(model=model, temperature=temperature, input=input, text_format=text_format, timeout=timeout) as stream:
+            for event in stream:
+                if event.type == "response.output_text.delta":
+                    streamed[0] = True
+                    on_delta(event.delta)
+                if time.monotonic() > end:
+                    raise LLMDeadlineExceeded("LLM call didn't complete within its deadline while streaming")
+            return stream.get_final_response()
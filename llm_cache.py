@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional
+
+DEFAULT_CACHE_DIR = ".llm_cache"
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024 # Total size of cached responses before the least recently used ones are evicted
+
+
+class CacheMode(Enum):
+    OFF = "OFF" # Always call the LLM, never read or write the cache
+    READ_WRITE = "READ_WRITE" # Serve hits from the cache, call the LLM on a miss and store the response
+    RECORD = "RECORD" # Always call the LLM and overwrite the stored response, to refresh fixtures
+    REPLAY = "REPLAY" # Only serve from the cache, a miss is an error. For offline runs and regression fixtures
+
+
+class CacheMiss(Exception):
+    pass
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    time_saved: float = 0.0 # Sum of the recorded LLM latencies of every hit, in seconds
+
+    def __str__(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses, {self.evictions} evictions, {self.time_saved:.1f} s of LLM calls saved"
+
+
+def make_key(model: str, input: list, schema: dict, **params) -> str:
+    """Content address of an LLM call: the hash of everything that determines its response"""
+    content = json.dumps({"model": model, "input": input, "schema": schema, "params": params}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of LLM responses, one JSON file per key.
+    Only worth using for deterministic calls (temperature 0): the same input is assumed to produce the same response.
+    Each hit refreshes the entry's modification time, and once the directory exceeds max_bytes the least recently used entries are deleted.
+    """
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES, mode: CacheMode = CacheMode.READ_WRITE) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.stats = CacheStats()
+        if mode != CacheMode.OFF:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Returns the stored entry, or None if the LLM should be called.
+        Raises CacheMiss in REPLAY mode if there is no entry.
+        """
+        if self.mode in (CacheMode.OFF, CacheMode.RECORD):
+            return None
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.stats.misses += 1
+            if self.mode == CacheMode.REPLAY:
+                raise CacheMiss(f"No cached LLM response for key {key} in {self.directory}")
+            return None
+        os.utime(path)
+        self.stats.hits += 1
+        self.stats.time_saved += entry.get("latency", 0.0)
+        return entry
+
+    def put(self, key: str, output_text: str, model: str, latency: float):
+        if self.mode in (CacheMode.OFF, CacheMode.REPLAY):
+            return
+        entry = {"model": model, "output_text": output_text, "latency": latency, "created": time.time()}
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path) # Atomic, so a concurrent reader never sees a partial entry
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+        entries.sort()
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+            self.stats.evictions += 1
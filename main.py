@@ -1,12 +1,58 @@
+import sys
+
+from agent import Agent
+from async_coordinator import AsyncCoordinator
 from coordinator import Coordinator
 import coordinator
+from llm_cache import CacheMode, ResponseCache
 from state_representation import BasketPosition, Location
+from audio.recognizers import FixtureRecognizer, WhisperRecognizer
+from audio.sources import WavFileSource
+from voice import MockVoiceListener, MockVoiceSpeaker, VoiceListener
+import tracing
 
 if __name__ == "__main__":
-    coordinator = Coordinator()
+    # --trace PREFIX: record where each turn spends its time, written to PREFIX.jsonl and PREFIX.trace.json (Chrome trace format) at exit
+    trace_prefix = sys.argv[sys.argv.index("--trace") + 1] if "--trace" in sys.argv else None
+    if trace_prefix is not None:
+        tracing.enable()
+    # --speculate: query the agent with the predicted robot state while the robot is still moving (see Coordinator)
+    speculate = "--speculate" in sys.argv
+    if speculate and "--async" in sys.argv:
+        sys.exit("--speculate is only supported by the sequential coordinator, run without --async to use it")
+    # --cache: reuse identical LLM responses, --record: refresh them, --replay: run offline from previously cached responses only
+    cache_modes = {"--cache": CacheMode.READ_WRITE, "--record": CacheMode.RECORD, "--replay": CacheMode.REPLAY}
+    modes = [cache_modes[arg] for arg in sys.argv[1:] if arg in cache_modes]
+    # --stream: speak the agent's messages sentence by sentence while its response is still streaming in
+    agent = Agent(cache=ResponseCache(mode=modes[-1]) if modes else None, stream="--stream" in sys.argv)
+    # --mock: typed input and printed speech instead of the microphone and speakers
+    if "--mock" in sys.argv and "--async" in sys.argv:
+        # --async: listen, think, move and speak concurrently, and let the user barge in (see AsyncCoordinator)
+        coordinator = AsyncCoordinator(agent=agent, voice_listener=MockVoiceListener(), voice_speaker=MockVoiceSpeaker(), ask_item_list=False) #type: ignore
+    elif "--mock" in sys.argv:
+        coordinator = Coordinator(agent=agent, voice_listener=MockVoiceListener(), voice_speaker=MockVoiceSpeaker(), speculate=speculate) #type: ignore
+    else:
+        # --wav PATH: listen to a recorded 16-bit mono WAV file, played back in real time, instead of the microphone
+        source = WavFileSource(sys.argv[sys.argv.index("--wav") + 1]) if "--wav" in sys.argv else None
+        # --whisper: transcribe offline with faster-whisper, --transcripts PATH: take the transcripts from a file, one line per utterance
+        if "--transcripts" in sys.argv:
+            recognizer = FixtureRecognizer.from_file(sys.argv[sys.argv.index("--transcripts") + 1])
+        elif "--whisper" in sys.argv:
+            recognizer = WhisperRecognizer()
+        else:
+            recognizer = None
+        if "--async" in sys.argv:
+            coordinator = AsyncCoordinator(agent=agent, voice_listener=VoiceListener(source, recognizer))
+        else:
+            coordinator = Coordinator(agent=agent, voice_listener=VoiceListener(source, recognizer), speculate=speculate)
     try:
         coordinator.run()
     except Exception as e:
         print(e)
-
-    print(coordinator.agent.state.history)
\ No newline at end of file
+    finally: # Also when the session is ended with Ctrl-C
+        print(coordinator.agent.state.history)
+        tracer = tracing.get_tracer()
+        if tracer is not None:
+            tracer.export_jsonl(f"{trace_prefix}.jsonl")
+            tracer.export_chrome(f"{trace_prefix}.trace.json")
+            print(f"Latency by stage:\n{tracer.report()}")
\ No newline at end of file
@@ -0,0 +1,26 @@
+"""Latency metrics shared by the subsystems"""
+import bisect
+
+HISTOGRAM_EDGES_MS = [0.5, 1, 2, 5, 10, 20, 50, 100] # Upper bounds of the histogram bins, the last bin catches everything above
+
+
+class Histogram:
+    def __init__(self, edges_ms: list[float] = HISTOGRAM_EDGES_MS) -> None:
+        self.edges_ms = edges_ms
+        self.counts = [0] * (len(edges_ms) + 1)
+        self.total = 0.0
+        self.max = 0.0
+        self.n = 0
+
+    def add(self, seconds: float):
+        self.counts[bisect.bisect_left(self.edges_ms, seconds * 1000)] += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.n += 1
+
+    def __str__(self) -> str:
+        if self.n == 0:
+            return "no samples"
+        labels = [f"<={edge:g}" for edge in self.edges_ms] + [f">{self.edges_ms[-1]:g}"]
+        bins = " ".join(f"{label}:{count}" for label, count in zip(labels, self.counts) if count)
+        return f"mean {1000 * self.total / self.n:.2f} ms, max {1000 * self.max:.2f} ms [{bins}]"
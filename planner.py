@@ -0,0 +1,76 @@
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from robot import BasketAction, RobotCommand, RobotState
+from state_representation import BasketPosition, Location
+
+
+class PlanningError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class PlannerState:
+    location: Location
+    basket_position: BasketPosition
+
+    @staticmethod
+    def from_robot_state(robot_state: RobotState) -> "PlannerState":
+        return PlannerState(robot_state.location, robot_state.basket_position)
+
+    def matches(self, location: Optional[Location], basket_position: Optional[BasketPosition]) -> bool:
+        """Whether this state satisfies a goal, None meaning either value is fine"""
+        return (location is None or self.location == location) and (basket_position is None or self.basket_position == basket_position)
+
+
+def successors(state: PlannerState) -> list[tuple[RobotCommand, PlannerState]]:
+    """The legal robot commands from a state and the states they lead to. The basket can only be moved while raised."""
+    if state.basket_position == BasketPosition.LOWERED:
+        return [(RobotCommand(BasketAction.RAISE_BASKET), PlannerState(state.location, BasketPosition.RAISED))]
+    result = [(RobotCommand(BasketAction.LOWER_BASKET), PlannerState(state.location, BasketPosition.LOWERED))]
+    for location in Location:
+        if location != state.location:
+            result.append((RobotCommand(BasketAction.MOVE_BASKET_TO_LOCATION, location=location), PlannerState(location, state.basket_position)))
+    return result
+
+
+def plan_to_goal(start: PlannerState, location: Optional[Location] = None, basket_position: Optional[BasketPosition] = None) -> list[RobotCommand]:
+    """Shortest sequence of robot commands (breadth-first search) from start to a state matching the goal"""
+    parents: dict[PlannerState, Optional[tuple[PlannerState, RobotCommand]]] = {start: None}
+    queue = deque([start])
+    while queue:
+        state = queue.popleft()
+        if state.matches(location, basket_position):
+            commands = []
+            while parents[state] is not None:
+                state, command = parents[state] #type: ignore
+                commands.append(command)
+            return commands[::-1]
+        for command, next_state in successors(state):
+            if next_state not in parents:
+                parents[next_state] = (state, command)
+                queue.append(next_state)
+    raise PlanningError(f"No sequence of robot commands reaches location {location} with the basket {basket_position} from {start}")
+
+
+def is_no_op(state: PlannerState, command: RobotCommand) -> bool:
+    """Whether a robot command leaves state as it is: raising a raised basket, lowering a lowered one or moving a raised one to where it already is"""
+    if command.action == BasketAction.RAISE_BASKET:
+        return state.basket_position == BasketPosition.RAISED
+    if command.action == BasketAction.LOWER_BASKET:
+        return state.basket_position == BasketPosition.LOWERED
+    return state.basket_position == BasketPosition.RAISED and command.location == state.location
+
+
+def next_state(state: PlannerState, command: RobotCommand) -> PlannerState:
+    """
+    The state a robot command should leave the robot in (the same semantics as MockRobot). No-op commands (see is_no_op) leave it unchanged,
+    as the robots accept them. Raises PlanningError if the command isn't legal from state.
+    """
+    if is_no_op(state, command):
+        return state
+    for candidate, result in successors(state):
+        if candidate == command:
+            return result
+    raise PlanningError(f"{command.action.value} {command.location.value if command.location else ''} is not possible while the basket is {state.basket_position.value} at the {state.location.value}")
@@ -0,0 +1,82 @@
+"""
+Profiles the startup of a mock session (python main.py --mock): the import-time breakdown and the time until the
+coordinator first prints "getting user input". Exits with status 1 if that takes longer than the budget, so it can guard against regressions.
+Run from the repository root:
+    python profile_startup.py              # default budget
+    python profile_startup.py --budget 0.5 # seconds
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+STARTUP_BUDGET = 1.0 # Seconds from launch until the mock session is waiting for user input
+READY_LINE = "getting user input"
+STARTUP_TIMEOUT = 30.0 # Seconds after which the session is considered hung
+TOP_N = 15
+
+
+def measure_startup(args: list[str]) -> tuple[float, str]:
+    """Launches main.py with import timing enabled. Returns the seconds until READY_LINE was printed and the import timing output."""
+    env = dict(os.environ, OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "unused"))
+    with tempfile.TemporaryFile("w+") as stderr:
+        start = time.monotonic()
+        process = subprocess.Popen([sys.executable, "-X", "importtime", "-u", "main.py", *args],
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr, text=True, env=env)
+        elapsed = None
+        try:
+            assert process.stdout is not None
+            for line in process.stdout:
+                if READY_LINE in line:
+                    elapsed = time.monotonic() - start
+                    break
+                if time.monotonic() - start > STARTUP_TIMEOUT:
+                    break
+        finally:
+            process.kill()
+            process.wait()
+        stderr.seek(0)
+        import_output = stderr.read()
+    if elapsed is None:
+        raise RuntimeError(f"main.py {' '.join(args)} never printed '{READY_LINE}':\n{import_output[-2000:]}")
+    return elapsed, import_output
+
+
+def parse_import_times(import_output: str) -> list[tuple[str, int, int, int]]:
+    """(module, self microseconds, cumulative microseconds, nesting depth) for every line of -X importtime output"""
+    result = []
+    for line in import_output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        result.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return result
+
+
+def report(elapsed: float, imports: list[tuple[str, int, int, int]], budget: float):
+    total = sum(self_us for _, self_us, _, _ in imports)
+    print(f"Time to '{READY_LINE}': {elapsed * 1000:.0f} ms (budget {budget * 1000:.0f} ms), of which imports: {total / 1000:.0f} ms")
+
+    by_package: dict[str, int] = defaultdict(int)
+    for name, self_us, _, _ in imports:
+        by_package[name.split(".")[0]] += self_us
+    print("\nSlowest packages (self time of all their modules):")
+    for package, us in sorted(by_package.items(), key=lambda item: -item[1])[:TOP_N]:
+        print(f"  {us / 1000:8.1f} ms  {package}")
+
+    print("\nSlowest top-level imports (cumulative):")
+    top_level = [(name, cumulative_us) for name, _, cumulative_us, depth in imports if depth == 0]
+    for name, us in sorted(top_level, key=lambda item: -item[1])[:TOP_N]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    budget = float(sys.argv[sys.argv.index("--budget") + 1]) if "--budget" in sys.argv else STARTUP_BUDGET
+    elapsed, import_output = measure_startup(["--mock"])
+    report(elapsed, parse_import_times(import_output), budget)
+    if elapsed > budget:
+        print(f"\nFAIL: startup took {elapsed:.2f} s, over the {budget:.2f} s budget")
+        sys.exit(1)
@@ -1,18 +1,31 @@
+from abc import ABC, abstractmethod
 from enum import Enum
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 from control.control import Control, MotorDirection
+from control.motion import ControllerConfig, MotionController
+from control.scheduler import PeriodicScheduler, SoftwarePWM
+from startup import ParallelInit
 from state_representation import BasketPosition, Location
+import tracing
 
 
 from dataclasses import dataclass
 
-from vision.vision import Vision
+from vision.constants import CHECKPOINT_FRACS
+from vision.estimator import PositionEstimate
 import time
 
+if TYPE_CHECKING:
+    from vision.vision import Vision
+
 TRANSLATION_CALIBRATION_RATIO = 1.0 # The amount of time the translation motor needs to be run relative to the raise/lower motor while translating
 
 CONTROL_PERIOD = 0.2 # The number of seconds in between reprocessing inputs and updating control signal
 
+FRAME_WAIT_TIMEOUT = 0.1 # The maximum number of seconds to block waiting for a new vision frame before rechecking for lost tracking
+TRACKING_LOST_TIMEOUT = 0.5 # The number of seconds without a tracked frame after which the motors are stopped
+VISION_INIT_TIMEOUT = 60.0 # The maximum number of seconds to wait for the first tracked frame (tracking may need to be started by pressing 's')
+
 @dataclass
 class RobotState:
     location: Location = Location.DESK
@@ -51,8 +64,16 @@ class RobotCommand:
     location: Optional[Location] = None
 
 
-class RobotBase:
+class RobotBase(ABC):
     state: RobotState    
+    @abstractmethod
+    def start(self):
+        """Initializes the robot, returning once it is ready to handle commands"""
+
+    @abstractmethod
+    def handle_command(self, command: RobotCommand):
+        """Executes a command, returning once it is done, and updates state accordingly"""
+
     def ask_update_item_list(self):
         new_list = input("Input new item list: ")
         if len(new_list) == 0:
@@ -65,15 +86,22 @@ class RobotBase:
 
 class MockRobot(RobotBase):
     """
-    A mock simulator of the assembly that instantly completes every command successfully
+    A mock simulator of the assembly that completes every command successfully, instantly or after command_duration seconds
     """
-    def __init__(self) -> None:
+    def __init__(self, command_duration: float = 0.0) -> None:
         self.state = RobotState()
+        self.command_duration = command_duration
 
     def start(self):
         pass
 
     def handle_command(self, command: RobotCommand):
+        with tracing.span("robot.handle_command", action=command.action.value, location=command.location.value if command.location else None):
+            self._handle_command(command)
+
+    def _handle_command(self, command: RobotCommand):
+        if self.command_duration > 0:
+            time.sleep(self.command_duration)
         if command.action == BasketAction.LOWER_BASKET:
             self.state.basket_position = BasketPosition.LOWERED
         if command.action == BasketAction.RAISE_BASKET:
@@ -87,17 +115,53 @@ class Robot(RobotBase):
     """
     Contains logic for both percieving the state of the physical assembly and controlling the robot's actuators
     """
-    def __init__(self) -> None:
+    def __init__(self, vision: Optional["Vision"] = None, control: Optional[Control] = None, time_scale: float = 1.0) -> None:
+        """
+        vision/control: the perception and actuation subsystems, default to the webcam and the Arduino
+        time_scale: how many times faster than real time the hardware behind vision/control runs (only a simulator can be faster), all timing is divided by it
+        """
         self.state = RobotState()
-        self.vision = Vision()
-        self.vision.start()
-        time.sleep(3)
-        self.control = Control()
-        self.stop_first_fn = self.control.set_raise_lower if TRANSLATION_CALIBRATION_RATIO >= 1.0 else self.control.set_translation # The function that will be called to reduce the speed of the motor that should be slower during translation
+        self.time_scale = time_scale
+        self.control_period = CONTROL_PERIOD / time_scale
+        self.frame_wait_timeout = FRAME_WAIT_TIMEOUT / time_scale
+        self.tracking_lost_timeout = TRACKING_LOST_TIMEOUT / time_scale
+        self.vision_init_timeout = VISION_INIT_TIMEOUT / time_scale
+        if vision is None:
+            from vision.vision import Vision # Imported here since OpenCV is slow to import and unused by MockRobot
+            vision = Vision()
+        self.vision = vision
+        self.control: Optional[Control] = control # The Arduino is connected to by start() if None
+        self.ready = False
         self.stop_first_frac = min(TRANSLATION_CALIBRATION_RATIO, 1 / TRANSLATION_CALIBRATION_RATIO) # The fraction of the control interval after which to stop the motor that should be slower
+        # Duty cycle multipliers that apply the calibration ratio by running the slower motor for only part of each period
+        self.translation_duty_scale = 1.0 if TRANSLATION_CALIBRATION_RATIO >= 1.0 else self.stop_first_frac
+        self.raise_lower_duty_scale = self.stop_first_frac if TRANSLATION_CALIBRATION_RATIO >= 1.0 else 1.0
+        self.scheduler = PeriodicScheduler(self.control_period)
+        self.pwm = SoftwarePWM(self.scheduler)
+        self.motion_controller = MotionController(ControllerConfig(control_period=CONTROL_PERIOD).time_scaled(time_scale))
+        self._last_seq = 0 # Sequence number of the last vision frame consumed
+        self._last_tracked_time = time.monotonic() # Time at which the basket was last seen by the vision system
+        self.last_frame_age = 0.0 # Seconds between capture and use of the frame behind the last info returned by wait_for_info
 
     def start(self):
-        pass
+        """Starts the vision system and connects to the board concurrently, returning once the first frame is tracked and the handshake is done"""
+        if self.ready:
+            return
+        init = ParallelInit()
+        init.start("vision", self._init_vision)
+        init.start("control", self._init_control)
+        init.wait()
+        print(f"Robot {init.report()}")
+        self.ready = True
+
+    def _init_vision(self):
+        self.vision.start()
+        if not self.vision.wait_until_tracking(self.vision_init_timeout):
+            raise TimeoutError(f"No frame tracked within {self.vision_init_timeout:.0f} s")
+
+    def _init_control(self):
+        if self.control is None:
+            self.control = Control() # Returns once the Firmata handshake with the board is done
 
     def map_location_to_checkpoint(self, location: Location) -> int:
         return {
@@ -106,40 +170,68 @@ class Robot(RobotBase):
             Location.CLOSET: 2
         }[location]
     
+    def wait_for_estimate(self) -> PositionEstimate:
+        """
+        Blocks until the vision system publishes a new tracked frame and returns the position estimate for it.
+        If tracking has been lost for longer than tracking_lost_timeout the motors are stopped until the basket is seen again.
+        """
+        motors_stopped = False
+        while True:
+            measurement = self.vision.wait_for_measurement(self._last_seq, timeout=self.frame_wait_timeout)
+            if measurement is not None:
+                self._last_seq = measurement.seq
+                # The frame was processed in the vision process, its span is recorded from the timestamps in the shared record
+                if tracing.enabled():
+                    tracing.record("vision.frame", measurement.capture_timestamp, measurement.timestamp, thread="vision process",
+                                   seq=measurement.seq, tracked=measurement.bbox is not None)
+                if measurement.bbox is not None:
+                    self._last_tracked_time = measurement.timestamp
+                    self.last_frame_age = measurement.age()
+                    return self.vision.update_estimate(measurement) #type: ignore
+            if not motors_stopped and time.monotonic() - self._last_tracked_time > self.tracking_lost_timeout:
+                print(f"Tracking lost for more than {self.tracking_lost_timeout * 1000:.0f} ms, stopping motors")
+                self.control.set_motors(translation=MotorDirection.STILL, raise_lower=MotorDirection.STILL)
+                motors_stopped = True
+
+    def wait_for_info(self, checkpoint_ref):
+        """Same as wait_for_estimate, but returns the coarse info (see Vision.get_info)"""
+        return self.vision.info_from_estimate(self.wait_for_estimate(), checkpoint_ref)
+
     def handle_command(self, command: RobotCommand):
-        # Start vision system if not already running
-        if not self.vision._process_started:
-            self.vision.start()
-            time.sleep(2)  # Give vision system time to initialize
-        
+        with tracing.span("robot.handle_command", action=command.action.value, location=command.location.value if command.location else None):
+            self._handle_command(command)
+
+    def _handle_command(self, command: RobotCommand):
+        self.start()
+
         print(f"Robot command: {str(command)}")
+        self._last_tracked_time = time.monotonic() # Don't count time spent idle between commands as lost tracking
+        self.scheduler.start()
 
         if command.action == BasketAction.LOWER_BASKET:
             # Keep lowering until vision system detects basket is lowered
             while True:
-                info = self.vision.get_info(0)  # Use checkpoint 0 as reference
-                if info is None:
-                    continue
-                _, raise_lower_state = info
-                if raise_lower_state == -1: # Basket is lowered
-                    self.state.basket_position = BasketPosition.LOWERED
-                    break
-                self.control.set_raise_lower(MotorDirection.COUNTERCLOCKWISE)
-                time.sleep(CONTROL_PERIOD)
+                with tracing.span("robot.control_cycle"):
+                    info = self.wait_for_info(0)  # Use checkpoint 0 as reference
+                    _, raise_lower_state = info
+                    if raise_lower_state == -1: # Basket is lowered
+                        self.state.basket_position = BasketPosition.LOWERED
+                        break
+                    self.control.set_raise_lower(MotorDirection.COUNTERCLOCKWISE)
+                    self.scheduler.wait_next()
             self.control.set_raise_lower(MotorDirection.STILL)
 
         elif command.action == BasketAction.RAISE_BASKET:
             # Keep raising until vision system detects basket is raised
             while True:
-                info = self.vision.get_info(self.map_location_to_checkpoint(self.state.location))
-                if info is None:
-                    continue
-                _, raise_lower_state = info
-                if raise_lower_state == +1: # Basket is raised
-                    self.state.basket_position = BasketPosition.RAISED
-                    break
-                self.control.set_raise_lower(MotorDirection.CLOCKWISE)
-                time.sleep(CONTROL_PERIOD)
+                with tracing.span("robot.control_cycle"):
+                    info = self.wait_for_info(self.map_location_to_checkpoint(self.state.location))
+                    _, raise_lower_state = info
+                    if raise_lower_state == +1: # Basket is raised
+                        self.state.basket_position = BasketPosition.RAISED
+                        break
+                    self.control.set_raise_lower(MotorDirection.CLOCKWISE)
+                    self.scheduler.wait_next()
             self.control.set_raise_lower(MotorDirection.STILL)
 
         elif command.action == BasketAction.MOVE_BASKET_TO_LOCATION:
@@ -149,34 +241,40 @@ class Robot(RobotBase):
             # First ensure basket is raised
             if self.state.basket_position != BasketPosition.RAISED:
                 self.handle_command(RobotCommand(BasketAction.RAISE_BASKET))
+                self.scheduler.start() # The raise reported its own timing
 
             target_checkpoint = self.map_location_to_checkpoint(command.location)
 
             # Move until we reach the target checkpoint
+            self.motion_controller.reset(CHECKPOINT_FRACS[target_checkpoint])
             while True:
-                info = self.vision.get_info(target_checkpoint)
-                if info is None:
-                    continue
-                print(f"Info: {info}")
-                checkpoint_rel, _ = info
-                
-                if checkpoint_rel == 0:  # At target
-                    self.state.location = command.location
-                    break
-                elif checkpoint_rel == 1:  # Need to move right
-                    self.control.set_translation(MotorDirection.CLOCKWISE)
-                    self.control.set_raise_lower(MotorDirection.CLOCKWISE)  # Keep basket raised
-                else:  # Need to move left
-                    self.control.set_translation(MotorDirection.COUNTERCLOCKWISE)
-                    self.control.set_raise_lower(MotorDirection.COUNTERCLOCKWISE)  # Keep basket raised
-                
-                time.sleep(CONTROL_PERIOD * self.stop_first_frac) # account for the calibration ratio
-                self.stop_first_fn(MotorDirection.STILL)
-                time.sleep(CONTROL_PERIOD * (1 - self.stop_first_frac))
+                with tracing.span("robot.control_cycle") as cycle:
+                    estimate = self.wait_for_estimate()
+                    motion_command = self.motion_controller.update(estimate, time.monotonic())
+                    if tracing.enabled(): # Per-cycle detail goes to the trace, not the console, and costs nothing while tracing is off
+                        cycle.set(x_frac=round(estimate.x_frac, 3), x_velocity=round(estimate.x_velocity, 3), direction=motion_command.direction,
+                                  duty=round(motion_command.duty, 2), frame_age_ms=round(self.last_frame_age * 1000, 1))
+
+                    if motion_command.arrived:  # At target
+                        self.state.location = command.location
+                        break
+
+                    direction = MotorDirection.CLOCKWISE if motion_command.direction == 1 else MotorDirection.COUNTERCLOCKWISE # CLOCKWISE moves right
+                    def apply(channels, direction=direction):
+                        # The raise/lower motor runs alongside translation to keep the basket raised
+                        self.control.set_motors(**{name: direction if on else MotorDirection.STILL for name, on in channels.items()})
+                    duties = {
+                        "translation": motion_command.duty * self.translation_duty_scale,
+                        "raise_lower": motion_command.duty * self.raise_lower_duty_scale,
+                    }
+                    self.pwm.run_cycle(duties, apply)
+            if self.motion_controller.oscillating:
+                print(f"Move oscillated: {self.motion_controller.reversals} direction reversals")
 
             # Stop motors
-            self.control.set_translation(MotorDirection.STILL)
-            self.control.set_raise_lower(MotorDirection.STILL)
+            self.control.set_motors(translation=MotorDirection.STILL, raise_lower=MotorDirection.STILL)
+
+        print(f"Control timing of {command.action.value}: {self.scheduler.report()}")
 
     def update_items_in_basket(self, items: list[str]):
         self.state.items_in_basket = items
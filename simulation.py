@@ -0,0 +1,126 @@
+import multiprocessing
+import threading
+import time
+from dataclasses import replace
+from typing import Optional
+
+from control.control import MotorDirection
+from control.plant import PlantConfig, SimulatedBasketPlant
+from robot import BasketAction, Robot, RobotCommand
+from state_representation import BasketPosition, Location
+from vision.constants import LOWER_DISTANCE, MOTION_LINE
+from vision.sources import PacedSource, SyntheticSource
+from vision.vision import Vision
+
+PHYSICS_STEP = 0.001 # Simulated seconds per physics step
+PHYSICS_WAKE_PERIOD = 0.002 # Wall-clock seconds between physics thread updates
+CAMERA_FPS = 30.0 # Simulated camera frame rate
+
+
+class SimulatedWorld:
+    """
+    Runs the basket plant in real time (scaled by time_scale) on a background thread of the main process,
+    and mirrors the basket position into shared memory so the vision process can render frames of it.
+    """
+    def __init__(self, time_scale: float = 1.0, plant_config: Optional[PlantConfig] = None, x_frac: float = 0.0, y_frac: float = 0.0) -> None:
+        self.time_scale = time_scale
+        plant_config = plant_config if plant_config is not None else PlantConfig()
+        self.plant = SimulatedBasketPlant(replace(plant_config, simulate_camera=False), x_frac=x_frac, y_frac=y_frac)
+        self.position = multiprocessing.RawArray('d', [x_frac, y_frac]) # Read by the vision process, torn reads only cost a pixel
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        self._thread.join(timeout=1.0)
+
+    def _run(self):
+        last_time = time.monotonic()
+        pending = 0.0 # Simulated time not yet stepped through
+        while not self._stopping:
+            time.sleep(PHYSICS_WAKE_PERIOD)
+            now = time.monotonic()
+            pending += (now - last_time) * self.time_scale
+            last_time = now
+            while pending >= PHYSICS_STEP:
+                self.plant.step(PHYSICS_STEP)
+                pending -= PHYSICS_STEP
+            self.position[0] = self.plant.x_frac
+            self.position[1] = self.plant.y_frac
+
+
+class SimulatedControl:
+    """Drop-in replacement for control.Control that drives the simulated plant instead of the Arduino"""
+    def __init__(self, world: SimulatedWorld) -> None:
+        self.world = world
+        self.commands_sent = 0
+
+    @staticmethod
+    def _to_input(motor_direction: MotorDirection) -> int:
+        return {MotorDirection.CLOCKWISE: 1, MotorDirection.COUNTERCLOCKWISE: -1, MotorDirection.STILL: 0}[motor_direction]
+
+    def set_motors(self, translation: Optional[MotorDirection] = None, raise_lower: Optional[MotorDirection] = None):
+        self.commands_sent += 1
+        if translation is not None:
+            self.world.plant.translation_input = self._to_input(translation)
+        if raise_lower is not None:
+            self.world.plant.raise_lower_input = self._to_input(raise_lower)
+
+    def set_translation(self, motor_direction: MotorDirection):
+        self.set_motors(translation=motor_direction)
+
+    def set_raise_lower(self, motor_direction: MotorDirection):
+        self.set_motors(raise_lower=motor_direction)
+
+
+class SimulatedCameraSource(SyntheticSource):
+    """Renders the basket wherever the simulated world currently has it. Wrap in a PacedSource to get a camera-like frame rate."""
+    def __init__(self, position) -> None:
+        super().__init__(num_frames=0)
+        self.position = position
+
+    def read(self):
+        x_frac, y_frac = self.position[0], self.position[1]
+        x = MOTION_LINE[0][0] + x_frac * (MOTION_LINE[1][0] - MOTION_LINE[0][0])
+        y = MOTION_LINE[0][1] + x_frac * (MOTION_LINE[1][1] - MOTION_LINE[0][1]) + y_frac * LOWER_DISTANCE
+        return True, self.render(int(round(x)), int(round(y)))
+
+
+class SimulatedRobot(Robot):
+    """
+    Runs the real Robot control loop and vision pipeline against a simulated basket instead of the Arduino and webcam.
+    The basket starts raised at the desk, where Vision starts tracking from PREDEFINED_RECT.
+    """
+    def __init__(self, time_scale: float = 1.0, plant_config: Optional[PlantConfig] = None, show_window: bool = False) -> None:
+        self.world = SimulatedWorld(time_scale=time_scale, plant_config=plant_config)
+        self.world.start()
+        source = PacedSource(SimulatedCameraSource(self.world.position), fps=CAMERA_FPS * time_scale)
+        vision = Vision(source=source, headless=not show_window, auto_start=True)
+        super().__init__(vision=vision, control=SimulatedControl(self.world), time_scale=time_scale) #type: ignore
+        self.state.basket_position = BasketPosition.RAISED
+
+    def stop(self):
+        self.vision.stop()
+        self.world.stop()
+
+
+if __name__ == "__main__":
+    robot = SimulatedRobot(time_scale=4.0)
+    commands = [
+        RobotCommand(BasketAction.MOVE_BASKET_TO_LOCATION, location=Location.CLOSET),
+        RobotCommand(BasketAction.LOWER_BASKET),
+        RobotCommand(BasketAction.RAISE_BASKET),
+        RobotCommand(BasketAction.MOVE_BASKET_TO_LOCATION, location=Location.BED),
+        RobotCommand(BasketAction.MOVE_BASKET_TO_LOCATION, location=Location.DESK),
+        RobotCommand(BasketAction.LOWER_BASKET),
+    ]
+    for command in commands:
+        start = time.monotonic()
+        robot.handle_command(command)
+        elapsed = time.monotonic() - start
+        print(f"{command.action.value} {command.location.value if command.location else ''}: {elapsed:.2f} s wall, {elapsed * robot.time_scale:.2f} s simulated")
+        print(robot.state)
+    robot.stop()
@@ -0,0 +1,81 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Optional
+
+from agent import Agent, AgentCommand, HistoryElement, UserMessageStream
+from metrics import Histogram
+
+SAVED_EDGES_MS = [100, 250, 500, 1000, 2000, 5000, 10000]
+
+
+@dataclass
+class SpeculationStats:
+    requests: int = 0 # Agent calls made ahead of time
+    hits: int = 0 # Their response was used
+    misses: int = 0 # The robot didn't end up in the predicted state, or the history changed otherwise
+    failures: int = 0 # The call failed, the agent was queried again
+    unpredictable: int = 0 # The robot commands' outcome couldn't be predicted, so no call was made ahead of time
+    saved: Histogram = field(default_factory=lambda: Histogram(SAVED_EDGES_MS)) # Of the agent's latency, per hit
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def hit_rate(self) -> float:
+        resolved = self.hits + self.misses + self.failures
+        return self.hits / resolved if resolved else 0.0
+
+    def record(self, outcome: str, saved: float = 0.0):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            if outcome == "hits":
+                self.saved.add(saved)
+
+    def __str__(self) -> str:
+        return (f"{self.requests} made ahead of time, {self.hits} hits, {self.misses} misses, {self.failures} failed "
+                f"(hit rate {self.hit_rate:.0%}), {self.unpredictable} unpredictable, {self.saved.total:.2f} s saved\n"
+                f"  saved per hit: {self.saved}")
+
+
+class SpeculativeRequest:
+    """
+    An agent call made ahead of time, while the robot is still executing commands, with the history the agent is expected to have
+    once they are done (their predicted robot state appended). Its user messages are collected rather than spoken,
+    since they may never be used. take() returns the commands if the agent's history turned out as expected.
+    """
+    def __init__(self, agent: Agent, expected_history: list[HistoryElement], executor: Executor, stats: SpeculationStats) -> None:
+        self.agent = agent
+        self.expected_history = expected_history
+        self.stats = stats
+        self.sentences: list[str] = []
+        self.message_stream = UserMessageStream(self.sentences.append)
+        self.started = time.monotonic()
+        self.ready: Optional[float] = None
+        stats.record("requests")
+        self.future = executor.submit(contextvars.copy_context().run, self._request) # In the caller's context, so it's traced as part of the turn
+
+    def _request(self) -> list[AgentCommand]:
+        try:
+            return self.agent.request_commands(self.message_stream, history=self.expected_history)
+        finally:
+            self.ready = time.monotonic()
+
+    def take(self) -> Optional[list[AgentCommand]]:
+        """
+        The speculative commands, waiting for them if need be, if the agent's history is the expected one. None if it isn't
+        (the call is then abandoned and left to finish in the background) or if the call failed.
+        Call it when the agent would otherwise be queried, the time saved is measured from then.
+        """
+        needed = time.monotonic()
+        if self.agent.state.history != self.expected_history:
+            self.stats.record("misses")
+            return None
+        try:
+            commands = self.future.result()
+        except Exception as e:
+            print(f"Speculative agent call failed: {e}")
+            self.stats.record("failures")
+            return None
+        self.stats.record("hits", saved=min(self.ready, needed) - self.started) #type: ignore
+        return commands
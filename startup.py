@@ -0,0 +1,90 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+
+class InitError(Exception):
+    pass
+
+
+@dataclass
+class SubsystemStatus:
+    name: str
+    required: bool # Whether startup has to wait for this subsystem to be ready
+    started: float
+    finished: Optional[float] = None
+    error: Optional[Exception] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.finished is not None and self.error is None
+
+    def __str__(self) -> str:
+        label = f"{self.name}{'' if self.required else ' (optional)'}"
+        if self.finished is None:
+            return f"{label}: still initializing after {time.monotonic() - self.started:.2f} s"
+        if self.error is not None:
+            return f"{label}: failed after {self.finished - self.started:.2f} s: {self.error}"
+        return f"{label}: ready in {self.finished - self.started:.2f} s"
+
+
+class ParallelInit:
+    """
+    Initializes subsystems concurrently. Each init function blocks until its subsystem is ready (e.g. the first frame is tracked,
+    the board handshake is done) and raises if it can't be. wait() returns once every required subsystem is ready,
+    while optional ones keep initializing in the background.
+    """
+    def __init__(self) -> None:
+        self.start_time = time.monotonic()
+        self.ready_time: Optional[float] = None # When wait() returned
+        self.subsystems: dict[str, SubsystemStatus] = {}
+        self._finished = threading.Condition()
+
+    def start(self, name: str, init_fn: Callable[[], None], required: bool = True):
+        """Runs init_fn on a background thread"""
+        status = self._add(name, required)
+        threading.Thread(target=self._run, args=(status, init_fn), name=f"init {name}", daemon=True).start()
+
+    def run(self, name: str, init_fn: Callable[[], None], required: bool = True):
+        """Runs init_fn on the calling thread, for subsystems that must be used from the thread that created them"""
+        self._run(self._add(name, required), init_fn)
+
+    def _add(self, name: str, required: bool) -> SubsystemStatus:
+        status = SubsystemStatus(name, required, started=time.monotonic())
+        with self._finished:
+            self.subsystems[name] = status
+        return status
+
+    def _run(self, status: SubsystemStatus, init_fn: Callable[[], None]):
+        error = None
+        try:
+            init_fn()
+        except Exception as e:
+            error = e
+        with self._finished:
+            status.error = error
+            status.finished = time.monotonic()
+            self._finished.notify_all()
+
+    def wait(self, timeout: Optional[float] = None):
+        """Blocks until every required subsystem is ready. Raises InitError as soon as one fails, or if they aren't all ready within timeout seconds."""
+        def required_done():
+            required = [status for status in self.subsystems.values() if status.required]
+            return any(status.error is not None for status in required) or all(status.finished is not None for status in required)
+
+        with self._finished:
+            done = self._finished.wait_for(required_done, timeout)
+            failed = [status for status in self.subsystems.values() if status.required and status.error is not None]
+        if failed:
+            raise InitError(f"{failed[0].name} failed to initialize: {failed[0].error}") from failed[0].error
+        if not done:
+            waiting = [status.name for status in self.subsystems.values() if status.required and status.finished is None]
+            raise InitError(f"Not ready after {timeout:.1f} s: {', '.join(waiting)}")
+        self.ready_time = time.monotonic()
+
+    def report(self) -> str:
+        lines = [f"  {status}" for status in self.subsystems.values()]
+        if self.ready_time is not None:
+            lines.insert(0, f"Ready in {self.ready_time - self.start_time:.2f} s")
+        return "\n".join(lines)
@@ -0,0 +1,182 @@
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Union
+
+JSON_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+") # Sentence-ending punctuation followed by whitespace, so decimals like 0.5 don't split
+
+
+@dataclass
+class StringChunk:
+    key: Optional[str] # Key of the object field the string is the value of, None for strings inside arrays
+    object_index: int # Index into PartialJSONParser.objects of the object the field belongs to, -1 for strings inside arrays
+    text: str # The part of the string value that arrived since the last chunk
+    done: bool # Whether the string value is now complete
+
+
+@dataclass
+class _Container:
+    value: Union[dict, list]
+    object_index: Optional[int] # Index into PartialJSONParser.objects, None for arrays
+    expecting_key: bool = False
+    key: Optional[str] = None # Most recent key read in this object
+
+
+class PartialJSONParser:
+    """
+    Incremental parser for a JSON document that arrives in pieces (e.g. streamed structured LLM output).
+    String values are reported to on_string as they stream in, without waiting for the document or even the string to be complete.
+    objects holds every object opened so far, in the order they were opened, with the values completed so far: strings, numbers, booleans
+    and nulls once they are complete, nested objects and arrays as soon as they open (filled in as they stream in).
+    on_object, if given, is called with an object's index into objects once the object is closed.
+    value is the whole document once it is complete.
+    Assumes the document is valid JSON, it doesn't validate it.
+    """
+    def __init__(self, on_string: Callable[[StringChunk], None], on_object: Optional[Callable[[int], None]] = None) -> None:
+        self.on_string = on_string
+        self.on_object = on_object
+        self.objects: list[dict[str, Any]] = []
+        self.value: Any = None
+        self._stack: list[_Container] = [] # The open objects and arrays, innermost last
+        self._in_string = False
+        self._string_is_key = False
+        self._escape = False
+        self._unicode: Optional[str] = None # Hex digits of a \u escape being read
+        self._high_surrogate: Optional[int] = None # First half of a \u escaped surrogate pair
+        self._string = "" # The string being read so far
+        self._reported = 0 # Length of _string already reported
+        self._scalar = "" # Number/true/false/null being read
+
+    def feed(self, text: str):
+        for ch in text:
+            if self._in_string:
+                self._read_string_char(ch)
+            elif ch == '"':
+                self._finish_scalar()
+                self._in_string = True
+                self._string_is_key = bool(self._stack) and self._stack[-1].expecting_key
+                self._string = ""
+                self._reported = 0
+            elif ch == "{":
+                value: dict[str, Any] = {}
+                self._set_value(value)
+                self.objects.append(value)
+                self._stack.append(_Container(value, len(self.objects) - 1, expecting_key=True))
+            elif ch == "[":
+                value_list: list = []
+                self._set_value(value_list)
+                self._stack.append(_Container(value_list, None))
+            elif ch in "}]":
+                self._finish_scalar()
+                if self._stack:
+                    container = self._stack.pop()
+                    if container.object_index is not None and self.on_object is not None:
+                        self.on_object(container.object_index)
+            elif ch == ":":
+                if self._stack:
+                    self._stack[-1].expecting_key = False
+            elif ch == ",":
+                self._finish_scalar()
+                if self._stack and self._stack[-1].object_index is not None:
+                    self._stack[-1].expecting_key = True
+            elif ch.isspace():
+                self._finish_scalar()
+            else:
+                self._scalar += ch
+        if self._in_string and not self._string_is_key and len(self._string) > self._reported:
+            self._report(done=False)
+
+    def _read_string_char(self, ch: str):
+        if self._unicode is not None:
+            self._unicode += ch
+            if len(self._unicode) == 4:
+                code = int(self._unicode, 16)
+                self._unicode = None
+                if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+                    self._string += chr(0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00))
+                    self._high_surrogate = None
+                    return
+                self._flush_high_surrogate()
+                if 0xD800 <= code < 0xDC00:
+                    self._high_surrogate = code
+                else:
+                    self._string += chr(code)
+            return
+        if self._escape:
+            self._escape = False
+            if ch == "u":
+                self._unicode = ""
+                return
+            self._flush_high_surrogate()
+            self._string += JSON_ESCAPES.get(ch, ch)
+            return
+        if ch == "\\":
+            self._escape = True
+            return
+        self._flush_high_surrogate()
+        if ch == '"':
+            self._in_string = False
+            if self._string_is_key:
+                self._stack[-1].key = self._string
+            else:
+                self._report(done=True)
+                self._set_value(self._string)
+        else:
+            self._string += ch
+
+    def _flush_high_surrogate(self):
+        """A high surrogate that isn't followed by a low one is kept as is, as json.loads does"""
+        if self._high_surrogate is not None:
+            self._string += chr(self._high_surrogate)
+            self._high_surrogate = None
+
+    def _report(self, done: bool):
+        top = self._stack[-1] if self._stack else None
+        in_object = top is not None and top.object_index is not None
+        self.on_string(StringChunk(
+            key=top.key if in_object else None, #type: ignore
+            object_index=top.object_index if in_object else -1, #type: ignore
+            text=self._string[self._reported:],
+            done=done,
+        ))
+        self._reported = len(self._string)
+
+    def _finish_scalar(self):
+        if not self._scalar:
+            return
+        try:
+            value = json.loads(self._scalar)
+        except ValueError:
+            value = self._scalar
+        self._scalar = ""
+        self._set_value(value)
+
+    def _set_value(self, value):
+        """Adds a value to the innermost open object or array, or makes it the document's value"""
+        if not self._stack:
+            self.value = value
+            return
+        container = self._stack[-1]
+        if container.object_index is None:
+            container.value.append(value) #type: ignore
+        elif container.key is not None:
+            container.value[container.key] = value #type: ignore
+
+
+class SentenceSplitter:
+    """Buffers streamed text and hands back each sentence once it is complete"""
+    def __init__(self) -> None:
+        self._buffer = ""
+
+    def feed(self, text: str) -> list[str]:
+        self._buffer += text
+        parts = SENTENCE_END.split(self._buffer)
+        self._buffer = parts[-1]
+        return [part.strip() for part in parts[:-1] if part.strip()]
+
+    def flush(self) -> list[str]:
+        """The remaining text, once the stream is complete"""
+        remainder = self._buffer.strip()
+        self._buffer = ""
+        return [remainder] if remainder else []
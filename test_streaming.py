@@ -0,0 +1,117 @@
+import json
+
+import pytest
+
+from streaming import PartialJSONParser, SentenceSplitter, StringChunk
+
+DOCUMENT = json.dumps({
+    "commands": [
+        {"action": "SPECIFY_PLAN", "plan": "Go to the closet, then \"lower\" it", "location": None},
+        {"action": "GO_TO_STATE", "location": "CLOSET", "basket_position": "LOWERED", "speed": 1.5, "retries": 2, "confirm": True},
+        {"action": "REQUEST_USER_ACTION", "user_message": "Café \U0001F600 ready.\nTab\there, slash / and backslash \\."},
+    ],
+    "nested": {"a": [1, -2.5e3, [False, None], {"b": "x"}], "c": []},
+})
+
+
+def parse(document: str, chunk_size: int) -> tuple[PartialJSONParser, list[StringChunk], list[int]]:
+    chunks: list[StringChunk] = []
+    closed: list[int] = []
+    parser = PartialJSONParser(chunks.append, closed.append)
+    for i in range(0, len(document), chunk_size):
+        parser.feed(document[i:i + chunk_size])
+    return parser, chunks, closed
+
+
+def strings(chunks: list[StringChunk]) -> list[tuple]:
+    """The reported string values, joined from their chunks"""
+    values, current = [], ""
+    for chunk in chunks:
+        current += chunk.text
+        if chunk.done:
+            values.append((chunk.key, chunk.object_index, current))
+            current = ""
+    return values
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, len(DOCUMENT)])
+def test_values_match_json_loads_at_any_chunk_size(chunk_size):
+    parser, _, _ = parse(DOCUMENT, chunk_size)
+    expected = json.loads(DOCUMENT)
+    assert parser.value == expected
+    assert parser.objects[0] == expected
+    assert parser.objects[1:4] == expected["commands"]
+    assert parser.objects[4] == expected["nested"]
+    assert parser.objects[5] == {"b": "x"}
+
+
+def test_numbers_are_converted_and_arrays_kept():
+    parser, _, _ = parse('{"a": 1.5, "b": true, "c": [1, {"d": null}], "e": "x"}', 1)
+    assert parser.objects == [{"a": 1.5, "b": True, "c": [1, {"d": None}], "e": "x"}, {"d": None}]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 5, len(DOCUMENT)])
+def test_string_chunks_join_to_the_values(chunk_size):
+    _, chunks, _ = parse(DOCUMENT, chunk_size)
+    assert strings(chunks) == strings(parse(DOCUMENT, len(DOCUMENT))[1])
+    assert ("user_message", 3, "Café \U0001F600 ready.\nTab\there, slash / and backslash \\.") in strings(chunks)
+    assert (None, -1, "x") not in strings(chunks) # "x" is a field of an object inside an array, not an array element
+    assert ("b", 5, "x") in strings(chunks)
+
+
+def test_strings_are_reported_before_they_are_complete():
+    chunks: list[StringChunk] = []
+    parser = PartialJSONParser(chunks.append)
+    parser.feed('{"user_message": "Hello th')
+    assert chunks == [StringChunk("user_message", 0, "Hello th", False)]
+    parser.feed('ere"}')
+    assert chunks[-1] == StringChunk("user_message", 0, "ere", True)
+
+
+def test_keys_are_not_reported_and_array_strings_have_no_key():
+    _, chunks, _ = parse('{"key": ["a", "b"]}', 1)
+    assert strings(chunks) == [(None, -1, "a"), (None, -1, "b")]
+
+
+@pytest.mark.parametrize("escaped, expected", [
+    (r'\"', '"'), (r'\\', '\\'), (r'\/', '/'), (r'\b', '\b'), (r'\f', '\f'), (r'\n', '\n'), (r'\r', '\r'), (r'\t', '\t'),
+    (r'\u00e9', 'é'), (r'\u20AC', '€'),
+])
+def test_escapes_split_at_every_position(escaped, expected):
+    document = '{"s": "<' + escaped + '>"}'
+    for split in range(1, len(document)):
+        chunks: list[StringChunk] = []
+        parser = PartialJSONParser(chunks.append)
+        parser.feed(document[:split])
+        parser.feed(document[split:])
+        assert parser.objects[0] == {"s": f"<{expected}>"}
+        assert "".join(chunk.text for chunk in chunks) == f"<{expected}>"
+
+
+def test_surrogate_pairs_split_at_every_position():
+    document = r'{"s": "a\ud83d\ude00b"}'
+    for split in range(1, len(document)):
+        chunks: list[StringChunk] = []
+        parser = PartialJSONParser(chunks.append)
+        parser.feed(document[:split])
+        parser.feed(document[split:])
+        assert parser.objects[0] == {"s": "a\U0001F600b"}
+        assert "".join(chunk.text for chunk in chunks) == "a\U0001F600b" # Never half a pair
+
+
+@pytest.mark.parametrize("document", [r'{"s": "\ud83dx"}', r'{"s": "\ud83d"}', r'{"s": "\ud83d\n"}', r'{"s": "\ud83d\u00e9"}', r'{"s": "\ude00"}'])
+def test_lone_surrogates_are_kept_like_json_loads(document):
+    parser, _, _ = parse(document, 1)
+    assert parser.objects[0] == json.loads(document)
+
+
+def test_on_object_is_called_when_each_object_closes():
+    _, _, closed = parse(DOCUMENT, 4)
+    assert closed == [1, 2, 3, 5, 4, 0]
+
+
+def test_sentence_splitter():
+    splitter = SentenceSplitter()
+    assert splitter.feed("It costs 0.5 dollars. Th") == ["It costs 0.5 dollars."]
+    assert splitter.feed("anks! Bye") == ["Thanks!"]
+    assert splitter.flush() == ["Bye"]
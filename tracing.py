@@ -0,0 +1,191 @@
+"""
+Lightweight tracing of where a turn spends its time: spans around listening, agent calls, robot commands (with a child span per control cycle),
+vision frames (recorded after the fact from the vision process's timestamps, for each frame the control loop uses) and speech.
+Spans nest by context (a span started inside another one on the same thread or asyncio task is its child) and are kept in a bounded ring buffer, with a latency histogram per span name. Export them with Tracer.export_jsonl
+or Tracer.export_chrome (open in chrome://tracing or https://ui.perfetto.dev).
+Tracing is off until enable() is called. While it is off, span() returns a shared no-op context manager and nothing is recorded,
+so an instrumented block costs a function call and an empty with statement (a few hundred ns). Arguments are still evaluated though:
+guard the ones that take work to build, in code that runs every control cycle or frame, with enabled().
+"""
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from metrics import Histogram
+
+DEFAULT_MAX_SPANS = 100000 # Older spans are dropped beyond this, so tracing can be left on
+LATENCY_EDGES_MS = [1, 5, 10, 50, 100, 250, 500, 1000, 2000, 5000, 10000]
+
+
+@dataclass
+class Span:
+    name: str
+    start: float # time.monotonic()
+    span_id: int
+    parent_id: Optional[int]
+    thread: str # Name of the thread it ran on, or of the process for spans recorded after the fact
+    end: float = 0.0
+    args: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "start": self.start, "duration": self.duration, "span_id": self.span_id, "parent_id": self.parent_id,
+                "thread": self.thread, "args": self.args}
+
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+class ActiveSpan:
+    """Context manager timing a span. set() adds arguments to it, e.g. an outcome only known at the end."""
+    __slots__ = ("tracer", "span", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, args: dict) -> None:
+        self.tracer = tracer
+        parent = _current.get()
+        self.span = Span(name, 0.0, tracer.next_id(), parent.span_id if parent is not None else None, threading.current_thread().name, args=args)
+
+    def set(self, **args):
+        self.span.args.update(args)
+
+    def __enter__(self) -> "ActiveSpan":
+        self._token = _current.set(self.span)
+        self.span.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.span.end = time.monotonic()
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.span.args["error"] = exc_type.__name__
+        self.tracer.add(self.span)
+        return False
+
+
+class NullSpan:
+    """What span() returns while tracing is off"""
+    __slots__ = ()
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self) -> "NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Tracer:
+    def __init__(self, max_spans: int = DEFAULT_MAX_SPANS, edges_ms: list[float] = LATENCY_EDGES_MS) -> None:
+        self.spans: deque[Span] = deque(maxlen=max_spans)
+        self.histograms: dict[str, Histogram] = {} # Latency by span name, of every span, including those dropped from the buffer
+        self.dropped = 0 # Spans pushed out of the buffer
+        self.edges_ms = edges_ms
+        self.start_time = time.monotonic()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    def span(self, name: str, args: dict) -> ActiveSpan:
+        return ActiveSpan(self, name, args)
+
+    def record(self, name: str, start: float, end: float, thread: Optional[str] = None, args: Optional[dict] = None):
+        """Adds a span that has already ended, e.g. one timed in another process from time.monotonic() timestamps (the clock is system-wide)"""
+        parent = _current.get()
+        span = Span(name, start, self.next_id(), parent.span_id if parent is not None else None,
+                    thread if thread is not None else threading.current_thread().name, end=end, args=args or {})
+        self.add(span)
+
+    def add(self, span: Span):
+        with self._lock:
+            if len(self.spans) == self.spans.maxlen:
+                self.dropped += 1
+            self.spans.append(span)
+            histogram = self.histograms.get(span.name)
+            if histogram is None:
+                histogram = self.histograms[span.name] = Histogram(self.edges_ms)
+            histogram.add(span.duration)
+
+    def snapshot(self) -> list[Span]:
+        with self._lock:
+            return sorted(self.spans, key=lambda span: span.start)
+
+    def export_jsonl(self, path: str):
+        """One JSON object per span, ordered by start time"""
+        with open(path, "w") as f:
+            for span in self.snapshot():
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+    def export_chrome(self, path: str):
+        """Chrome trace event format: a complete event per span, one track per thread"""
+        pid = os.getpid()
+        tids: dict[str, int] = {}
+        events = []
+        for span in self.snapshot():
+            tid = tids.setdefault(span.thread, len(tids) + 1)
+            events.append({"name": span.name, "ph": "X", "pid": pid, "tid": tid, "ts": (span.start - self.start_time) * 1e6,
+                           "dur": span.duration * 1e6, "args": span.args})
+        events += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread}} for thread, tid in tids.items()]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+
+    def report(self) -> str:
+        with self._lock:
+            lines = [f"{name}: {histogram.n} spans, total {histogram.total:.2f} s, {histogram}" for name, histogram in sorted(self.histograms.items())]
+            if self.dropped:
+                lines.append(f"({self.dropped} older spans dropped from the buffer)")
+        return "\n".join(lines) if lines else "no spans"
+
+
+_tracer: Optional[Tracer] = None
+
+
+def enable(max_spans: int = DEFAULT_MAX_SPANS) -> Tracer:
+    """Starts recording spans, returning the tracer they are recorded in"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(max_spans)
+    return _tracer
+
+
+def disable():
+    global _tracer
+    _tracer = None
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def span(name: str, **args):
+    """Context manager timing the code it wraps as a span, the shared NULL_SPAN while tracing is off"""
+    tracer = _tracer
+    if tracer is None:
+        return NULL_SPAN
+    return tracer.span(name, args)
+
+
+def record(name: str, start: float, end: float, thread: Optional[str] = None, **args):
+    """Adds a span timed elsewhere (see Tracer.record), if tracing is on"""
+    tracer = _tracer
+    if tracer is not None:
+        tracer.record(name, start, end, thread, args)
@@ -0,0 +1,84 @@
+"""
+Microbenchmark comparing bbox reads through the old multiprocessing.Manager list against the shared-memory SharedBBox channel.
+A writer process publishes at camera rate while the main process reads as fast as it can.
+Run from the repository root: python -m vision.bench_bbox
+"""
+import multiprocessing
+import time
+
+from vision.shared_bbox import SharedBBox
+
+WRITE_PERIOD = 1 / 30 # Simulated camera frame rate
+BENCH_DURATION = 3.0 # Seconds of reading per channel
+
+
+def _manager_writer(shared_list, stop_event):
+    i = 0
+    while not stop_event.is_set():
+        shared_list[0] = [i % 500, 200, 50, 50]
+        i += 1
+        time.sleep(WRITE_PERIOD)
+
+
+def _shared_writer(shared_bbox: SharedBBox, stop_event):
+    i = 0
+    while not stop_event.is_set():
+        shared_bbox.publish((i % 500, 200, 50, 50))
+        i += 1
+        time.sleep(WRITE_PERIOD)
+
+
+def _measure(read_fn):
+    latencies = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < BENCH_DURATION:
+        t0 = time.perf_counter()
+        read_fn()
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "reads_per_sec": len(latencies) / elapsed,
+        "p50_us": latencies[len(latencies) // 2] * 1e6,
+        "p99_us": latencies[int(len(latencies) * 0.99)] * 1e6,
+        "max_us": latencies[-1] * 1e6,
+    }
+
+
+def _run_with_writer(writer, channel, read_fn):
+    stop_event = multiprocessing.Event()
+    process = multiprocessing.Process(target=writer, args=(channel, stop_event), daemon=True)
+    process.start()
+    time.sleep(0.2) # Let the writer publish a first value
+    result = _measure(read_fn)
+    stop_event.set()
+    process.join()
+    return result
+
+
+def bench_manager():
+    manager = multiprocessing.Manager()
+    shared_list = manager.list([None])
+    def read():
+        curr_bbox = shared_list[0]
+        return None if curr_bbox is None else tuple(curr_bbox)
+    result = _run_with_writer(_manager_writer, shared_list, read)
+    manager.shutdown()
+    return result
+
+
+def bench_shared_memory():
+    shared_bbox = SharedBBox()
+    return _run_with_writer(_shared_writer, shared_bbox, shared_bbox.get_bbox)
+
+
+def print_result(name, result):
+    print(f"{name:>14}: {result['reads_per_sec']:>12,.0f} reads/s | p50 {result['p50_us']:8.2f} us | p99 {result['p99_us']:8.2f} us | max {result['max_us']:9.2f} us")
+
+
+if __name__ == "__main__":
+    manager_result = bench_manager()
+    shared_result = bench_shared_memory()
+    print_result("Manager list", manager_result)
+    print_result("SharedBBox", shared_result)
+    print(f"Speedup (reads/s): {shared_result['reads_per_sec'] / manager_result['reads_per_sec']:.1f}x")
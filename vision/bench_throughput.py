@@ -0,0 +1,27 @@
+"""
+Measures tracking pipeline throughput (frames/s and per-frame latency) without a camera or display.
+Run from the repository root:
+    python -m vision.bench_throughput                 # synthetic frames
+    python -m vision.bench_throughput clip.mp4        # recorded video file
+    python -m vision.bench_throughput frames_dir/     # directory of frames
+"""
+import os
+import sys
+
+from vision.shared_bbox import SharedBBox
+from vision.sources import FrameDirectorySource, SyntheticSource, VideoFileSource
+from vision.vision import run_tracking
+
+
+def make_source(path=None):
+    if path is None:
+        return SyntheticSource(num_frames=600)
+    if os.path.isdir(path):
+        return FrameDirectorySource(path)
+    return VideoFileSource(path)
+
+
+if __name__ == "__main__":
+    source = make_source(sys.argv[1] if len(sys.argv) > 1 else None)
+    stats = run_tracking(SharedBBox(), source, headless=True, auto_start=True)
+    print(stats)
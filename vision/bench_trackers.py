@@ -0,0 +1,99 @@
+"""
+Compares tracker backends (and corridor cropping/downscaling) on the same clip, reporting frames/s and position error.
+Frames are decoded up front so only tracking time is measured.
+Run from the repository root:
+    python -m vision.bench_trackers                              # synthetic clip with exact ground truth
+    python -m vision.bench_trackers clip.mp4 [ground_truth.csv]  # recorded clip or frame directory
+The ground truth CSV has one "x,y,w,h" row per frame. Without it, full-frame CSRT is used as the reference.
+The errors are over the frames the tracker still tracked, so they are only reported (N/A otherwise) if it tracked at least MIN_TRACKED_FRACTION of them.
+"""
+import csv
+import math
+import sys
+import time
+
+import cv2
+
+from vision.bench_throughput import make_source
+from vision.constants import MOTION_LINE, PREDEFINED_RECT
+from vision.sources import SyntheticSource
+from vision.trackers import TRACKER_BACKENDS, TrackerConfig, create_tracker
+
+CONFIGS = [TrackerConfig(backend) for backend in TRACKER_BACKENDS] + \
+    [TrackerConfig(backend, corridor=True) for backend in TRACKER_BACKENDS] + \
+    [TrackerConfig(backend, corridor=True, scale=0.5) for backend in TRACKER_BACKENDS]
+
+MOTION_LENGTH = math.dist(MOTION_LINE[0], MOTION_LINE[1])
+MIN_TRACKED_FRACTION = 0.9 # Of the frames with a reference position, below which a tracker's errors say nothing about its accuracy
+
+
+def load_frames(source):
+    if not source.open():
+        raise RuntimeError("Cannot open frame source")
+    frames = []
+    while True:
+        ret, frame = source.read()
+        if not ret:
+            break
+        frames.append(frame)
+    source.release()
+    return frames
+
+
+def load_ground_truth(path):
+    with open(path) as f:
+        return [tuple(int(v) for v in row) for row in csv.reader(f) if row]
+
+
+def run_tracker(config, frames):
+    """Returns (per-frame bboxes with None for lost frames, seconds spent in update)"""
+    tracker = create_tracker(config)
+    tracker.init(frames[0], PREDEFINED_RECT)
+    bboxes = [PREDEFINED_RECT]
+    update_time = 0.0
+    for frame in frames[1:]:
+        start = time.perf_counter()
+        success, bbox = tracker.update(frame)
+        update_time += time.perf_counter() - start
+        bboxes.append(bbox if success else None)
+    return bboxes, update_time
+
+
+def position_errors(bboxes, reference):
+    """Pixel distance between the top-left corners for frames where both are available"""
+    return [math.dist(b[0:2], r[0:2]) for b, r in zip(bboxes, reference) if b is not None and r is not None]
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    source = make_source(path)
+    frames = load_frames(source)
+    if isinstance(source, SyntheticSource):
+        reference = [source.ground_truth(i) for i in range(len(frames))]
+        reference_name = "ground truth"
+    elif len(sys.argv) > 2:
+        reference = load_ground_truth(sys.argv[2])
+        reference_name = "ground truth"
+    else:
+        reference, _ = run_tracker(TrackerConfig("CSRT"), frames)
+        reference_name = "full-frame CSRT"
+    print(f"{len(frames)} frames, errors relative to {reference_name}, motion line is {MOTION_LENGTH:.0f} px long\n")
+
+    print(f"{'tracker':<22}{'fps':>9}{'ms/frame':>10}{'lost':>7}{'mean err px':>13}{'max err px':>12}{'max err frac':>14}")
+    for config in CONFIGS:
+        try:
+            bboxes, update_time = run_tracker(config, frames)
+        except (AttributeError, ValueError, RuntimeError, cv2.error) as e: # e.g. MOSSE needs opencv-contrib, or doesn't work with the build
+            print(f"{str(config):<22} unavailable: {e}")
+            continue
+        updates = len(frames) - 1
+        errors = position_errors(bboxes, reference)
+        lost = sum(1 for b in bboxes if b is None)
+        referenced = sum(1 for r in reference if r is not None)
+        if referenced and len(errors) >= MIN_TRACKED_FRACTION * referenced:
+            mean_error = sum(errors) / len(errors)
+            max_error = max(errors)
+            error_columns = f"{mean_error:>13.1f}{max_error:>12.1f}{max_error / MOTION_LENGTH:>14.3f}"
+        else:
+            error_columns = f"{'N/A':>13}{'N/A':>12}{'N/A':>14}"
+        print(f"{str(config):<22}{updates / update_time:>9.1f}{1000 * update_time / updates:>10.2f}{lost:>7}{error_columns}")
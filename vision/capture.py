@@ -0,0 +1,54 @@
+import threading
+import time
+
+from vision.sources import FrameSource
+
+
+class LatestFrameGrabber:
+    """
+    Reads frames from a source on a background thread and keeps only the newest one, so the tracking stage never works through a backlog.
+    Frames that get replaced before the tracking stage picks them up are counted as dropped.
+    """
+    def __init__(self, source: FrameSource) -> None:
+        self.source = source
+        self.dropped_frames = 0
+        self._new_frame = threading.Condition()
+        self._frame = None
+        self._capture_timestamp = 0.0
+        self._consumed = True # Whether the current frame has already been handed out
+        self._ended = False
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        self._thread.join(timeout=1.0)
+
+    def _run(self):
+        while not self._stopping:
+            ret, frame = self.source.read()
+            capture_timestamp = time.monotonic()
+            with self._new_frame:
+                if not ret:
+                    self._ended = True
+                    self._new_frame.notify_all()
+                    return
+                if not self._consumed:
+                    self.dropped_frames += 1
+                self._frame = frame
+                self._capture_timestamp = capture_timestamp
+                self._consumed = False
+                self._new_frame.notify_all()
+
+    def read(self):
+        """Blocks until a frame newer than the last one returned is available. Returns (ret, frame, capture_timestamp)"""
+        with self._new_frame:
+            while self._consumed and not self._ended:
+                self._new_frame.wait()
+            if self._consumed:
+                return False, None, 0.0
+            self._consumed = True
+            return True, self._frame, self._capture_timestamp
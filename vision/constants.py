@@ -0,0 +1,9 @@
+# Constants
+WINDOW_NAME = "Object Tracker"
+MOTION_LINE = [(150, 245), (500, 140)] # The approximate line of motion along which the basket moves
+PREDEFINED_RECT = (MOTION_LINE[0][0], MOTION_LINE[0][1], 50, 50)  # (x, y, w, h) of the area to place the object
+
+LOWER_DISTANCE = 35 # The threshold to use to determine whether the basket has been lowered
+RAISE_LOWER_THRESHOLD = 0.1 # The threshold for considering the basket to be raised or lowered as a fraction of the raise/lower distance
+POS_THRESHOLD = 0.05 # The threshold for considering the basket to be at a certain location as a fraction of distance along the motion line
+CHECKPOINT_FRACS = [0.0, 0.5, 1.0] # Position of each checkpoint as a fraction of distance along the motion line
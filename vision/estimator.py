@@ -0,0 +1,107 @@
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+KALMAN_ACCEL_NOISE = 0.5 # Standard deviation of the unmodelled acceleration, in motion-line fractions per second^2
+KALMAN_MEASUREMENT_NOISE = 0.01 # Standard deviation of a single position measurement, in motion-line fractions
+KALMAN_RESET_GAP = 1.0 # Seconds without a measurement after which the filter starts over instead of predicting across the gap
+
+
+class ConstantVelocityKalman:
+    """1D Kalman filter over (position, velocity) assuming constant velocity between measurements"""
+    def __init__(self, accel_noise: float = KALMAN_ACCEL_NOISE, measurement_noise: float = KALMAN_MEASUREMENT_NOISE) -> None:
+        self.q = accel_noise ** 2
+        self.r = measurement_noise ** 2
+        self.initialized = False
+        self.position = 0.0
+        self.velocity = 0.0
+        # Covariance matrix [[p00, p01], [p01, p11]]
+        self.p00 = 0.0
+        self.p01 = 0.0
+        self.p11 = 0.0
+
+    def reset(self, position: float):
+        self.initialized = True
+        self.position = position
+        self.velocity = 0.0
+        self.p00 = self.r
+        self.p01 = 0.0
+        self.p11 = 1.0 # Velocity is unknown at the start
+
+    def update(self, position: float, dt: float):
+        if not self.initialized:
+            self.reset(position)
+            return
+        # Predict
+        self.position += self.velocity * dt
+        dt2 = dt * dt
+        p00 = self.p00 + 2 * dt * self.p01 + dt2 * self.p11 + self.q * dt2 * dt2 / 4
+        p01 = self.p01 + dt * self.p11 + self.q * dt2 * dt / 2
+        p11 = self.p11 + self.q * dt2
+        # Correct
+        innovation = position - self.position
+        s = p00 + self.r
+        k0 = p00 / s
+        k1 = p01 / s
+        self.position += k0 * innovation
+        self.velocity += k1 * innovation
+        self.p00 = (1 - k0) * p00
+        self.p01 = (1 - k0) * p01
+        self.p11 = p11 - k1 * p01
+
+
+@dataclass
+class PositionEstimate:
+    seq: int # Frame sequence number of the latest measurement
+    timestamp: float # Capture time (time.monotonic()) of the latest measurement
+    x_frac: float # Raw measured fraction of distance along the motion line
+    y_frac: float # Raw measured fraction of the raise/lower distance below the motion line
+    filtered_x_frac: float
+    filtered_y_frac: float
+    x_velocity: float # Fractions of the motion line per second
+    y_velocity: float # Fractions of the raise/lower distance per second
+
+    def predict_x_frac(self, at_time: float) -> float:
+        """Filtered position extrapolated to at_time (time.monotonic())"""
+        return self.filtered_x_frac + self.x_velocity * (at_time - self.timestamp)
+
+    def predict_y_frac(self, at_time: float) -> float:
+        return self.filtered_y_frac + self.y_velocity * (at_time - self.timestamp)
+
+    def time_to_checkpoint(self, checkpoint_frac: float, min_speed: float = 1e-3) -> Optional[float]:
+        """
+        Predicted number of seconds (from the capture time of the latest frame) until the basket reaches checkpoint_frac at its current velocity.
+        Returns None if it isn't moving towards the checkpoint.
+        """
+        distance = checkpoint_frac - self.filtered_x_frac
+        if abs(self.x_velocity) < min_speed or math.copysign(1, distance) != math.copysign(1, self.x_velocity):
+            return None
+        return distance / self.x_velocity
+
+
+class PositionEstimator:
+    """Filters the stream of measured (x_frac, y_frac) positions into a smoothed position and velocity"""
+    def __init__(self) -> None:
+        self.x_filter = ConstantVelocityKalman()
+        self.y_filter = ConstantVelocityKalman()
+        self._last_timestamp: Optional[float] = None
+
+    def update(self, seq: int, timestamp: float, x_frac: float, y_frac: float) -> PositionEstimate:
+        if self._last_timestamp is None or timestamp - self._last_timestamp > KALMAN_RESET_GAP:
+            self.x_filter.reset(x_frac)
+            self.y_filter.reset(y_frac)
+        else:
+            dt = max(timestamp - self._last_timestamp, 1e-3)
+            self.x_filter.update(x_frac, dt)
+            self.y_filter.update(y_frac, dt)
+        self._last_timestamp = timestamp
+        return PositionEstimate(
+            seq=seq,
+            timestamp=timestamp,
+            x_frac=x_frac,
+            y_frac=y_frac,
+            filtered_x_frac=self.x_filter.position,
+            filtered_y_frac=self.y_filter.position,
+            x_velocity=self.x_filter.velocity,
+            y_velocity=self.y_filter.velocity,
+        )
@@ -0,0 +1,99 @@
+import multiprocessing
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+# Layout of the shared record. Everything is stored as a double so the whole record fits in a single RawArray.
+_WRITE_SEQ = 0 # Seqlock counter, odd while a write is in progress
+_FRAME_SEQ = 1 # Number of measurements published so far
+_TIMESTAMP = 2 # time.monotonic() at which the measurement was published
+_VALID = 3 # 1.0 if the tracker had the object, 0.0 if tracking was lost
+_X = 4
+_Y = 5
+_W = 6
+_H = 7
+_CAPTURE_TIMESTAMP = 8 # time.monotonic() at which the frame the measurement came from was captured
+_DROPPED_FRAMES = 9 # Number of captured frames skipped so far because a newer one was available
+RECORD_SIZE = 10
+
+
+@dataclass
+class BBoxRecord:
+    seq: int # Frame sequence number of the measurement (0 = nothing published yet)
+    timestamp: float # time.monotonic() at publish
+    bbox: Optional[tuple[int, int, int, int]] # (x, y, w, h) or None if not tracking
+    capture_timestamp: float = 0.0 # time.monotonic() at which the frame was captured
+    dropped_frames: int = 0 # Total number of stale frames the vision process has skipped
+
+    @property
+    def latency(self) -> float:
+        """Seconds between the frame being captured and the measurement being published"""
+        return self.timestamp - self.capture_timestamp
+
+    def age(self) -> float:
+        """Seconds since the frame the measurement came from was captured"""
+        return time.monotonic() - self.capture_timestamp
+
+
+class SharedBBox:
+    """
+    Lock-free single-writer/multi-reader channel for the tracked bounding box.
+    The record lives in shared memory and is protected by a seqlock: the writer bumps the write counter to an odd value,
+    writes the fields, then bumps it back to even. Readers retry until they see the same even counter before and after copying the record.
+    """
+    def __init__(self) -> None:
+        self._buf = multiprocessing.RawArray('d', RECORD_SIZE)
+        self._new_frame = multiprocessing.Condition() # Only used to wake up blocked readers, plain reads never touch it
+
+    def publish(self, bbox: Optional[tuple[int, int, int, int]], capture_timestamp: Optional[float] = None, dropped_frames: int = 0):
+        """Publish a new measurement. Must only be called from the single writer (the vision process)."""
+        buf = self._buf
+        now = time.monotonic()
+        write_seq = buf[_WRITE_SEQ]
+        buf[_WRITE_SEQ] = write_seq + 1
+        buf[_FRAME_SEQ] += 1
+        buf[_TIMESTAMP] = now
+        buf[_CAPTURE_TIMESTAMP] = now if capture_timestamp is None else capture_timestamp
+        buf[_DROPPED_FRAMES] = dropped_frames
+        if bbox is None:
+            buf[_VALID] = 0.0
+        else:
+            buf[_VALID] = 1.0
+            buf[_X], buf[_Y], buf[_W], buf[_H] = bbox
+        buf[_WRITE_SEQ] = write_seq + 2
+        with self._new_frame:
+            self._new_frame.notify_all()
+
+    def read(self) -> BBoxRecord:
+        buf = self._buf
+        while True:
+            before = buf[_WRITE_SEQ]
+            if before % 2 == 1: # Writer is mid-update
+                continue
+            record = buf[:]
+            if buf[_WRITE_SEQ] == before:
+                break
+        bbox = None
+        if record[_VALID] == 1.0:
+            bbox = (int(record[_X]), int(record[_Y]), int(record[_W]), int(record[_H]))
+        return BBoxRecord(seq=int(record[_FRAME_SEQ]), timestamp=record[_TIMESTAMP], bbox=bbox,
+                          capture_timestamp=record[_CAPTURE_TIMESTAMP], dropped_frames=int(record[_DROPPED_FRAMES]))
+
+    def wait_for_update(self, last_seq: int, timeout: float) -> Optional[BBoxRecord]:
+        """
+        Blocks until a measurement newer than last_seq is published and returns it.
+        Returns None if nothing new arrives within timeout seconds.
+        """
+        deadline = time.monotonic() + timeout
+        with self._new_frame:
+            while True:
+                record = self.read()
+                if record.seq > last_seq:
+                    return record
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._new_frame.wait(remaining)
+
+    def get_bbox(self) -> Optional[tuple[int, int, int, int]]:
+        return self.read().bbox
@@ -0,0 +1,167 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+from vision.constants import MOTION_LINE, PREDEFINED_RECT
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+class FrameSource:
+    """
+    Base class for anything the vision process can pull frames from. Mirrors the subset of the cv2.VideoCapture interface that Vision uses.
+    Sources are constructed in the parent process and opened in the vision process, so the constructor must only store picklable configuration.
+    """
+    def open(self) -> bool:
+        raise NotImplementedError
+
+    def read(self):
+        """Returns (ret, frame) like cv2.VideoCapture.read"""
+        raise NotImplementedError
+
+    def release(self):
+        pass
+
+
+class CameraSource(FrameSource):
+    def __init__(self, index: int = 0) -> None:
+        self.index = index
+        self._cap = None
+
+    def open(self) -> bool:
+        self._cap = cv2.VideoCapture(self.index)
+        self._cap.set(cv2.CAP_PROP_BUFFERSIZE, 1) # Not supported by every backend, the capture thread drains the buffer regardless
+        return self._cap.isOpened()
+
+    def read(self):
+        return self._cap.read() #type: ignore
+
+    def release(self):
+        if self._cap is not None:
+            self._cap.release()
+
+
+class VideoFileSource(FrameSource):
+    """Replays a recorded video file, optionally looping back to the start when it ends"""
+    def __init__(self, path: str, loop: bool = False) -> None:
+        self.path = path
+        self.loop = loop
+        self._cap = None
+
+    def open(self) -> bool:
+        self._cap = cv2.VideoCapture(self.path)
+        return self._cap.isOpened()
+
+    def read(self):
+        ret, frame = self._cap.read() #type: ignore
+        if not ret and self.loop:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0) #type: ignore
+            ret, frame = self._cap.read() #type: ignore
+        return ret, frame
+
+    def release(self):
+        if self._cap is not None:
+            self._cap.release()
+
+
+class FrameDirectorySource(FrameSource):
+    """Replays a directory of image files in sorted filename order"""
+    def __init__(self, path: str, loop: bool = False) -> None:
+        self.path = path
+        self.loop = loop
+        self._files = []
+        self._index = 0
+
+    def open(self) -> bool:
+        if not os.path.isdir(self.path):
+            return False
+        self._files = sorted(f for f in os.listdir(self.path) if f.lower().endswith(IMAGE_EXTENSIONS))
+        self._index = 0
+        return len(self._files) > 0
+
+    def read(self):
+        if self._index >= len(self._files):
+            if not self.loop:
+                return False, None
+            self._index = 0
+        frame = cv2.imread(os.path.join(self.path, self._files[self._index]))
+        self._index += 1
+        return frame is not None, frame
+
+
+class SyntheticSource(FrameSource):
+    """
+    Generates frames of a textured square moving back and forth along MOTION_LINE over a static noisy background.
+    Frames are deterministic for a given seed, and the true bbox of every frame is available through ground_truth.
+    """
+    def __init__(self, num_frames: int = 300, width: int = 640, height: int = 480, period: int = 150, seed: int = 0) -> None:
+        self.num_frames = num_frames
+        self.width = width
+        self.height = height
+        self.period = period # Number of frames for a full back-and-forth trip
+        self.seed = seed
+        self._index = 0
+        self._background = None
+        self._patch = None
+
+    def open(self) -> bool:
+        rng = np.random.default_rng(self.seed)
+        background = rng.integers(60, 120, size=(self.height // 8, self.width // 8, 3), dtype=np.uint8)
+        self._background = cv2.resize(background, (self.width, self.height), interpolation=cv2.INTER_LINEAR)
+        w, h = PREDEFINED_RECT[2:4]
+        patch = np.zeros((h, w, 3), dtype=np.uint8)
+        patch[:, :] = (40, 40, 200)
+        patch[::10, :] = (230, 230, 230)
+        patch[:, ::10] = (230, 230, 230)
+        cv2.circle(patch, (w // 2, h // 2), min(w, h) // 4, (20, 160, 20), -1)
+        self._patch = patch
+        self._index = 0
+        return True
+
+    def ground_truth(self, index: int) -> tuple[int, int, int, int]:
+        """The (x, y, w, h) of the object in frame number index"""
+        phase = (index % self.period) / self.period
+        frac = 2 * phase if phase < 0.5 else 2 - 2 * phase
+        x = MOTION_LINE[0][0] + frac * (MOTION_LINE[1][0] - MOTION_LINE[0][0])
+        y = MOTION_LINE[0][1] + frac * (MOTION_LINE[1][1] - MOTION_LINE[0][1])
+        return int(round(x)), int(round(y)), PREDEFINED_RECT[2], PREDEFINED_RECT[3]
+
+    def render(self, x: int, y: int):
+        """Draws the object with its top-left corner at (x, y)"""
+        w, h = PREDEFINED_RECT[2:4]
+        x = min(max(x, 0), self.width - w)
+        y = min(max(y, 0), self.height - h)
+        frame = self._background.copy() #type: ignore
+        frame[y:y + h, x:x + w] = self._patch
+        return frame
+
+    def read(self):
+        if self._index >= self.num_frames:
+            return False, None
+        x, y, _, _ = self.ground_truth(self._index)
+        self._index += 1
+        return True, self.render(x, y)
+
+
+class PacedSource(FrameSource):
+    """Wraps another source so that frames come out no faster than fps, like a live camera would deliver them"""
+    def __init__(self, inner: FrameSource, fps: float = 30.0) -> None:
+        self.inner = inner
+        self.fps = fps
+        self._next_frame_time = 0.0
+
+    def open(self) -> bool:
+        self._next_frame_time = time.monotonic()
+        return self.inner.open()
+
+    def read(self):
+        delay = self._next_frame_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._next_frame_time = max(self._next_frame_time + 1 / self.fps, time.monotonic())
+        return self.inner.read()
+
+    def release(self):
+        self.inner.release()
@@ -0,0 +1,155 @@
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from vision.constants import LOWER_DISTANCE, MOTION_LINE, PREDEFINED_RECT
+
+TRACKER_BACKENDS = ("CSRT", "KCF", "MOSSE", "TEMPLATE")
+
+CORRIDOR_MARGIN = 20 # Extra pixels around the motion corridor to keep when cropping
+TEMPLATE_SEARCH_MARGIN = 40 # Pixels around the last known position to search for the template
+TEMPLATE_MIN_SCORE = 0.5 # Minimum normalized correlation for a template match to count as tracked
+PROBE_TOLERANCE = 2 # Pixels a backend checked at init may be off by when re-finding the object in the frame it was initialized on
+
+
+@dataclass
+class TrackerConfig:
+    backend: str = "CSRT" # One of TRACKER_BACKENDS
+    corridor: bool = False # Crop each frame to the motion corridor before tracking
+    scale: float = 1.0 # Resize factor applied to the (cropped) frame before tracking, e.g. 0.5 to halve the resolution
+
+    def __str__(self) -> str:
+        return f"{self.backend}{' corridor' if self.corridor else ''}{f' x{self.scale:g}' if self.scale != 1.0 else ''}"
+
+
+class Tracker:
+    """Common interface for all tracking backends. Bboxes are (x, y, w, h) in full-frame pixel coordinates."""
+    def init(self, frame, bbox):
+        raise NotImplementedError
+
+    def update(self, frame):
+        """Returns (success, bbox)"""
+        raise NotImplementedError
+
+
+class OpenCVTracker(Tracker):
+    """
+    One of OpenCV's trackers. MOSSE is checked at init, since some OpenCV builds ship a legacy MOSSE that loses the object on every frame
+    (or reports nonsense positions): it has to re-find the object in the frame it was initialized on, or init raises RuntimeError.
+    """
+    def __init__(self, backend: str) -> None:
+        self.backend = backend
+        if backend == "CSRT":
+            self._tracker = cv2.TrackerCSRT_create() #type: ignore
+        elif backend == "KCF":
+            self._tracker = cv2.TrackerKCF_create() #type: ignore
+        elif backend == "MOSSE":
+            self._tracker = cv2.legacy.TrackerMOSSE_create() #type: ignore
+        else:
+            raise ValueError(f"Unrecognized OpenCV tracker {backend}")
+
+    def init(self, frame, bbox):
+        bbox = tuple(int(v) for v in bbox)
+        self._tracker.init(frame, bbox)
+        if self.backend == "MOSSE":
+            success, found = self.update(frame)
+            if not success or max(abs(a - b) for a, b in zip(found, bbox)) > PROBE_TOLERANCE:
+                raise RuntimeError(f"The {self.backend} tracker doesn't work with this OpenCV build ({cv2.__version__}), use another backend")
+            self._tracker = cv2.legacy.TrackerMOSSE_create() #type: ignore # Start over from the initial appearance only
+            self._tracker.init(frame, bbox)
+
+    def update(self, frame):
+        success, bbox = self._tracker.update(frame)
+        return success, tuple(int(v) for v in bbox)
+
+
+class TemplateMatchTracker(Tracker):
+    """
+    Normalized cross-correlation against the initial appearance of the object (as in experiment.run_template_match),
+    restricted to a window around the last known position
+    """
+    def __init__(self, search_margin: int = TEMPLATE_SEARCH_MARGIN, min_score: float = TEMPLATE_MIN_SCORE) -> None:
+        self.search_margin = search_margin
+        self.min_score = min_score
+        self._template = None
+        self._bbox = None
+
+    def init(self, frame, bbox):
+        x, y, w, h = (int(v) for v in bbox)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        self._template = gray[y:y + h, x:x + w].copy()
+        self._bbox = (x, y, w, h)
+
+    def update(self, frame):
+        x, y, w, h = self._bbox #type: ignore
+        frame_h, frame_w = frame.shape[:2]
+        x0 = max(0, x - self.search_margin)
+        y0 = max(0, y - self.search_margin)
+        x1 = min(frame_w, x + w + self.search_margin)
+        y1 = min(frame_h, y + h + self.search_margin)
+        if x1 - x0 < w or y1 - y0 < h:
+            return False, self._bbox
+        window = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+        result = cv2.matchTemplate(window, self._template, cv2.TM_CCOEFF_NORMED) #type: ignore
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        if max_val < self.min_score:
+            return False, self._bbox
+        self._bbox = (x0 + max_loc[0], y0 + max_loc[1], w, h)
+        return True, self._bbox
+
+
+def get_corridor_rect(frame_shape, object_size=PREDEFINED_RECT[2:4], margin=CORRIDOR_MARGIN):
+    """The (x, y, w, h) region of the frame that the basket can be in: the band between MOTION_LINE and LOWER_DISTANCE below it"""
+    frame_h, frame_w = frame_shape[:2]
+    xs = [p[0] for p in MOTION_LINE]
+    ys = [p[1] for p in MOTION_LINE]
+    x0 = max(0, min(xs) - margin)
+    y0 = max(0, min(ys) - margin)
+    x1 = min(frame_w, max(xs) + object_size[0] + margin)
+    y1 = min(frame_h, max(ys) + LOWER_DISTANCE + object_size[1] + margin)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+class ROITracker(Tracker):
+    """Wraps another tracker so that it only sees a downscaled and/or cropped-to-the-motion-corridor version of each frame"""
+    def __init__(self, inner: Tracker, corridor: bool = True, scale: float = 1.0) -> None:
+        self.inner = inner
+        self.corridor = corridor
+        self.scale = scale
+        self._rect = None
+
+    def _prepare(self, frame):
+        if self._rect is None:
+            self._rect = get_corridor_rect(frame.shape) if self.corridor else (0, 0, frame.shape[1], frame.shape[0])
+        x, y, w, h = self._rect
+        cropped = frame[y:y + h, x:x + w]
+        if self.scale != 1.0:
+            return cv2.resize(cropped, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return np.ascontiguousarray(cropped)
+
+    def _to_local(self, bbox):
+        x, y, w, h = bbox
+        return ((x - self._rect[0]) * self.scale, (y - self._rect[1]) * self.scale, w * self.scale, h * self.scale) #type: ignore
+
+    def _to_frame(self, bbox):
+        x, y, w, h = bbox
+        return (int(round(x / self.scale + self._rect[0])), int(round(y / self.scale + self._rect[1])), int(round(w / self.scale)), int(round(h / self.scale))) #type: ignore
+
+    def init(self, frame, bbox):
+        cropped = self._prepare(frame)
+        self.inner.init(cropped, self._to_local(bbox))
+
+    def update(self, frame):
+        success, bbox = self.inner.update(self._prepare(frame))
+        return success, self._to_frame(bbox)
+
+
+def create_tracker(config: TrackerConfig) -> Tracker:
+    if config.backend == "TEMPLATE":
+        tracker = TemplateMatchTracker(search_margin=max(1, int(TEMPLATE_SEARCH_MARGIN * config.scale)))
+    else:
+        tracker = OpenCVTracker(config.backend)
+    if config.corridor or config.scale != 1.0:
+        return ROITracker(tracker, corridor=config.corridor, scale=config.scale)
+    return tracker
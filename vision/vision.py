@@ -1,27 +1,68 @@
 import cv2
 import multiprocessing
 import time
+from dataclasses import dataclass, field
+from typing import Optional
 
+from vision.capture import LatestFrameGrabber
+from vision.constants import CHECKPOINT_FRACS, LOWER_DISTANCE, MOTION_LINE, POS_THRESHOLD, PREDEFINED_RECT, RAISE_LOWER_THRESHOLD, WINDOW_NAME
+from vision.estimator import PositionEstimate, PositionEstimator
+from vision.shared_bbox import BBoxRecord, SharedBBox
+from vision.sources import CameraSource, FrameSource
+from vision.trackers import TrackerConfig, create_tracker
 
-# Constants
-WINDOW_NAME = "Object Tracker"
-MOTION_LINE = [(150, 245), (500, 140)] # The approximate line of motion along which the basket moves
-PREDEFINED_RECT = (MOTION_LINE[0][0], MOTION_LINE[0][1], 50, 50)  # (x, y, w, h) of the area to place the object
 
-LOWER_DISTANCE = 35 # The threshold to use to determine whether the basket has been lowered
-RAISE_LOWER_THRESHOLD = 0.1 # The threshold for considering the basket to be raised or lowered as a fraction of the raise/lower distance
-POS_THRESHOLD = 0.05 # The threshold for considering the basket to be at a certain location as a fraction of distance along the motion line
+@dataclass
+class TrackingStats:
+    frames: int = 0 # Number of frames read from the source
+    tracked_frames: int = 0 # Number of frames passed through the tracker
+    lost_frames: int = 0 # Number of tracked frames where the tracker lost the object
+    dropped_frames: int = 0 # Number of captured frames skipped because a newer one was available
+    tracker_time: float = 0.0 # Total seconds spent in tracker.update
+    frame_times: list[float] = field(default_factory=list) # Seconds spent processing each tracked frame, from getting the frame to publishing
+    frame_ages: list[float] = field(default_factory=list) # Seconds between capture and publish for each tracked frame
+    wall_time: float = 0.0
+
+    def __str__(self) -> str:
+        if not self.frame_times:
+            return f"Read {self.frames} frames, none tracked"
+        return \
+f"""Read {self.frames} frames ({self.dropped_frames} dropped as stale), tracked {self.tracked_frames} ({self.lost_frames} lost) in {self.wall_time:.2f} s
+Throughput: {self.tracked_frames / self.wall_time:.1f} frames/s
+Per-frame: {_summarize_ms(self.frame_times)}
+Frame age at publish: {_summarize_ms(self.frame_ages)}
+Tracker update: mean {1000 * self.tracker_time / self.tracked_frames:.2f} ms"""
+
+
+def _summarize_ms(values):
+    values = sorted(values)
+    return f"mean {1000 * sum(values) / len(values):.2f} ms, p50 {1000 * values[len(values) // 2]:.2f} ms, p99 {1000 * values[int(len(values) * 0.99)]:.2f} ms"
+
 
 class Vision:
-    def __init__(self):
-        self._bbox_manager = multiprocessing.Manager()
-        self._bbox = self._bbox_manager.list([None])  # Shared list for bbox
-        self._process = multiprocessing.Process(target=self._run, args=(self._bbox,))
+    def __init__(self, source: Optional[FrameSource] = None, headless: bool = False, auto_start: Optional[bool] = None, tracker_config: Optional[TrackerConfig] = None, capture_thread: bool = True):
+        """
+        source: where frames come from, defaults to the webcam
+        capture_thread: read frames on a separate thread and always track the newest one, dropping stale frames
+        tracker_config: which tracking backend to use and whether to restrict it to the motion corridor, defaults to full-frame CSRT
+        headless: skip all drawing and the preview window
+        auto_start: start tracking from PREDEFINED_RECT on the first frame instead of waiting for 's' to be pressed. Defaults to the value of headless
+        """
+        if source is None:
+            source = CameraSource(0)
+        if auto_start is None:
+            auto_start = headless
+        if tracker_config is None:
+            tracker_config = TrackerConfig()
+        self._bbox = SharedBBox()  # Shared-memory record for bbox
+        self._process = multiprocessing.Process(target=self._run, args=(self._bbox, source, headless, auto_start, tracker_config, capture_thread))
         self._process.daemon = True
         self._process_started = False
         # For calculations
         self.slope = (MOTION_LINE[1][1] - MOTION_LINE[0][1]) / (MOTION_LINE[1][0] - MOTION_LINE[0][0])
         self.x_range = (MOTION_LINE[1][0] - MOTION_LINE[0][0])
+        self._estimator = PositionEstimator()
+        self._estimate: Optional[PositionEstimate] = None
 
     def start(self):
         if not self._process_started:
@@ -30,24 +71,77 @@ class Vision:
 
     def get_bbox(self):
         """Returns the current bounding box as a tuple (x, y, w, h) or None if not tracking."""
-        curr_bbox = self._bbox[0]
-        if curr_bbox is None:
-            return None
-        return tuple(curr_bbox)
+        return self._bbox.get_bbox()
+
+    def get_measurement(self) -> BBoxRecord:
+        """Returns the latest published measurement (frame sequence number, timestamp and bbox) without blocking."""
+        return self._bbox.read()
+
+    def wait_for_measurement(self, last_seq: int, timeout: float) -> Optional[BBoxRecord]:
+        """Blocks until a measurement with a sequence number greater than last_seq is published, or returns None after timeout seconds."""
+        return self._bbox.wait_for_update(last_seq, timeout)
+
+    def wait_until_tracking(self, timeout: float) -> bool:
+        """Blocks until a frame with the basket tracked is published. Returns False if that doesn't happen within timeout seconds."""
+        deadline = time.monotonic() + timeout
+        last_seq = 0
+        while True:
+            measurement = self.wait_for_measurement(last_seq, max(0.0, deadline - time.monotonic()))
+            if measurement is None:
+                return False
+            if measurement.bbox is not None:
+                return True
+            last_seq = measurement.seq
     
-    def get_info(self, checkpoint_ref):
+    def get_frame_age(self) -> Optional[float]:
+        """Returns the number of seconds since the frame behind the latest measurement was captured, or None if nothing has been published yet"""
+        measurement = self.get_measurement()
+        if measurement.seq == 0:
+            return None
+        return measurement.age()
+
+    def measure_fracs(self, bbox):
         """
-        checkpoint_ref: the "checkpoint" along the motion line (one at each end and one in the middle) to compare the current position against
-        returns where the current position is relative to the checkpoint (1 = to the left, 0 = at, -1 = to the right) as well as whether the bucket should be considered raised (+1), lowered (-1), or somewhere in-between (0)
+        Converts a bbox into (x_frac, y_frac): the fraction of distance along the motion line,
+        and the fraction of the raise/lower distance the basket is below the motion line
         """
-        bbox = self.get_bbox()
-        if bbox is None:
-            return None
         x, y = bbox[0:2]
         x_offset = x - MOTION_LINE[0][0] # The x offset from the reference point
         x_frac = x_offset / self.x_range
         y_ref = MOTION_LINE[0][1] + self.slope * x_offset # The reference for the y coordinate based on the motion line and the x position
         y_frac = abs(y - y_ref) / LOWER_DISTANCE
+        return x_frac, y_frac
+
+    def update_estimate(self, measurement: BBoxRecord) -> Optional[PositionEstimate]:
+        """Feeds a measurement into the position filter (once per frame) and returns the resulting estimate, or None if tracking was lost"""
+        if measurement.bbox is None:
+            return None
+        if self._estimate is not None and self._estimate.seq == measurement.seq:
+            return self._estimate
+        x_frac, y_frac = self.measure_fracs(measurement.bbox)
+        self._estimate = self._estimator.update(measurement.seq, measurement.capture_timestamp, x_frac, y_frac)
+        return self._estimate
+
+    def get_estimate(self) -> Optional[PositionEstimate]:
+        """
+        Returns the continuous position estimate for the latest frame: raw and Kalman-filtered x_frac/y_frac and velocities.
+        Returns None if not tracking.
+        """
+        return self.update_estimate(self.get_measurement())
+
+    def get_info(self, checkpoint_ref):
+        """
+        checkpoint_ref: the "checkpoint" along the motion line (one at each end and one in the middle) to compare the current position against
+        returns where the current position is relative to the checkpoint (1 = to the left, 0 = at, -1 = to the right) as well as whether the bucket should be considered raised (+1), lowered (-1), or somewhere in-between (0)
+        """
+        estimate = self.get_estimate()
+        if estimate is None:
+            return None
+        return self.info_from_estimate(estimate, checkpoint_ref)
+
+    def info_from_estimate(self, estimate: PositionEstimate, checkpoint_ref):
+        """Same as get_info, but for an already-computed estimate. Uses the raw measurement, not the filtered one."""
+        x_frac, y_frac = estimate.x_frac, estimate.y_frac
         
         if abs(y_frac - 1.0) <= RAISE_LOWER_THRESHOLD:
             raise_lower = -1
@@ -56,12 +150,7 @@ class Vision:
         else:
             raise_lower = 0
         
-        if checkpoint_ref == 0:
-            checkpoint_frac = 0.0
-        elif checkpoint_ref == 1:
-            checkpoint_frac = 0.5
-        elif checkpoint_ref == 2:
-            checkpoint_frac = 1.0
+        checkpoint_frac = CHECKPOINT_FRACS[checkpoint_ref]
         if abs(x_frac - checkpoint_frac) <= POS_THRESHOLD:
             checkpoint_rel = 0
         elif x_frac < checkpoint_frac:
@@ -79,60 +168,102 @@ class Vision:
             self._process_started = False
 
     @staticmethod
-    def _run(shared_bbox):
+    def _run(shared_bbox, source, headless, auto_start, tracker_config, capture_thread):
+        stats = run_tracking(shared_bbox, source, headless, auto_start, tracker_config=tracker_config, capture_thread=capture_thread)
+        print(stats)
+
 
-        cap = cv2.VideoCapture(0)
-        if not cap.isOpened():
-            print("Error: Cannot open webcam.")
-            return
+def run_tracking(shared_bbox: SharedBBox, source: FrameSource, headless: bool = False, auto_start: bool = False, max_frames: Optional[int] = None, tracker_config: Optional[TrackerConfig] = None, capture_thread: bool = False) -> TrackingStats:
+    """
+    The main tracking loop. Runs until the source runs out of frames, max_frames have been read or 'q' is pressed.
+    Can be called directly (outside of the vision process) to profile the tracking pipeline.
+    With capture_thread the source is read on a background thread and only the newest frame is tracked.
+    """
+    stats = TrackingStats()
+    if not source.open():
+        print("Error: Cannot open frame source.")
+        return stats
 
-        tracker = cv2.TrackerCSRT_create() #type: ignore
-        tracking = False
-        bbox = None
+    tracker = create_tracker(tracker_config if tracker_config is not None else TrackerConfig())
+    tracking = False
+    grabber = None
+    if capture_thread:
+        grabber = LatestFrameGrabber(source)
+        grabber.start()
 
+    if not auto_start:
         print("Move the object into the green box. Press 's' to start tracking. Press 'q' to quit.")
 
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            x, y, w, h = PREDEFINED_RECT
-            if not tracking:
-                cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                cv2.putText(frame, "Place object here & press 's'", (x, y - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-
-            if tracking:
-                cv2.line(frame, MOTION_LINE[0], MOTION_LINE[1], (0, 255, 0), 2)
-                cv2.line(frame, (MOTION_LINE[0][0], MOTION_LINE[0][1] + LOWER_DISTANCE), (MOTION_LINE[1][0], MOTION_LINE[1][1] + LOWER_DISTANCE), (40, 100, 40), 2)
-                success, bbox = tracker.update(frame)
-                if success:
-                    x, y, w, h = [int(v) for v in bbox]
-                    cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
-                    shared_bbox[0] = [x, y, w, h]
-                else:
-                    cv2.putText(frame, "Tracking lost", (50, 80),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                    shared_bbox[0] = None
-
-            cv2.imshow(WINDOW_NAME, frame)
+    start_time = time.perf_counter()
+    while max_frames is None or stats.frames < max_frames:
+        if grabber is not None:
+            ret, frame, capture_timestamp = grabber.read()
+            stats.dropped_frames = grabber.dropped_frames
+        else:
+            ret, frame = source.read()
+            capture_timestamp = time.monotonic()
+        if not ret:
+            break
+        frame_start = time.perf_counter()
+        stats.frames += 1
+
+        tracked_bbox = None
+        if tracking:
+            update_start = time.perf_counter()
+            success, bbox = tracker.update(frame)
+            stats.tracker_time += time.perf_counter() - update_start
+            stats.tracked_frames += 1
+            if success:
+                tracked_bbox = bbox
+            else:
+                stats.lost_frames += 1
+            shared_bbox.publish(tracked_bbox, capture_timestamp, stats.dropped_frames)
+            stats.frame_times.append(time.perf_counter() - frame_start)
+            stats.frame_ages.append(time.monotonic() - capture_timestamp)
+
+        key = -1
+        if not headless:
+            display = frame.copy() # Keep the overlay out of the frame the tracker sees
+            draw_overlay(display, tracking, tracked_bbox)
+            cv2.imshow(WINDOW_NAME, display)
             key = cv2.waitKey(1) & 0xFF
 
-            if key == ord('s'):
-                bbox = PREDEFINED_RECT
-                tracker.init(frame, bbox)
-                tracking = True
-                shared_bbox[0] = list(bbox)
-                print(f"Started tracking")
+        if not tracking and (auto_start or key == ord('s')):
+            bbox = PREDEFINED_RECT
+            tracker.init(frame, bbox)
+            tracking = True
+            shared_bbox.publish(bbox, capture_timestamp, stats.dropped_frames)
+            print(f"Started tracking")
 
-            elif key == ord('q'):
-                break
+        elif key == ord('q'):
+            break
 
-        cap.release()
+    stats.wall_time = time.perf_counter() - start_time
+    if grabber is not None:
+        grabber.stop()
+    source.release()
+    if not headless:
         cv2.destroyAllWindows()
-        shared_bbox[0] = None
-        # --- End main logic ---
+    shared_bbox.publish(None)
+    return stats
+
+
+def draw_overlay(frame, tracking, bbox):
+    if not tracking:
+        x, y, w, h = PREDEFINED_RECT
+        cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        cv2.putText(frame, "Place object here & press 's'", (x, y - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+        return
+    cv2.line(frame, MOTION_LINE[0], MOTION_LINE[1], (0, 255, 0), 2)
+    cv2.line(frame, (MOTION_LINE[0][0], MOTION_LINE[0][1] + LOWER_DISTANCE), (MOTION_LINE[1][0], MOTION_LINE[1][1] + LOWER_DISTANCE), (40, 100, 40), 2)
+    if bbox is not None:
+        x, y, w, h = bbox
+        cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
+    else:
+        cv2.putText(frame, "Tracking lost", (50, 80),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+
 
 if __name__ == "__main__":
     vis = Vision()
@@ -140,6 +271,7 @@ if __name__ == "__main__":
     while True:
         time.sleep(5)
         print(vis.get_bbox())
+        print(vis.get_estimate())
         print(vis.get_info(0))
         print(vis.get_info(1))
         print(vis.get_info(2))
@@ -1,49 +1,334 @@
-import speech_recognition as sr
-import pyttsx3
+import itertools
+import os
+import queue
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from audio.capture import AudioCapture
+from audio.recognizers import GoogleRecognizer, RecognitionResult, SpeechRecognizer
+from audio.sources import AudioSource, MicrophoneSource
+from audio.tts import AudioSink, PhraseCache, PyAudioSink, Pyttsx3Synthesizer, SpeechPriority, Synthesizer
+from metrics import Histogram
+import tracing
+
+# speech_recognition, pyttsx3 and pyaudio are imported where they are first used, since they are slow to import and unused with the mocks
+
+SPEECH_LATENCY_EDGES_MS = [10, 50, 100, 250, 500, 1000, 2000, 5000, 10000]
+
+
+@dataclass
+class SpeechStats:
+    requests: int = 0
+    spoken: int = 0
+    cancelled: int = 0 # Removed from the queue before they were spoken
+    interrupted: int = 0 # Stopped while playing
+    failed: int = 0
+    queue_latency: Histogram = field(default_factory=lambda: Histogram(SPEECH_LATENCY_EDGES_MS)) # From speak() until playback started
+    render_time: Histogram = field(default_factory=lambda: Histogram(SPEECH_LATENCY_EDGES_MS)) # Of phrases that weren't cached
+
+    def __str__(self) -> str:
+        return (f"{self.requests} requests: {self.spoken} spoken, {self.cancelled} cancelled, {self.interrupted} interrupted, {self.failed} failed\n"
+                f"  queue latency: {self.queue_latency}\n  render time: {self.render_time}")
+
+
+@dataclass(order=True)
+class SpeechRequest:
+    priority: SpeechPriority
+    sequence: int
+    text: str = field(compare=False)
+    play: bool = field(compare=False, default=True) # False to only render the phrase into the cache
+    cache: bool = field(compare=False, default=True)
+    requested: float = field(compare=False, default=0.0)
+    future: Future = field(compare=False, default_factory=Future)
+    stop: threading.Event = field(compare=False, default_factory=threading.Event)
+
 
 class VoiceSpeaker:
-    def __init__(self) -> None:
-        self.engine = pyttsx3.init()
-        self.engine.setProperty('rate', 150)
-        self.engine.setProperty('volume', 0.9)
-    
-    def speak(self, text):
-        self.engine.say(text)
-        self.engine.runAndWait()
+    """
+    Speaks on a background worker thread: speak() queues the text and returns a Future that completes with True once it has been spoken,
+    or False if it was cancelled or interrupted. Requests are spoken by priority, then in order.
+    Each phrase is rendered to a WAV file and played from there. Rendered phrases are kept in a bounded LRU PhraseCache,
+    so repeated ones are only rendered once. synthesizer and sink default to pyttsx3 and the default output device,
+    a NullSynthesizer and NullAudioSink run headless.
+    on_playback: called with True when playback starts and False when it ends, e.g. to mute the microphone meanwhile
+    """
+    def __init__(self, synthesizer: Optional[Synthesizer] = None, sink: Optional[AudioSink] = None, cache: Optional[PhraseCache] = None) -> None:
+        self.synthesizer = synthesizer if synthesizer is not None else Pyttsx3Synthesizer()
+        self.sink = sink if sink is not None else PyAudioSink()
+        self.cache = cache if cache is not None else PhraseCache()
+        self.stats = SpeechStats()
+        self.on_playback: Optional[Callable[[bool], None]] = None
+        self._requests: queue.PriorityQueue[SpeechRequest] = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._current: Optional[SpeechRequest] = None
+        self._unfinished = 0 # Requests that haven't completed yet
+        self._lock = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+        self._start_error: Optional[Exception] = None
+
+    def start(self):
+        """Starts the worker, which initializes the speech engine on its own thread (some drivers only work on the thread that initialized them)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="speech", daemon=True)
+                self._thread.start()
+        self._started.wait()
+        if self._start_error is not None:
+            raise self._start_error
+
+    def speak(self, text: str, priority: SpeechPriority = SpeechPriority.NORMAL, interrupt: bool = False, cache: bool = True) -> Future:
+        """
+        Queues text to be spoken. interrupt: first stop whatever is playing and cancel the queued messages.
+        cache: keep the rendered phrase for next time, until it becomes the least recently used one once the cache is full
+        """
+        if interrupt:
+            self.interrupt()
+        return self._submit(text, priority, play=True, cache=cache)
+
+    def prerender(self, phrases: list[str]):
+        """Renders phrases into the cache in the background, so they can be spoken without delay later"""
+        for phrase in phrases:
+            self._submit(phrase, SpeechPriority.BACKGROUND, play=False, cache=True)
+
+    def cancel_pending(self) -> int:
+        """
+        Cancels every queued message that isn't playing yet. Returns how many were cancelled.
+        Queued pre-renders (see prerender) are kept, they only warm up the cache.
+        """
+        cancelled = 0
+        prerenders = []
+        while True:
+            try:
+                request = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if not request.play:
+                prerenders.append(request)
+            elif request.future.cancel():
+                cancelled += 1
+                self._finished(request)
+        for request in prerenders:
+            self._requests.put(request)
+        with self._lock:
+            self.stats.cancelled += cancelled
+        return cancelled
+
+    def interrupt(self) -> int:
+        """Stops the phrase that is playing, if any, and cancels the queued messages. Returns how many messages were stopped."""
+        with self._lock:
+            current = self._current
+        if current is not None:
+            current.stop.set()
+        return self.cancel_pending() + (current is not None)
+
+    def wait_until_done(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until every request so far has completed. Returns False on timeout."""
+        with self._lock:
+            return self._lock.wait_for(lambda: self._unfinished == 0, timeout)
+
+    def _submit(self, text: str, priority: SpeechPriority, play: bool, cache: bool) -> Future:
+        self.start()
+        request = SpeechRequest(priority, next(self._sequence), text, play=play, cache=cache, requested=time.monotonic())
+        with self._lock:
+            self._unfinished += 1
+            self.stats.requests += play
+        self._requests.put(request)
+        return request.future
+
+    def _finished(self, request: SpeechRequest):
+        with self._lock:
+            self._unfinished -= 1
+            self._lock.notify_all()
+
+    def _run(self):
+        try:
+            self.synthesizer.start()
+            self.sink.start()
+        except Exception as e:
+            self._start_error = e
+        self._started.set()
+        if self._start_error is not None:
+            return
+        while True:
+            request = self._requests.get()
+            if not request.future.set_running_or_notify_cancel(): # Its future was cancelled directly
+                with self._lock:
+                    self.stats.cancelled += 1
+                self._finished(request)
+                continue
+            with self._lock:
+                self._current = request
+            try:
+                with tracing.span("tts.speak", text=request.text[:80], play=request.play, queued_ms=round((time.monotonic() - request.requested) * 1000, 1)):
+                    request.future.set_result(self._speak(request))
+            except Exception as e:
+                with self._lock:
+                    self.stats.failed += 1
+                print(f"Speech failed for '{request.text}': {e}")
+                request.future.set_exception(e)
+            with self._lock:
+                self._current = None
+            self._finished(request)
+
+    def _speak(self, request: SpeechRequest) -> bool:
+        key = PhraseCache.make_key(request.text, self.synthesizer.voice)
+        path = self.cache.get(key) if request.cache else None
+        if path is None:
+            fd, rendered_path = tempfile.mkstemp(suffix=".wav", prefix="render-", dir=self.cache.directory)
+            os.close(fd)
+            rendered = False
+            try:
+                start = time.monotonic()
+                with tracing.span("tts.render"):
+                    self.synthesizer.render(request.text, rendered_path)
+                rendered = True
+            finally:
+                if not rendered: # Don't leave the partial file behind
+                    os.remove(rendered_path)
+            render_time = time.monotonic() - start
+            with self._lock:
+                self.stats.render_time.add(render_time)
+            path = self.cache.put(key, rendered_path, render_time) if request.cache else rendered_path
+        try:
+            if not request.play:
+                return True
+            if request.stop.is_set():
+                with self._lock:
+                    self.stats.interrupted += 1
+                return False
+            with self._lock:
+                self.stats.queue_latency.add(time.monotonic() - request.requested)
+            if self.on_playback is not None:
+                self.on_playback(True)
+            try:
+                with tracing.span("tts.playback") as span:
+                    completed = self.sink.play(path, request.stop)
+                    span.set(completed=completed)
+            finally:
+                if self.on_playback is not None:
+                    self.on_playback(False)
+            with self._lock:
+                if completed:
+                    self.stats.spoken += 1
+                else:
+                    self.stats.interrupted += 1
+            return completed
+        finally:
+            if not request.cache:
+                os.remove(path)
 
 
 class MockVoiceSpeaker:
     def __init__(self) -> None:
+        self.on_playback: Optional[Callable[[bool], None]] = None
+
+    def start(self):
         pass
     
-    def speak(self, text):
+    def speak(self, text, priority: SpeechPriority = SpeechPriority.NORMAL, interrupt: bool = False, cache: bool = True) -> Future:
         print(f"Speech: {text}")
+        future: Future = Future()
+        future.set_result(True)
+        return future
+
+    def prerender(self, phrases: list[str]):
+        pass
+
+    def cancel_pending(self) -> int:
+        return 0
+
+    def interrupt(self) -> int:
+        return 0
+
+    def wait_until_done(self, timeout: Optional[float] = None) -> bool:
+        return True
 
 
 class VoiceListener:
-    def __init__(self) -> None:
-        self.recognizer = sr.Recognizer()
+    """
+    Listens continuously from start() on: a background thread segments the source's audio into utterances, and another transcribes
+    each one as soon as it's complete. get_voice() returns the transcripts in order.
+    source defaults to the microphone, a WavFileSource replays a recorded fixture. recognizer defaults to Google's web speech API.
+    """
+    def __init__(self, source: Optional[AudioSource] = None, recognizer: Optional[SpeechRecognizer] = None) -> None:
+        self.source = source
+        self.recognizer = recognizer if recognizer is not None else GoogleRecognizer()
+        self.capture: Optional[AudioCapture] = None
+        self.transcripts: queue.Queue[Optional[tuple[RecognitionResult, float]]] = queue.Queue()
+        self.last_latency: Optional[float] = None # Seconds from the end of the last transcribed utterance until its text was available
+        self.muted = False
+        self.echo_gated = False
+
+    def start(self):
+        if self.capture is not None:
+            return
+        self.recognizer.warm_up()
+        self.capture = AudioCapture(self.source if self.source is not None else MicrophoneSource())
+        self.capture.muted = self.muted
+        self.capture.echo_gated = self.echo_gated
+        self.capture.start()
+        threading.Thread(target=self._recognize_utterances, name="speech recognition", daemon=True).start()
+
+    def _recognize_utterances(self):
+        while (utterance := self.capture.get()) is not None: #type: ignore
+            tracing.record("voice.utterance", utterance.end_time - (utterance.end_offset - utterance.start_offset), utterance.end_time, thread="audio capture")
+            tracing.record("voice.endpointing", utterance.end_time, utterance.queued_time, thread="audio capture") # Waiting out the hangover
+            with tracing.span("voice.recognize", audio_s=round(utterance.duration, 2)) as span:
+                result = self.recognizer.recognize(utterance)
+                span.set(failure=result.failure.value if result.failure is not None else None)
+            self.transcripts.put((result, time.monotonic() - utterance.end_time))
+        self.transcripts.put(None)
 
     def get_voice(self):
-        output = None
-        while output is None:
-            try:
-                with sr.Microphone() as source2:
-                    self.recognizer.adjust_for_ambient_noise(source2, duration=1)
-                    audio2 = self.recognizer.listen(source2)
+        with tracing.span("voice.get_voice"):
+            return self._get_voice()
+
+    def _get_voice(self):
+        self.start()
+        while True:
+            transcript = self.transcripts.get()
+            if transcript is None:
+                self.transcripts.put(None) # Keep reporting the end to later calls
+                raise EOFError(f"Audio input ended: {self.capture.error}" if self.capture.error is not None else "Audio input ended") #type: ignore
+            result, latency = transcript
+            if result.text is None:
+                print(f"Speech recognition: {result}")
+                continue
+            self.last_latency = latency
+            print(f"User spoke command: {result.text} ({latency:.2f} s after the end of speech)")
+            return result.text
 
-                    output = self.recognizer.recognize_google(audio2) #type: ignore
-                print(f"User spoke command: {output}")
-            except:
-                #print("(restart voice input)")
-                pass
-        return output
+    def set_muted(self, muted: bool):
+        """Ignores the audio while muted, e.g. while our own speech is playing so that it isn't taken for the user's"""
+        self.muted = muted
+        if self.capture is not None:
+            self.capture.muted = muted
+
+    def set_echo_gated(self, gated: bool):
+        """Keeps listening, but only to speech louder than the echo, e.g. while our own speech is playing so the user can interrupt it"""
+        self.echo_gated = gated
+        if self.capture is not None:
+            self.capture.echo_gated = gated
 
         
 class MockVoiceListener:
     def __init__(self) -> None:
         pass
 
+    def start(self):
+        pass
+
+    def set_muted(self, muted: bool):
+        pass
+
+    def set_echo_gated(self, gated: bool):
+        pass
+
     def get_voice(self):
         return input("User Input: ")
 
@@ -61,9 +346,10 @@ if __name__ == "__main__":
     #v = VoiceListener()
     #print(v.get_voice())
     sp = VoiceSpeaker()
-    sp.speak("I will move the basket from the desk to the closet. Then your friend can put the vitamins inside.")
+    sp.speak("I will move the basket from the desk to the closet. Then your friend can put the vitamins inside.").result()
 
     print("Done speaking")
 
     
-    sp.speak("The task has now been completed")
\ No newline at end of file
+    sp.speak("The task has now been completed")
+    sp.wait_until_done()
\ No newline at end of file